@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+'''Compare the latency of logging a dot with `bm .` run directly, and handed
+to a running agent, against a local stub server. Each invocation is a new
+process, as from the shell.
+
+    python bench/bench_agent.py [-n invocations] [--delay seconds]'''
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from regularity.api.agent import shutdown
+
+from stub_server import StubServer
+
+BM = os.path.join(ROOT, 'bin', 'bm')
+
+def run(n, config_path, env):
+    '''Log n dots through bm, and return the latency of each, in seconds.'''
+
+    latencies = list()
+    for i in xrange(n):
+        start = time.time()
+        subprocess.check_call([sys.executable, BM, '-c', config_path, '.', 'bench'], env=env, stdout=open(os.devnull, 'w'))
+        latencies.append(time.time() - start)
+
+    return latencies
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) / 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print '%-8s p50 %7.1f ms   p99 %7.1f ms' % (name, 1000 * p50, 1000 * p99)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--invocations', type=int, default=50)
+    parser.add_argument('--delay', metavar='seconds', type=float, default=0.0,
+                        help='the stub server response delay')
+    args = parser.parse_args()
+
+    server = StubServer(delay=args.delay).start()
+
+    directory = tempfile.mkdtemp()
+    try:
+        config_path = os.path.join(directory, 'regularity.json')
+        with open(config_path, 'w') as config_file:
+            json.dump(dict(user='bench', host='127.0.0.1', port=server.port, timezone='UTC'), config_file)
+
+        socket_path = os.path.join(directory, 'agent.sock')
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+        env['REGULARITY_AGENT_SOCKET'] = socket_path
+
+        report('direct', run(args.invocations, config_path, env))
+
+        agent = subprocess.Popen([sys.executable, BM, '-c', config_path, 'agent', '-s', socket_path, '--idle', '0'], env=env)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.05)
+
+            report('agent', run(args.invocations, config_path, env))
+        finally:
+            shutdown(socket_path)
+            agent.wait()
+    finally:
+        shutil.rmtree(directory)
+        server.stop()
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+'''Time binning 10^6 durations with the scan ibin_counts() used to do, and
+with bin_counts(), in pure Python and with NumPy when it is installed. Then
+time binning 10^6 time of day ranges with ibins_range() and with
+bin_range_counts(). Checks that the results agree.
+
+    python bench/bench_binning.py [-n points] [--bins bins]'''
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from regularity import stats
+
+def linear_counts(bins, data):
+    '''The binning ibin_counts() did before bin_counts(), a scan of the bins
+       for each datum.'''
+
+    bin_ranges = list(stats.isteps(bins, *data))
+    counts = [0] * bins
+    for x in data:
+        for i, (bin_min, bin_max) in enumerate(bin_ranges):
+            if x < bin_max:
+                break
+        counts[i] += 1
+
+    return zip(bin_ranges, counts)
+
+def range_lists_counts(bins, ranges):
+    '''The range binning ibin_range_counts() did before bin_range_counts(),
+       through lists of the ranges in each bin.'''
+
+    return list((bin_range, len(bin_)) for bin_range, bin_ in stats.ibins_range(bins, *ranges))
+
+def timed(name, f, *args):
+    start = time.time()
+    result = f(*args)
+    print '%-24s %8.1f ms' % (name, 1000 * (time.time() - start))
+    return result
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--points', type=int, default=10 ** 6)
+    parser.add_argument('--bins', type=int, default=20)
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    data = list(rand.expovariate(1 / 1800.0) for i in xrange(args.points))
+
+    expected = timed('linear scan', linear_counts, args.bins, data)
+
+    threshold = stats.NUMPY_THRESHOLD
+    stats.NUMPY_THRESHOLD = len(data) + 1
+    results = [timed('bin_counts, bisect', stats.bin_counts, args.bins, data)]
+    stats.NUMPY_THRESHOLD = threshold
+
+    numpy = stats.get_numpy()
+    if numpy is None:
+        print 'numpy is not installed'
+    else:
+        results.append(timed('bin_counts, numpy list', stats.bin_counts, args.bins, data))
+        results.append(timed('bin_counts, numpy array', stats.bin_counts, args.bins, numpy.array(data)))
+
+    failed = any(result != expected for result in results)
+
+    day = 24 * 3600
+    ranges = list((rand.randint(0, day - 1), rand.randint(0, day - 1)) for i in xrange(args.points))
+
+    print
+    expected = timed('ranges, bin lists', range_lists_counts, args.bins, ranges)
+    result = timed('bin_range_counts', stats.bin_range_counts, args.bins, ranges)
+    timed('bin_range_counts, seconds', stats.bin_range_counts, args.bins, ranges, True)
+
+    failed = failed or result != expected
+
+    if failed:
+        print 'FAIL: the counts differ'
+        sys.exit(1)
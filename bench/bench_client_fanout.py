@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+'''Compare fetching the dots, dashes and pendings of many users one request at
+a time against fanning the requests out with ConcurrentAPI, against a local
+stub server that takes a fixed time to answer each request.
+
+    python bench/bench_client_fanout.py [-u users] [-c concurrency] [-d delay]'''
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from regularity.api.client import API
+from regularity.api.fanout import ConcurrentAPI, gather
+
+from stub_server import StubServer
+
+def sequential(port, users):
+    api = API('127.0.0.1', port, 'UTC')
+
+    for user in users:
+        api.user = user
+        api.dots()
+        api.dashes()
+        api.pendings()
+
+    api.close()
+
+def fanned_out(port, users, concurrency):
+    with ConcurrentAPI('127.0.0.1', port, 'UTC', concurrency=concurrency) as api:
+        futures = list()
+
+        for user in users:
+            user_api = api.for_user(user)
+            futures.extend((user_api.dots(), user_api.dashes(), user_api.pendings()))
+
+        gather(*futures)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-u', '--users', type=int, default=50)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--delay', type=float, default=0.02, help='seconds the stub server takes per request')
+    args = parser.parse_args()
+
+    server = StubServer(delay=args.delay).start()
+    users = list('user%d' % i for i in xrange(args.users))
+
+    start = time.time()
+    sequential(server.port, users)
+    sequential_seconds = time.time() - start
+
+    start = time.time()
+    fanned_out(server.port, users, args.concurrency)
+    fanned_out_seconds = time.time() - start
+
+    print '%d requests, %.0f ms server delay each' % (3 * args.users, 1000 * args.delay)
+    print 'sequential   %7.3f s' % sequential_seconds
+    print 'fanned out   %7.3f s   (concurrency %d, %.1fx)' % (fanned_out_seconds, args.concurrency, sequential_seconds / fanned_out_seconds)
+
+    server.stop()
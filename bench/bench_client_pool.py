@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+'''Compare the per-event latency of API.dash with and without the pooled,
+keep-alive session, against a local stub server.
+
+    python bench/bench_client_pool.py [-n events]'''
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from regularity.api import client
+from regularity.api.client import API
+
+from stub_server import StubServer
+
+class UnpooledAPI(API):
+    '''The API as it was before pooling, one connection per request.'''
+
+    def request(self, url, method, timeout=None, **kwargs):
+        return client.request(url, method, timeout=timeout or self.timeout, **kwargs)
+
+def run(api, n):
+    '''Send n dashes and return the latency of each, in seconds.'''
+
+    now = datetime.datetime.utcnow()
+    second = datetime.timedelta(seconds=1)
+
+    latencies = list()
+    for i in xrange(n):
+        start = time.time()
+        api.dash('bench', 'activity', now + i * second, now + (i + 1) * second)
+        latencies.append(time.time() - start)
+
+    return latencies
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    print '%-10s mean %7.3f ms   p50 %7.3f ms   p99 %7.3f ms' % (
+        name,
+        1000 * sum(latencies) / n,
+        1000 * latencies[n // 2],
+        1000 * latencies[min(n - 1, int(n * 0.99))]
+    )
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    server = StubServer().start()
+
+    unpooled = UnpooledAPI('127.0.0.1', server.port, 'UTC', user='bench')
+    pooled = API('127.0.0.1', server.port, 'UTC', user='bench')
+
+    # warm up both paths before measuring
+    run(unpooled, 50)
+    run(pooled, 50)
+
+    report('unpooled', run(unpooled, args.events))
+    report('pooled', run(pooled, args.events))
+
+    pooled.close()
+    server.stop()
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+'''Drive RegularityDaemon with a synthetic replay, sending through an
+EventSender to a local stub server. Measures the events handled per second,
+and the latency from an application switch to the server receiving the dash
+it ends.
+
+    python bench/bench_daemon.py [-n switches] [--speedup factor] [--heartbeat seconds]'''
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from regularity.api.client import API
+from regularity.api.sender import EventSender
+from regularity.core.serializers import DATETIME_FORMAT
+from regularity.daemon.daemon import RegularityDaemon
+from regularity.daemon.sources import ReplaySource, synthetic
+
+from stub_server import StubServer
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--switches', type=int, default=20000)
+    parser.add_argument('-a', '--applications', type=int, default=8)
+    parser.add_argument('--dwell', metavar='seconds', type=float, default=30.0)
+    parser.add_argument('--speedup', metavar='factor', type=float, default=None)
+    parser.add_argument('--heartbeat', metavar='seconds', type=float, default=None)
+    parser.add_argument('--interval', metavar='seconds', type=float, default=0.05,
+                        help='the longest the sender waits before sending a batch')
+    parser.add_argument('--delay', metavar='seconds', type=float, default=0.0,
+                        help='the stub server response delay')
+    args = parser.parse_args()
+
+    server = StubServer(delay=args.delay).start()
+
+    api = API('127.0.0.1', server.port, 'UTC', user='bench')
+    sender = EventSender(api, interval=args.interval)
+    sender.start()
+
+    records = synthetic(args.switches, applications=args.applications, dwell=args.dwell, screensaver_every=50, seed=0)
+    source = ReplaySource(records, speedup=args.speedup)
+    daemon = RegularityDaemon(source, sender, heartbeat=args.heartbeat)
+
+    start = time.time()
+    daemon.run()
+    elapsed = time.time() - start
+
+    daemon.stop()
+    sender.stop()
+    api.close()
+    server.stop()
+
+    delivered = dict((clock.strftime(DATETIME_FORMAT), real) for clock, real in source.delivered)
+
+    latencies = list()
+    for received, event in server.received:
+        end = event.get('end')
+        if end in delivered:
+            latencies.append(received - delivered[end])
+
+    print '%d signals in %.3f s, %.0f events/s' % (len(source.delivered), elapsed, len(source.delivered) / elapsed)
+    print '%d events sent in %d requests' % (len(server.received), server.requests)
+
+    if latencies:
+        print 'switch to server latency: p50 %.1f ms   p99 %.1f ms   max %.1f ms' % (
+            1000 * percentile(latencies, 0.5),
+            1000 * percentile(latencies, 0.99),
+            1000 * max(latencies)
+        )
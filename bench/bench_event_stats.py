@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+'''Measure the memory EventStats keeps and the time of its statistics, over a
+year of generated dashes of the kind regularityd records.
+
+    python bench/bench_event_stats.py [--per-day n] [--calls n]'''
+
+import argparse
+from array import array
+import datetime
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import pytz
+
+from regularity.stats import EventStats
+
+def deep_size(o, seen=None):
+    '''Return an estimate of the bytes held by an object and the objects it
+       refers to through containers.'''
+
+    if seen is None:
+        seen = set()
+
+    if id(o) in seen:
+        return 0
+    seen.add(id(o))
+
+    size = sys.getsizeof(o)
+    if isinstance(o, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in o.iteritems())
+    elif isinstance(o, (list, tuple, set)):
+        size += sum(deep_size(x, seen) for x in o)
+    elif hasattr(o, '__dict__') and not isinstance(o, (type, array, datetime.tzinfo)):
+        size += deep_size(vars(o), seen)
+
+    return size
+
+def year_of_dashes(per_day, timezone):
+    '''Return a year of dashes, per_day on average, with localized times.'''
+
+    rand = random.Random(0)
+    gap = 24 * 3600 / per_day
+
+    dashes = list()
+    t = datetime.datetime(2012, 1, 1)
+    while t < datetime.datetime(2013, 1, 1):
+        t += datetime.timedelta(seconds=rand.randint(gap / 2, 3 * gap / 2))
+        end = t + datetime.timedelta(seconds=rand.randint(1, gap), microseconds=rand.randint(0, 999999))
+        dashes.append(dict(
+            _id='%024x' % rand.getrandbits(96),
+            name='activity %d' % rand.randint(0, 20),
+            timeline='regularityd',
+            start=timezone.localize(t),
+            end=timezone.localize(end)
+        ))
+
+    return dashes
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--per-day', type=int, default=100)
+    parser.add_argument('--calls', type=int, default=5)
+    args = parser.parse_args()
+
+    dashes = year_of_dashes(args.per_day, pytz.timezone('America/New_York'))
+
+    start = time.time()
+    s = EventStats(*dashes)
+    print '%d events, built in %.0f ms' % (len(dashes), 1000 * (time.time() - start))
+    print 'kept: %.1f MB' % (deep_size(s) / 1e6)
+
+    start = time.time()
+    for i in xrange(args.calls):
+        s._durations = None
+        s.min_duration(), s.max_duration(), s.mean_duration(), s.std_duration()
+        s.bin_counts_duration(10)
+        s.bin_counts_time_of_day(24)
+    print 'statistics: %.0f ms a call' % (1000 * (time.time() - start) / args.calls)
@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+'''Measure the modules `bm .` imports, and the time spent importing them, in
+the manner of python -X importtime, which Python 2 does not have. Fails if
+the imports take longer than the budget, or pull in a module the CLI should
+not need. The dot is logged to a local stub server.
+
+    python bench/bench_import.py [--budget ms] [--runs n] [--tree]'''
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from stub_server import StubServer
+
+BM = os.path.join(ROOT, 'bin', 'bm')
+
+# modules for the server and the daemon, or that bm does not use
+FORBIDDEN = ('pymongo', 'bson', 'web', 'dbus', 'gobject', 'readline', 'pkg_resources')
+
+# run in the measured interpreter: wraps __import__ to time every import that
+# loads new modules, then runs bm
+PROBE = r'''
+import __builtin__
+import atexit
+import json
+import os
+import sys
+import time
+
+_import = __builtin__.__import__
+stack = list()
+records = list()
+
+def timed_import(name, *args, **kwargs):
+    loaded = len(sys.modules)
+    start = time.time()
+    stack.append(0.0)
+    try:
+        return _import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - start
+        children = stack.pop()
+        if len(sys.modules) > loaded:
+            if stack:
+                stack[-1] += elapsed
+            records.append((len(stack), name, elapsed - children, elapsed))
+
+def dump():
+    with open(os.environ['IMPORT_RECORDS'], 'w') as records_file:
+        json.dump(dict(records=records, modules=sorted(sys.modules)), records_file)
+
+atexit.register(dump)
+__builtin__.__import__ = timed_import
+
+sys.argv = sys.argv[1:]
+bm = sys.argv[0]
+sys.path[0] = os.path.dirname(bm)
+execfile(bm, dict(__name__='__main__', __file__=bm))
+'''
+
+def measure(config_path, env):
+    '''Log a dot through bm, and return the import records and the names of
+       the modules loaded.'''
+
+    records_path = env['IMPORT_RECORDS']
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, '-c', PROBE, BM, '-c', config_path, '.', 'bench'], env=env, stdout=devnull)
+
+    with open(records_path, 'r') as records_file:
+        data = json.load(records_file)
+
+    return data['records'], data['modules']
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', metavar='ms', type=float, default=150.0,
+                        help='the most time the imports may take')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='the best of this many runs is compared to the budget')
+    parser.add_argument('--tree', action='store_true', default=False,
+                        help='print the time of every import, like -X importtime')
+    args = parser.parse_args()
+
+    server = StubServer().start()
+
+    directory = tempfile.mkdtemp()
+    try:
+        config_path = os.path.join(directory, 'regularity.json')
+        with open(config_path, 'w') as config_file:
+            json.dump(dict(user='bench', host='127.0.0.1', port=server.port, timezone='UTC'), config_file)
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+        env['REGULARITY_AGENT_SOCKET'] = os.path.join(directory, 'no-agent.sock')
+        env['IMPORT_RECORDS'] = os.path.join(directory, 'records.json')
+
+        best = None
+        for i in xrange(args.runs):
+            records, modules = measure(config_path, env)
+            total = sum(cumulative for depth, name, self_, cumulative in records if 0 == depth)
+            if best is None or total < best[0]:
+                best = (total, records, modules)
+    finally:
+        shutil.rmtree(directory)
+        server.stop()
+
+    total, records, modules = best
+
+    if args.tree:
+        print 'import time: self [us] | cumulative | imported package'
+        for depth, name, self_, cumulative in records:
+            print 'import time: %9d | %10d | %s%s' % (1e6 * self_, 1e6 * cumulative, '  ' * depth, name)
+        print
+
+    print 'slowest imports:'
+    top = sorted((r for r in records if 0 == r[0]), key=lambda r: r[3], reverse=True)[:10]
+    for depth, name, self_, cumulative in top:
+        print '  %8.1f ms  %s' % (1000 * cumulative, name)
+
+    print
+    print '%d modules imported in %.1f ms, the budget is %.1f ms' % (len(modules), 1000 * total, args.budget)
+
+    failed = False
+
+    forbidden = sorted(m for m in modules if m.split('.')[0] in FORBIDDEN)
+    if forbidden:
+        print 'FAIL: imported %s' % ', '.join(forbidden)
+        failed = True
+
+    if 1000 * total > args.budget:
+        print 'FAIL: over budget'
+        failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+'''Compare API.localize against the per-datetime times.to_local path it
+replaced, on a dash list response.
+
+    python bench/bench_localize.py [-n events] [-z timezone]'''
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import times
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from regularity.api.client import API
+from regularity.core.recurse import recurse
+
+class RecurseAPI(API):
+    '''The API as it was before bulk localization.'''
+
+    def localize(self, o, *args):
+        keys = set(args)
+        def callback(key, value):
+            if key in keys:
+                return times.to_local(value, self.timezone)
+
+        return recurse(o, callback)
+
+def response(n):
+    '''Return n dashes spread over two years, so the times cross several DST
+       transitions.'''
+
+    start = datetime.datetime(2011, 1, 1)
+    span = 2 * 365 * 24 * 3600
+
+    dashes = list()
+    for i in xrange(n):
+        dash_start = start + datetime.timedelta(seconds=random.randint(0, span))
+        dashes.append(dict(
+            _id='%024x' % i,
+            user='bench',
+            timeline='bench',
+            activity='activity',
+            start=dash_start,
+            end=dash_start + datetime.timedelta(seconds=random.randint(1, 3600))
+        ))
+
+    return dashes
+
+def run(api, data, repeat):
+    '''Return the fastest of repeat localizations of data, in seconds. Every
+       run gets a fresh copy, since API.localize works in place.'''
+
+    best = None
+    for i in xrange(repeat):
+        copy = list(dict(d) for d in data)
+
+        start = time.time()
+        api.localize(copy, 'start', 'end')
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--events', type=int, default=100000)
+    parser.add_argument('-z', '--timezone', default='America/New_York')
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = response(args.events)
+
+    before = run(RecurseAPI(None, None, args.timezone), data, args.repeat)
+    after = run(API(None, None, args.timezone), data, args.repeat)
+
+    print '%d events, %s' % (args.events, args.timezone)
+    print '%-10s %8.3f s' % ('recurse', before)
+    print '%-10s %8.3f s' % ('bulk', after)
+    print '%-10s %8.1fx' % ('speedup', before / after)
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+'''Measure how long the daemon's signal handler spends resolving application
+names, blocking on every switch as it used to versus through the cached,
+asynchronous ApplicationResolver, against a fake bus with a fixed call
+latency.
+
+    python bench/bench_resolver.py [-n switches] [-a applications] [-l ms]'''
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from regularity.daemon.resolver import ApplicationResolver
+
+class FakeBus(object):
+    '''A bus whose blocking calls take latency seconds. Async replies are held
+       until dispatch(), the way the main loop delivers them between signals,
+       since switches are much further apart than a call takes.'''
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.replies = list()
+
+    def add_signal_receiver(self, *args):
+        pass
+
+    def call_blocking(self, bus_name, path, interface, method, signature, args):
+        self.calls += 1
+        time.sleep(self.latency)
+        return 'Application %s' % path
+
+    def call_async(self, bus_name, path, interface, method, signature, args, reply_handler, error_handler):
+        self.calls += 1
+        self.replies.append((reply_handler, 'Application %s' % path))
+
+    def dispatch(self):
+        replies, self.replies = self.replies, list()
+        for reply_handler, name in replies:
+            reply_handler(name)
+
+def switches(n, applications):
+    '''Return n switches between applications, weighted so that a few of them
+       come up most of the time.'''
+
+    paths = list('/org/ayatana/bamf/application%d' % i for i in xrange(applications))
+    weights = list(1.0 / (i + 1) ** 2 for i in xrange(applications))
+    total = sum(weights)
+
+    chosen = list()
+    for i in xrange(n):
+        r = random.random() * total
+        for path, weight in zip(paths, weights):
+            r -= weight
+            if r <= 0:
+                break
+        chosen.append(path)
+
+    return chosen
+
+def blocking(bus, paths):
+    start = time.time()
+    for path in paths:
+        bus.call_blocking('org.ayatana.bamf', path, 'org.ayatana.bamf.view', 'Name', None, tuple())
+    return time.time() - start
+
+def resolved(bus, paths):
+    resolver = ApplicationResolver(bus)
+
+    elapsed = 0.0
+    for path in paths:
+        start = time.time()
+        resolver.resolve(path, lambda application: None)
+        elapsed += time.time() - start
+
+        bus.dispatch()
+
+    return elapsed, resolver.stats()
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--switches', type=int, default=500)
+    parser.add_argument('-a', '--applications', type=int, default=8)
+    parser.add_argument('-l', '--latency', metavar='ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    paths = switches(args.switches, args.applications)
+
+    bus = FakeBus(args.latency / 1000)
+    before = blocking(bus, paths)
+    print '%-10s %8.3f s in handlers   %5d bus calls' % ('blocking', before, bus.calls)
+
+    bus = FakeBus(args.latency / 1000)
+    after, stats = resolved(bus, paths)
+    print '%-10s %8.3f s in handlers   %5d bus calls   hit rate %.2f' % ('resolver', after, bus.calls, stats['hit_rate'])
@@ -0,0 +1,95 @@
+'''A stand-in for the regularity API server, for benchmarks. It answers every
+request from memory, keeps connections alive, and can add a fixed delay to
+each response to imitate a remote server.'''
+
+import BaseHTTPServer
+import json
+import os
+import SocketServer
+import threading
+import time
+import urlparse
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, data):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        body = json.dumps(data)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.server.requests += 1
+
+    def do_GET(self):
+        path = urlparse.urlparse(self.path).path
+        self.respond(self.server.responses.get(path, []))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = dict(urlparse.parse_qsl(self.rfile.read(length)))
+
+        if 'events' in data:
+            events = json.loads(data['events'])
+
+            received = time.time()
+            self.server.received.extend((received, e) for e in events)
+
+            self.respond(list(dict(e, _id=os.urandom(12).encode('hex')) for e in events))
+        else:
+            data['_id'] = os.urandom(12).encode('hex')
+            if 'activity' in data:
+                data['name'] = data.pop('activity')
+            self.respond(data)
+
+    def do_DELETE(self):
+        self.respond(None)
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0, responses=None):
+        '''Create the stub server on a free local port.
+
+           @param delay : optional, float
+               the number of seconds to wait before each response
+           @param responses : optional, dict
+               a mapping of path -> the data to return for GET requests'''
+
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+
+        self.delay = delay
+        self.responses = responses or dict()
+        self.requests = 0
+
+        # (time, event) for every event received in a batch
+        self.received = list()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        '''Serve requests on a background thread.'''
+
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,234 @@
+import errno
+import json
+import logging
+import os
+import socket
+import sys
+from cStringIO import StringIO
+
+# this module is imported by the bm front end before anything else, so it
+# must stay light: no requests, pytz or pymongo
+
+DEFAULT_AGENT_SOCKET = os.path.join('~', '.regularity-agent.sock')
+
+def read_message(connection):
+    '''Read a JSON message from a connection, up to the end of the stream.
+
+       @param connection : socket.socket
+           the connection to read from'''
+
+    chunks = list()
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+
+    return json.loads(''.join(chunks))
+
+class NotListening(socket.error):
+    '''An exception for when no agent listens on the socket, so the command
+       was not sent and may be run some other way'''
+
+class Output(object):
+
+    def __init__(self):
+        '''Create a file-like object capturing what a command prints, as UTF-8
+           bytes, whether it prints unicode or bytes.'''
+
+        self.buffer = StringIO()
+
+    def write(self, s):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        self.buffer.write(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+def forward(path, argv, timeout=60.0):
+    '''Have the agent listening on a Unix socket run a bm command, returning
+       its exit status and output, as unicode. Raises NotListening if no agent
+       is listening. Any other socket.error means the command was sent, and
+       may have run, so it must not be run again.
+
+       @param path : str
+           the location of the agent's socket
+       @param argv : list(str)
+           the command line arguments of bm
+       @param timeout : optional, float
+           the number of seconds to wait for the agent'''
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+
+    try:
+        try:
+            client.connect(path)
+        except socket.error as e:
+            raise NotListening(*e.args)
+
+        client.sendall(json.dumps(dict(argv=argv, cwd=os.getcwd())))
+        client.shutdown(socket.SHUT_WR)
+
+        reply = read_message(client)
+    finally:
+        client.close()
+
+    return reply['status'], reply['output']
+
+def shutdown(path, timeout=5.0):
+    '''Ask the agent listening on a Unix socket to exit.
+
+       @param path : str
+           the location of the agent's socket
+       @param timeout : optional, float
+           the number of seconds to wait for the agent'''
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(dict(stop=True)))
+        client.shutdown(socket.SHUT_WR)
+
+        read_message(client)
+    finally:
+        client.close()
+
+class Agent(object):
+
+    def __init__(self, path, run, idle_timeout=None):
+        '''Create an agent that runs bm commands sent to it over a Unix socket,
+           one at a time, in a process that stays up between them. Whatever
+           the commands keep across calls, such as the configuration and the
+           API's connections to the server, is reused by the next one.
+
+           @param path : str
+               the location of the socket, an existing socket there that no
+               one listens on is replaced
+           @param run : function(argv) -> int
+               runs a command, printing its output, and returns its exit status
+           @param idle_timeout : optional, float
+               the number of seconds without a command after which the agent
+               exits, never if None'''
+
+        self.path = path
+        self.run = run
+        self.idle_timeout = idle_timeout
+
+        self.stopped = False
+        self.commands = 0
+
+        if os.path.exists(path):
+            try:
+                client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                client.connect(path)
+                client.close()
+            except socket.error:
+                os.unlink(path)
+            else:
+                raise BaseException("another agent is listening on '%s'" % path)
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        os.chmod(path, 0600)
+        self.socket.listen(16)
+        self.socket.settimeout(idle_timeout)
+
+    def execute(self, request):
+        '''Run the command of a request, capturing what it prints.
+
+           @param request : dict
+               the argv and cwd of the command'''
+
+        stdout, stderr = sys.stdout, sys.stderr
+        output = Output()
+
+        failure = None
+
+        sys.stdout = sys.stderr = output
+        try:
+            os.chdir(request['cwd'])
+            status = self.run(request['argv'])
+        except SystemExit as e:
+            status = e.code
+        except KeyboardInterrupt:
+            raise
+        except BaseException as e:
+            # the errors of this package are BaseExceptions, one must not take
+            # the agent down with it
+            output.write('%s\n' % e)
+            status = 1
+
+            # logged once the output is no longer captured
+            failure = sys.exc_info()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        if failure is not None:
+            logging.error('command failed: %s' % ' '.join(request['argv']), exc_info=failure)
+
+        if status is None:
+            status = 0
+        elif not isinstance(status, int):
+            output.write('%s\n' % status)
+            status = 1
+
+        self.commands += 1
+        return dict(status=status, output=output.getvalue())
+
+    def serve(self):
+        '''Run commands until stop() is called, or the agent has been idle
+           for idle_timeout seconds.'''
+
+        try:
+            while not self.stopped:
+                try:
+                    connection, address = self.socket.accept()
+                except socket.timeout:
+                    logging.info('idle for %d seconds, exiting' % self.idle_timeout)
+                    break
+                except socket.error as e:
+                    if e.errno != errno.EINTR:
+                        logging.warning('agent socket: %s' % e)
+                    continue
+
+                try:
+                    connection.settimeout(None)
+                    request = read_message(connection)
+
+                    if request.get('stop'):
+                        self.stopped = True
+                        reply = dict(status=0, output='')
+                    else:
+                        reply = self.execute(request)
+
+                    connection.sendall(json.dumps(reply))
+                except Exception as e:
+                    logging.warning('could not answer a request: %s' % e)
+                finally:
+                    connection.close()
+        finally:
+            self.close()
+
+    def stop(self):
+        '''Stop after the command being run.'''
+
+        self.stopped = True
+
+    def close(self):
+        '''Close and remove the socket.'''
+
+        self.socket.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
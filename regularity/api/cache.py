@@ -0,0 +1,133 @@
+import threading
+
+from regularity.core import metrics
+from regularity.utils.lru import LRUCache
+
+class ResponseCache(object):
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=300):
+        '''Create a cache of encoded response bodies, keyed by user, collection
+           and query parameters. Entries are invalidated by the model's write
+           listeners, see invalidate().
+
+           @param max_entries : optional, int
+               the maximum number of responses to hold
+           @param max_bytes : optional, int
+               the maximum total size of the responses held
+           @param ttl : optional, int|float
+               the number of seconds a response is served for'''
+
+        self.lock = threading.Lock()
+        self.cache = LRUCache(max_entries=max_entries, max_size=max_bytes, ttl=ttl, on_evict=self._forget)
+
+        # (user, collection) -> the keys cached for it
+        self.index = dict()
+
+        # (user, collection) -> the number of writes seen for it, used to drop
+        # responses that were computed while a write happened
+        self.generations = dict()
+
+    def key(self, user, collection, params):
+        '''Return the cache key for a request.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user the request is for
+           @param collection : str
+               the name of the collection the request reads
+           @param params : dict
+               the query parameters of the request'''
+
+        params = tuple(sorted((k, v) for k, v in params.iteritems() if v))
+        return (str(user), collection, params)
+
+    def generation(self, key):
+        '''Return the current generation of the (user, collection) a key
+           belongs to. Pass it back to set() to avoid caching stale responses.
+
+           @param key : tuple
+               a key returned by key()'''
+
+        with self.lock:
+            return self.generations.get(key[:2], 0)
+
+    def get(self, key):
+        '''Return the cached response for key, or None.
+
+           @param key : tuple
+               a key returned by key()'''
+
+        with self.lock:
+            body = self.cache.get(key)
+
+        result = 'miss' if body is None else 'hit'
+        metrics.registry.increment('cache_requests_total', collection=key[1], result=result)
+
+        return body
+
+    def set(self, key, body, generation):
+        '''Cache a response, unless a write has happened to its (user,
+           collection) since generation was taken.
+
+           @param key : tuple
+               a key returned by key()
+           @param body : str
+               the encoded response
+           @param generation : int
+               the generation taken before the response was computed'''
+
+        with self.lock:
+            if self.generations.get(key[:2], 0) != generation:
+                return
+
+            if self.cache.set(key, body):
+                self.index.setdefault(key[:2], set()).add(key)
+
+    def invalidate(self, collection, action, document, previous=None):
+        '''Drop every response cached for the user and collection a document
+           belongs to. Meant to be registered with Model.add_listener.
+
+           @param collection : str
+               the name of the collection that was written to
+           @param action : str
+               the kind of write, create, update or delete
+           @param document : dict
+               the document that was written
+           @param previous : optional, dict
+               for updates, the document as it was before the update'''
+
+        group = (str(document['user']), collection)
+
+        with self.lock:
+            self.generations[group] = self.generations.get(group, 0) + 1
+
+            keys = self.index.pop(group, ())
+            for key in keys:
+                self.cache.delete(key)
+
+        metrics.registry.increment('cache_invalidations_total', collection=collection)
+
+    def stats(self):
+        '''Return the counters of the cache.'''
+
+        with self.lock:
+            return dict(
+                entries=len(self.cache),
+                bytes=self.cache.size,
+                hits=self.cache.hits,
+                misses=self.cache.misses,
+                evictions=self.cache.evictions,
+                expirations=self.cache.expirations,
+                hit_rate=self.cache.hit_rate()
+            )
+
+    def _forget(self, key):
+        '''Remove an evicted key from the index.
+
+           @param key : tuple
+               the evicted key'''
+
+        keys = self.index.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.index[key[:2]]
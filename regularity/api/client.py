@@ -1,13 +1,14 @@
-from copy import deepcopy
-import httplib
 import json
-import times
+import time
 import urllib
 
 import requests
+import requests.adapters
+from requests.packages.urllib3.util.retry import Retry
 
 from regularity.core import serializers as _serializers
-from regularity.core.recurse import recurse
+from regularity.core.recurse import locate
+from regularity.utils import tz
 
 def require_user(func):
     '''Wrap a function to check that requires the API to be bound to a user.
@@ -24,23 +25,32 @@ def require_user(func):
         return func(self, *args, **kwargs)
     return wrapper
 
-def request(url, method, data=None, serializers=None):
+class ServerBusy(Exception):
+    '''An exception for when the server turns a request away until later, with
+       a 429 status'''
+
+def request(url, method, data=None, serializers=None, session=None, timeout=None):
     '''Simple function for making a POST request and handling different status
-       codes.
+       codes. Returns None on an error status, and raises ServerBusy on a 429.
 
        @param url : str
            the url to hit
        @param data : optional, dict
            the data to include
        @param serializers : optional, dict
-           a mapping of serializer functions for any fields that need so'''
+           a mapping of serializer functions for any fields that need so
+       @param session : optional, requests.Session
+           the session to make the request through, defaults to a one-off
+           connection
+       @param timeout : optional, float|tuple(float, float)
+           the timeout in seconds, or a (connect, read) tuple of timeouts'''
     
     # serialize any fields that need so
     if data and serializers is not None:
         data = _serializers.serialize(data, **serializers)
 
-    method_fn = getattr(requests, method)
-    response = method_fn(url, data=data)
+    method_fn = getattr(session or requests, method)
+    response = method_fn(url, data=data, timeout=timeout)
 
     if 200 == response.status_code:
         data = response.content
@@ -50,26 +60,101 @@ def request(url, method, data=None, serializers=None):
             data = _serializers.serialize(data, **serializers)
 
         return data
+    elif 429 == response.status_code:
+        raise ServerBusy(url)
     else:
         return None
     
 
 class API(object):
 
-    def __init__(self, host, port, timezone, user=None):
-        '''Create the user-side api.
+    def __init__(self, host, port, timezone, user=None, pool_size=4, connect_timeout=5.0, read_timeout=30.0, retries=0, backoff=0.5, journal=None):
+        '''Create the user-side api. Requests are made through a session that
+           keeps connections to the server alive for reuse, until close() is
+           called.
 
            @param host : str
                the url of the server
            @param port : int
                the port number
            @user : optional, str
-               the user id to bind the API to'''
+               the user id to bind the API to
+           @param pool_size : optional, int
+               the maximum number of connections kept alive
+           @param connect_timeout : optional, float
+               the number of seconds to wait for a connection
+           @param read_timeout : optional, float
+               the number of seconds to wait for a response
+           @param retries : optional, int
+               the number of times to retry a request that could not connect
+           @param backoff : optional, float
+               the backoff factor between retries, the nth retry waits
+               backoff * 2 ** (n - 1) seconds
+           @param journal : optional, regularity.api.journal.Journal
+               if given, dot(), dash(), extend(), pending() and cancel_pending()
+               append to the journal and return immediately, leaving the
+               sending to a regularity.api.journal.JournalFlusher'''
 
         self.base_url = 'http://%s:%d' % (host, port)
         self.timezone = timezone
         self.user = user
 
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.journal = journal
+
+        self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    @property
+    def session(self):
+        '''Return the pooled session, creating it on first use.'''
+
+        if self._session is None:
+            session = requests.Session()
+
+            max_retries = 0
+            if self.retries:
+                max_retries = Retry(total=self.retries, connect=self.retries, read=0, status=0, backoff_factor=self.backoff)
+
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=max_retries)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            self._session = session
+
+        return self._session
+
+    def close(self):
+        '''Close the connections held by the session.'''
+
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def request(self, url, method, timeout=None, **kwargs):
+        '''Make a request through the pooled session, see request().
+
+           @param url : str
+               the url to hit
+           @param method : str
+               the http method
+           @param timeout : optional, tuple(float, float)
+               the (connect, read) timeouts, defaults to the API's
+           @param kwargs : keyword arguments
+               passed on to request()'''
+
+        return request(url, method, session=self.session, timeout=timeout or self.timeout, **kwargs)
+
     def url(self, path, **kwargs):
         '''Form the url to hit for the API path.
 
@@ -93,9 +178,8 @@ class API(object):
 
         url = self.url('/user/create')
 
-        data = request(url, 'post', serializers={
-            '_id' : _serializers.object_id
-        })
+        # the id is only stored, as a string, so it is not deserialized
+        data = self.request(url, 'post', serializers=dict())
 
         return data
     
@@ -110,7 +194,7 @@ class API(object):
 
         url = self.url('/users/%s/dots.json' % self.user, name=name, limit=limit)
 
-        data = request(url, 'get', serializers={
+        data = self.request(url, 'get', serializers={
             'time' : _serializers.datetime
         })
 
@@ -127,6 +211,9 @@ class API(object):
            @param time : datetime
                the UTC time of the event'''
 
+        if self.journal is not None:
+            return self.journal_write('dot', timeline=timeline, activity=activity, time=time)
+
         url = self.url('/users/%s/dots.json' % self.user)
 
         data = dict(
@@ -135,7 +222,7 @@ class API(object):
             time=time
         )
 
-        data = request(url, 'post', data=data, serializers={
+        data = self.request(url, 'post', data=data, serializers={
             'time' : _serializers.datetime
         })
 
@@ -152,12 +239,102 @@ class API(object):
 
         url = self.url('/users/%s/dashes.json' % self.user, name=name, limit=limit)
 
-        data = request(url, 'get', serializers={
+        data = self.request(url, 'get', serializers={
             'start' : _serializers.datetime,
             'end' : _serializers.datetime
         })
 
         return self.localize(data, 'start', 'end')
+
+    @require_user
+    def events(self, types=None, name=None, limit=10):
+        '''Get the most recent events of several types for this user, merged
+           by the server into one list, oldest first. Each event has its 'type'.
+
+           @param types : optional, iterable(str)
+               the types to get, of 'dot', 'dash' and 'pending', all of them
+               if None
+           @param name : optional, str
+               the name of the activity to retrieve
+           @param limit : int
+               the length to limit the results to'''
+
+        if types is not None:
+            types = ','.join(types)
+
+        url = self.url('/users/%s/events.json' % self.user, types=types, name=name, limit=limit)
+
+        data = self.request(url, 'get', serializers={
+            'time' : _serializers.datetime,
+            'start' : _serializers.datetime,
+            'end' : _serializers.datetime
+        })
+
+        return self.localize(data, 'time', 'start', 'end')
+
+    @require_user
+    def iter_dashes(self, name=None, timeline=None, page_size=500):
+        '''Return an iterator over all of the dashes for this user, in order
+           of end time, fetched a page at a time as the iterator is consumed.
+
+           @param name : optional, str
+               the name of the activity to retrieve
+           @param timeline : optional, str
+               the timeline to retrieve
+           @param page_size : optional, int
+               the number of dashes to fetch with each request'''
+
+        after = None
+        after_id = None
+
+        while True:
+            url = self.url('/users/%s/dashes/page.json' % self.user, name=name, timeline=timeline,
+                           after=after, after_id=after_id, limit=page_size)
+
+            data = self.request(url, 'get', serializers={
+                'dashes.start' : _serializers.datetime,
+                'dashes.end' : _serializers.datetime
+            })
+
+            if data is None:
+                raise BaseException('could not fetch the dashes')
+
+            dashes = data['dashes']
+            if not dashes:
+                return
+
+            # the next page starts after the last dash, by its UTC end
+            last = dashes[-1]
+            after = _serializers.datetime(last['end'])
+            after_id = last['_id']
+
+            for dash in self.localize(dashes, 'start', 'end'):
+                yield dash
+
+            if not data['more']:
+                return
+
+    @require_user
+    def stats(self, name=None, timeline=None, duration_bins=5, tod_bins=5, max_duration=None):
+        '''Get the statistics of this user's dashes, computed by the server,
+           see regularity.stats.StreamingEventStats.summary. Returns None if
+           the server cannot compute them.
+
+           @param name : optional, str
+               the name of the activity
+           @param timeline : optional, str
+               the timeline
+           @param duration_bins : optional, int
+               the number of bins to break the durations into
+           @param tod_bins : optional, int
+               the number of bins to break the day into
+           @param max_duration : optional, int
+               if given, dashes longer than this many seconds are skipped'''
+
+        url = self.url('/users/%s/stats.json' % self.user, name=name, timeline=timeline, timezone=self.timezone,
+                       duration_bins=duration_bins, tod_bins=tod_bins, max_duration=max_duration)
+
+        return self.request(url, 'get', serializers=dict())
     
     @require_user
     def dash(self, timeline, activity, start, end): 
@@ -172,6 +349,9 @@ class API(object):
            @param end : datetime
                the UTC time of the end of the activity'''
 
+        if self.journal is not None:
+            return self.journal_write('dash', timeline=timeline, activity=activity, start=start, end=end)
+
         url = self.url('/users/%s/dashes.json' % self.user)
 
         data = dict(
@@ -181,7 +361,33 @@ class API(object):
             end=end
         )
 
-        data = request(url, 'post', data=data, serializers={
+        data = self.request(url, 'post', data=data, serializers={
+            'start' : _serializers.datetime,
+            'end' : _serializers.datetime
+        })
+
+        return self.localize(data, 'start', 'end')
+
+    @require_user
+    def extend(self, dash, end):
+        '''Move the end of a dash later, returning the dash. Cheaper than
+           sending a new dash that overlaps it.
+
+           @param dash : str
+               the id of the dash
+           @param end : datetime
+               the UTC time the activity has lasted until'''
+
+        if self.journal is not None:
+            return self.journal_write('extend', dash=dash, end=end)
+
+        url = self.url('/users/%s/dashes/%s.json' % (self.user, dash))
+
+        data = dict(
+            end=end
+        )
+
+        data = self.request(url, 'put', data=data, serializers={
             'start' : _serializers.datetime,
             'end' : _serializers.datetime
         })
@@ -199,7 +405,7 @@ class API(object):
 
         url = self.url('/users/%s/pendings.json' % self.user, name=name, limit=limit)
 
-        data = request(url, 'get', serializers={
+        data = self.request(url, 'get', serializers={
             'start' : _serializers.datetime
         })
 
@@ -217,6 +423,9 @@ class API(object):
            @param start : datetime
                the UTC time of the start of the activity'''
 
+        if self.journal is not None:
+            return self.journal_write('pending', timeline=timeline, activity=activity, start=start)
+
         url = self.url('/users/%s/pendings.json' % self.user)
 
         data = dict(
@@ -225,7 +434,7 @@ class API(object):
             start=start,
         )
 
-        data = request(url, 'post', data=data, serializers={
+        data = self.request(url, 'post', data=data, serializers={
             'start' : _serializers.datetime,
             'end' : _serializers.datetime,
         })
@@ -243,23 +452,232 @@ class API(object):
            @param name : str
                name of the activity'''
 
+        if self.journal is not None:
+            # journaled, so that it cannot overtake the pending it cancels
+            self.journal_write('cancel_pending', timeline=timeline, activity=activity)
+            return
+
         url = self.url('/user/%s/pending/%s/%s' % (self.user, timeline, activity))
 
-        data = request(url, 'delete')
+        data = self.request(url, 'delete')
+
+    @require_user
+    def batch(self, events):
+        '''Send several writes to the server in one request, returning the
+           written documents in order, with a dict holding an 'error' in
+           place of each write the server rejected.
+
+           @param events : list(dict)
+               the writes, each with a 'type' of 'dot', 'dash', 'extend',
+               'pending' or 'cancel_pending', the arguments the method of
+               the same name takes, and optionally an idempotency 'key' that
+               makes resending the write harmless'''
+
+        events = _serializers.serialize(events, **{
+            'time' : _serializers.datetime,
+            'start' : _serializers.datetime,
+            'end' : _serializers.datetime
+        })
+
+        return self.post_batch(events)
+
+    @require_user
+    def post_batch(self, events):
+        '''Send several writes whose times are already serialized, see batch().
+
+           @param events : list(dict)
+               the serialized writes'''
+
+        url = self.url('/users/%s/batch.json' % self.user)
+
+        data = dict(
+            events=json.dumps(events)
+        )
+
+        data = self.request(url, 'post', data=data, serializers={
+            'time' : _serializers.datetime,
+            'start' : _serializers.datetime,
+            'end' : _serializers.datetime
+        })
+
+        return self.localize(data, 'time', 'start', 'end')
+
+    def journal_write(self, type_, **kwargs):
+        '''Append a write to the journal, returning it the way the server
+           would, with its idempotency key as its id (or, for an extend, the id
+           of the dash).
+
+           @param type_ : str
+               'dot', 'dash', 'extend', 'pending' or 'cancel_pending'
+           @param kwargs : keyword arguments
+               the timeline, activity and times of the write'''
+
+        event = _serializers.serialize(kwargs, **{
+            'time' : _serializers.datetime,
+            'start' : _serializers.datetime,
+            'end' : _serializers.datetime
+        })
+        event['type'] = type_
+
+        key = self.journal.append(event)
+
+        data = dict(kwargs)
+        data['_id'] = data.pop('dash', key)
+        if 'activity' in data:
+            data['name'] = data.pop('activity')
+
+        return self.localize(data, 'time', 'start', 'end')
+
+    @require_user
+    def changes(self, since=0, limit=1000, localize=True):
+        '''Get the changes made to this user's dots, dashes and pendings after
+           sequence number since. Returns a dict with the changes, the seq of
+           the last one, and whether there are more to fetch right away.
+
+           @param since : optional, int
+               the last sequence number seen
+           @param limit : optional, int
+               the maximum number of changes to return
+           @param localize : optional, bool
+               whether to localize the times, or leave them in UTC'''
+
+        url = self.url('/users/%s/changes.json' % self.user, since=since, limit=limit)
+
+        data = self.request(url, 'get', serializers={
+            'changes.time' : _serializers.datetime,
+            'changes.document.time' : _serializers.datetime,
+            'changes.document.start' : _serializers.datetime,
+            'changes.document.end' : _serializers.datetime
+        })
+
+        if not localize:
+            return data
+
+        return self.localize(data, 'changes.time', 'changes.document.time', 'changes.document.start', 'changes.document.end')
+
+    @require_user
+    def timeline(self, start, end, bucket):
+        '''Get the occupied seconds and event counts per activity in each
+           bucket of a timeline, binned by the server.
+
+           @param start : datetime
+               the UTC start time of the first bucket
+           @param end : datetime
+               the UTC end time of the last bucket
+           @param bucket : int
+               the length of a bucket in seconds'''
+
+        url = self.url('/users/%s/timeline.json' % self.user, bucket=bucket, **{
+            'from' : _serializers.datetime(start),
+            'to' : _serializers.datetime(end)
+        })
+
+        data = self.request(url, 'get', serializers={
+            'from' : _serializers.datetime,
+            'to' : _serializers.datetime,
+            'buckets.start' : _serializers.datetime,
+            'buckets.end' : _serializers.datetime
+        })
+
+        return self.localize(data, 'from', 'to', 'buckets.start', 'buckets.end')
+
+    @require_user
+    def feed(self, since=0, epoch=None, timeout=30):
+        '''Wait for the changes made after sequence number since. Returns a
+           dict with the epoch and latest seq of the feed, the events, and a
+           reset flag that is set when the client cannot be caught up from since
+           and should reload its state instead.
+
+           @param since : optional, int
+               the last sequence number seen
+           @param epoch : optional, str
+               the epoch since belongs to
+           @param timeout : optional, int
+               the maximum number of seconds the server waits for a change'''
+
+        url = self.url('/users/%s/feed.json' % self.user, since=since, epoch=epoch, timeout=timeout)
+
+        # the server holds the request for up to timeout seconds
+        connect_timeout, read_timeout = self.timeout
+        data = self.request(url, 'get', timeout=(connect_timeout, read_timeout + timeout), serializers={
+            'events.document.time' : _serializers.datetime,
+            'events.document.start' : _serializers.datetime,
+            'events.document.end' : _serializers.datetime
+        })
+
+        return self.localize(data, 'events.document.time', 'events.document.start', 'events.document.end')
+
+    @require_user
+    def subscribe(self, since=0, epoch=None, timeout=30, retry_delay=5, busy_delay=30):
+        '''Return an iterator over the changes made after sequence number
+           since, long-polling the server forever. Every event carries the epoch
+           and seq to resume from after a reconnect. When the feed cannot catch
+           up, an event with the action 'reset' is produced, after which the
+           caller should reload its state.
+
+           The server only holds so many polls at once, see
+           regularity.api.feed.ChangeFeed. A poll beyond those is turned away,
+           and the subscriber falls back to polling every busy_delay seconds
+           until it is held again.
+
+           @param since : optional, int
+               the last sequence number seen
+           @param epoch : optional, str
+               the epoch since belongs to
+           @param timeout : optional, int
+               the maximum number of seconds each poll waits for a change
+           @param retry_delay : optional, int|float
+               the number of seconds to wait after a failed poll
+           @param busy_delay : optional, int|float
+               the number of seconds to wait after a poll turned away because
+               the server has too many polls waiting'''
+
+        while True:
+            # a server that is down or restarting is waited for like any other
+            # failed poll
+            try:
+                data = self.feed(since=since, epoch=epoch, timeout=timeout)
+            except ServerBusy:
+                time.sleep(busy_delay)
+                continue
+            except requests.exceptions.RequestException:
+                data = None
+
+            if data is None:
+                time.sleep(retry_delay)
+                continue
+
+            epoch = data['epoch']
+
+            if data['reset']:
+                since = data['seq']
+                yield dict(epoch=epoch, seq=since, action='reset')
+                continue
+
+            for event in data['events']:
+                since = event['seq']
+                event['epoch'] = epoch
+                yield event
 
     def localize(self, o, *args):
-        '''Localize the specified keys in o, where o can be arbitrarily nested 
-           lists, dicts, tuples and/or sets.
+        '''Localize the specified keys in o, where o can be arbitrarily nested
+           lists and dicts. The datetimes are replaced in place, and converted
+           all at once, see regularity.utils.tz.Localizer.
 
-           @param o : list|dict|tuple|set
+           @param o : list|dict
                the object to search through for the keys
            @param args : positional arguments
                the keys for datetimes that should be localized'''
 
-        keys = set(args)
-        def callback(key, value):
-            if key in keys:
-                return times.to_local(value, self.timezone)
+        found = locate(o, set(args))
+        if not found:
+            return o
+
+        values = list(value for container, index, value in found)
+        localized = tz.localizer(self.timezone).localize(values)
+
+        for (container, index, value), local in zip(found, localized):
+            container[index] = local
 
-        return recurse(o, callback)
+        return o
 
@@ -0,0 +1,194 @@
+import copy
+import Queue
+import sys
+import threading
+
+from regularity.api.client import API
+
+class Future(object):
+
+    def __init__(self):
+        '''Create a placeholder for the result of a call made on a worker
+           thread.'''
+
+        self.event = threading.Event()
+        self.value = None
+        self.exc_info = None
+
+    def set_result(self, value):
+        self.value = value
+        self.event.set()
+
+    def set_exc_info(self, exc_info):
+        self.exc_info = exc_info
+        self.event.set()
+
+    def done(self):
+        '''Return whether the call has finished.'''
+
+        return self.event.is_set()
+
+    def result(self, timeout=None):
+        '''Wait for the call to finish and return its result, raising what it
+           raised if it failed.
+
+           @param timeout : optional, float
+               the number of seconds to wait, defaults to forever'''
+
+        if not self.event.wait(timeout):
+            raise RuntimeError('timed out waiting for the result')
+
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+        return self.value
+
+def gather(*futures):
+    '''Wait for every future, returning their results in order.
+
+       @param futures : positional arguments, Future
+           the futures to wait for'''
+
+    return list(f.result() for f in futures)
+
+class ConcurrentAPI(object):
+
+    def __init__(self, host, port, timezone, user=None, concurrency=4, **kwargs):
+        '''Create an API whose methods return immediately with a Future, and are
+           carried out by a fixed number of worker threads sharing one pool of
+           connections. The methods, serialization and localization are those
+           of regularity.api.client.API.
+
+           @param host : str
+               the url of the server
+           @param port : int
+               the port number
+           @param timezone : str
+               the timezone results are localized to
+           @param user : optional, str
+               the user id to bind the API to
+           @param concurrency : optional, int
+               the maximum number of requests in flight at once
+           @param kwargs : keyword arguments
+               passed on to API'''
+
+        kwargs.setdefault('pool_size', concurrency)
+        self.api = API(host, port, timezone, user=user, **kwargs)
+
+        self.queue = Queue.Queue()
+        self.workers = list()
+        for i in xrange(concurrency):
+            worker = threading.Thread(target=self.work, name='regularity-api-%d' % i)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def work(self):
+        '''Carry out calls from the queue until told to stop.'''
+
+        while True:
+            call = self.queue.get()
+            if call is None:
+                return
+
+            future, fn, args, kwargs = call
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException:
+                future.set_exc_info(sys.exc_info())
+
+    def submit(self, fn, *args, **kwargs):
+        '''Queue a call for the workers, returning its Future.
+
+           @param fn : function
+               the function to call'''
+
+        future = Future()
+        self.queue.put((future, fn, args, kwargs))
+
+        return future
+
+    def for_user(self, user):
+        '''Return a ConcurrentAPI bound to another user that shares this one's
+           workers and connections.
+
+           @param user : str
+               the user id to bind to'''
+
+        # make sure the session exists before it is shared
+        self.api.session
+
+        other = copy.copy(self)
+        other.api = copy.copy(self.api)
+        other.api.user = user
+
+        return other
+
+    def close(self):
+        '''Stop the workers once the queued calls are done, and close the
+           connections.'''
+
+        for worker in self.workers:
+            self.queue.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.api.close()
+
+    def init(self):
+        '''See API.init.'''
+
+        return self.submit(self.api.init)
+
+    def dots(self, name=None, limit=10):
+        '''See API.dots.'''
+
+        return self.submit(self.api.dots, name=name, limit=limit)
+
+    def dot(self, timeline, activity, time):
+        '''See API.dot.'''
+
+        return self.submit(self.api.dot, timeline, activity, time)
+
+    def dashes(self, name=None, limit=10):
+        '''See API.dashes.'''
+
+        return self.submit(self.api.dashes, name=name, limit=limit)
+
+    def dash(self, timeline, activity, start, end):
+        '''See API.dash.'''
+
+        return self.submit(self.api.dash, timeline, activity, start, end)
+
+    def extend(self, dash, end):
+        '''See API.extend.'''
+
+        return self.submit(self.api.extend, dash, end)
+
+    def pendings(self, name=None, limit=10):
+        '''See API.pendings.'''
+
+        return self.submit(self.api.pendings, name=name, limit=limit)
+
+    def pending(self, timeline, activity, start):
+        '''See API.pending.'''
+
+        return self.submit(self.api.pending, timeline, activity, start)
+
+    def cancel_pending(self, timeline, activity):
+        '''See API.cancel_pending.'''
+
+        return self.submit(self.api.cancel_pending, timeline, activity)
+
+    def batch(self, events):
+        '''See API.batch.'''
+
+        return self.submit(self.api.batch, events)
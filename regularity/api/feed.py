@@ -0,0 +1,163 @@
+from collections import deque
+import os
+import threading
+import time
+
+class FeedBusy(Exception):
+    '''Raised when a subscriber would have to wait, but max_waiters are
+       already waiting.'''
+    pass
+
+class ChangeFeed(object):
+
+    def __init__(self, retain=1000, max_waiters=4):
+        '''Create an in-process feed of the writes made through the model, with
+           a sequence number per user that clients can resume from. Idle
+           subscribers wait on a per-user condition, and are only woken by
+           writes for their own user.
+
+           @param retain : optional, int
+               the number of recent changes to keep per user, a client that
+               falls further behind than this is told to reset
+           @param max_waiters : optional, int
+               the number of subscribers that may wait at once, each one holds
+               a server thread, so this should be well below the size of the
+               server's thread pool. The others are turned away with FeedBusy,
+               and fall back to polling'''
+
+        self.retain = retain
+        self.max_waiters = max_waiters
+        self.waiters = 0
+
+        # identifies this run of the feed, sequence numbers from a previous run
+        # are meaningless to this one
+        self.epoch = os.urandom(8).encode('hex')
+
+        self.lock = threading.Lock()
+        self.sequences = dict()
+        self.changes = dict()
+        self.conditions = dict()
+
+    def _condition(self, user):
+        '''Return the condition subscribers of user wait on. Must be called
+           with the lock held.
+
+           @param user : str
+               the id of the user'''
+
+        condition = self.conditions.get(user)
+        if condition is None:
+            condition = threading.Condition(self.lock)
+            self.conditions[user] = condition
+
+        return condition
+
+    def publish(self, collection, action, document, previous=None):
+        '''Record a write and wake the subscribers of its user. Meant to be
+           registered with Model.add_listener.
+
+           @param collection : str
+               the name of the collection that was written to
+           @param action : str
+               'create', 'update' or 'delete'
+           @param document : dict
+               the document that was written
+           @param previous : optional, dict
+               for updates, the document as it was before the update'''
+
+        user = str(document['user'])
+
+        with self.lock:
+            seq = self.sequences.get(user, 0) + 1
+            self.sequences[user] = seq
+
+            changes = self.changes.get(user)
+            if changes is None:
+                changes = deque(maxlen=self.retain)
+                self.changes[user] = changes
+
+            changes.append(dict(
+                seq=seq,
+                collection=collection,
+                action=action,
+                document=dict(document)
+            ))
+
+            self._condition(user).notify_all()
+
+    def _since(self, user, since, epoch):
+        '''Return the feed response for the changes after since. Must be called
+           with the lock held.
+
+           @param user : str
+               the id of the user
+           @param since : int
+               the last sequence number the client has seen
+           @param epoch : str
+               the epoch the client's sequence number belongs to'''
+
+        seq = self.sequences.get(user, 0)
+        changes = self.changes.get(user, ())
+
+        reset = epoch is not None and epoch != self.epoch
+        if not reset and since < seq:
+            # the client needs changes that are no longer retained
+            reset = not changes or changes[0]['seq'] > since + 1
+        if since > seq:
+            reset = True
+
+        if reset:
+            events = list()
+        else:
+            events = list(c for c in changes if c['seq'] > since)
+
+        return dict(
+            epoch=self.epoch,
+            seq=seq,
+            reset=reset,
+            events=events
+        )
+
+    def wait(self, user, since=0, epoch=None, timeout=30):
+        '''Return the changes for user after sequence number since, waiting up
+           to timeout seconds for one to happen if there are none yet. If the
+           client cannot be caught up from since, the response has reset set,
+           and the client should reload its state and resume from seq. Raises
+           FeedBusy instead of waiting when max_waiters are already waiting.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user
+           @param since : optional, int
+               the last sequence number the client has seen
+           @param epoch : optional, str
+               the epoch the client's sequence number belongs to
+           @param timeout : optional, int|float
+               the maximum number of seconds to wait'''
+
+        user = str(user)
+        deadline = time.time() + timeout
+
+        with self.lock:
+            response = self._since(user, since, epoch)
+            if response['events'] or response['reset'] or timeout <= 0:
+                return response
+
+            if self.waiters >= self.max_waiters:
+                raise FeedBusy()
+
+            condition = self._condition(user)
+            self.waiters += 1
+
+            try:
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return response
+
+                    condition.wait(remaining)
+
+                    response = self._since(user, since, epoch)
+                    if response['events'] or response['reset']:
+                        return response
+            finally:
+                self.waiters -= 1
@@ -0,0 +1,408 @@
+from collections import deque
+import csv
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+
+import pytz
+
+from regularity.core.validation import DateTimeField, StringField, ValidationError, Validator
+
+# the most events the server takes in one batch, see regularity.api.server
+MAX_BATCH_SIZE = 1000
+
+# YYYY-MM-DDTHH:MM[:SS[.ffffff]][Z], with a T or a space
+DATETIME_PATTERN = re.compile(r'^(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d)(?::(\d\d)(?:\.(\d{1,6}))?)?(Z?)$')
+
+class DotRecordValidator(Validator):
+    '''The validator for imported dots'''
+
+    type     = StringField()
+    timeline = StringField()
+    activity = StringField()
+    time     = DateTimeField()
+
+class DashRecordValidator(Validator):
+    '''The validator for imported dashes'''
+
+    type     = StringField()
+    timeline = StringField()
+    activity = StringField()
+    start    = DateTimeField()
+    end      = DateTimeField()
+
+class PendingRecordValidator(Validator):
+    '''The validator for imported pendings'''
+
+    type     = StringField()
+    timeline = StringField()
+    activity = StringField()
+    start    = DateTimeField()
+
+VALIDATORS = dict(
+    dot=DotRecordValidator,
+    dash=DashRecordValidator,
+    pending=PendingRecordValidator
+)
+
+FIELDS = dict(
+    dot=('type', 'timeline', 'activity', 'time'),
+    dash=('type', 'timeline', 'activity', 'start', 'end'),
+    pending=('type', 'timeline', 'activity', 'start')
+)
+
+def parse_datetime(value, timezone=None):
+    '''Parse a datetime matching DATETIME_PATTERN, and return it in UTC.
+
+       @param value : str
+           the datetime
+       @param timezone : optional, pytz.tzinfo.BaseTzInfo
+           the time zone of the datetime, UTC if None'''
+
+    match = DATETIME_PATTERN.match(value.strip())
+    if match is None:
+        raise ValidationError('could not parse the datetime %s' % value)
+
+    year, month, day, hour, minute, second, fraction, utc = match.groups()
+
+    try:
+        parsed = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute),
+                                   int(second or 0), int((fraction or '0').ljust(6, '0')))
+    except ValueError as e:
+        raise ValidationError('could not parse the datetime %s: %s' % (value, e))
+
+    if timezone is not None and not utc:
+        parsed = timezone.localize(parsed).astimezone(pytz.utc).replace(tzinfo=None)
+
+    return parsed
+
+def normalize(raw, timeline, timezone=None):
+    '''Turn a row of a file into a write for API.batch, or raise
+       ValidationError. Columns that are not used are ignored, a 'name' column
+       is taken as the activity, and the type is worked out from the times
+       when the row has none.
+
+       @param raw : dict
+           the row, None for a line that could not be parsed
+       @param timeline : str
+           the timeline for rows that have none
+       @param timezone : optional, pytz.tzinfo.BaseTzInfo
+           the time zone of the times, UTC if None'''
+
+    if not isinstance(raw, dict):
+        raise ValidationError('not an object')
+
+    record = dict((k, v) for k, v in raw.iteritems() if v not in (None, ''))
+
+    if 'activity' not in record and 'name' in record:
+        record['activity'] = record['name']
+
+    record.setdefault('timeline', timeline)
+
+    type_ = record.get('type')
+    if type_ is None:
+        if 'end' in record:
+            type_ = 'dash'
+        elif 'time' in record:
+            type_ = 'dot'
+        else:
+            type_ = 'pending'
+        record['type'] = type_
+
+    if type_ not in VALIDATORS:
+        raise ValidationError('unknown type: %s' % type_)
+
+    record = dict((k, record[k]) for k in FIELDS[type_] if k in record)
+
+    for field in ('time', 'start', 'end'):
+        if isinstance(record.get(field), basestring):
+            record[field] = parse_datetime(record[field], timezone)
+
+    record = VALIDATORS[type_].validate(record)
+
+    if 'dash' == type_ and record['end'] < record['start']:
+        raise ValidationError('end is before start')
+
+    return record
+
+def key(user, record):
+    '''Return the idempotency key of a write, derived from its content, so
+       that importing a file again, or resending part of it, is harmless.
+
+       @param user : str
+           the id of the user
+       @param record : dict
+           the write, see normalize()'''
+
+    content = u'\x1f'.join(unicode(record.get(k)) for k in FIELDS[record['type']])
+    digest = hashlib.sha1((u'%s\x1f%s' % (user, content)).encode('utf-8')).hexdigest()
+
+    return digest[:24]
+
+def decode(value):
+    '''Return a value read from a CSV file, decoded from UTF-8 if it is a
+       byte string.
+
+       @param value : str|list|None
+           a header or cell, extra cells are a list and missing ones None'''
+
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    if isinstance(value, list):
+        return list(decode(v) for v in value)
+
+    return value
+
+def read_records(path, format_=None):
+    '''Return an iterator over the rows of a UTF-8 CSV file with a header, or
+       of a file of JSON objects, one per line.
+
+       @param path : str
+           the location of the file
+       @param format_ : optional, str
+           'csv' or 'ndjson', worked out from the extension if None'''
+
+    if format_ is None:
+        extension = os.path.splitext(path)[1].lower()
+        format_ = 'csv' if '.csv' == extension else 'ndjson'
+
+    with open(path, 'rb') as records_file:
+        if 'csv' == format_:
+            for row in csv.DictReader(records_file):
+                # the csv module reads bytes, the cells are decoded here so
+                # that names outside ascii survive, a row that is not utf-8 is
+                # passed on as None, to be counted as invalid
+                try:
+                    yield dict((decode(k), decode(v)) for k, v in row.iteritems())
+                except UnicodeDecodeError:
+                    yield None
+        else:
+            for line in records_file:
+                line = line.strip()
+                if not line:
+                    continue
+
+                # a line that cannot be parsed is passed on as None, to be
+                # counted as invalid
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+class Checkpoint(object):
+
+    def __init__(self, path, source):
+        '''Create a record of how far into a file an import got.
+
+           @param path : str
+               the location of the checkpoint file
+           @param source : str
+               the location of the file being imported'''
+
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        '''Return the number of rows imported before, 0 if there is no
+           checkpoint.'''
+
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, 'r') as checkpoint_file:
+            data = json.load(checkpoint_file)
+
+        if data['source'] != self.source:
+            raise BaseException('the checkpoint at %s is for %s' % (self.path, data['source']))
+
+        return data['rows']
+
+    def save(self, rows):
+        '''Record that the first rows rows are imported.
+
+           @param rows : int
+               the number of rows'''
+
+        tmp_path = '%s.tmp' % self.path
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(dict(source=self.source, rows=rows), checkpoint_file)
+
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class Importer(object):
+
+    def __init__(self, api, user, timeline='import', timezone=None, batch_size=500, in_flight=8, retries=3, retry_delay=1.0,
+                 checkpoint=None, progress=None, progress_interval=1.0):
+        '''Create an importer that validates rows and sends them in batches,
+           several at a time.
+
+           @param api : regularity.api.fanout.ConcurrentAPI
+               the API to send the batches through, batch() must return a
+               future
+           @param user : str
+               the id of the user, for the idempotency keys
+           @param timeline : optional, str
+               the timeline for rows that have none
+           @param timezone : optional, pytz.tzinfo.BaseTzInfo
+               the time zone of the times in the rows, UTC if None
+           @param batch_size : optional, int
+               the number of writes in a batch
+           @param in_flight : optional, int
+               the most batches sent and not yet answered
+           @param retries : optional, int
+               the number of times a failed batch is sent again
+           @param retry_delay : optional, float
+               the number of seconds to wait before the first retry, doubled
+               for each one after
+           @param checkpoint : optional, Checkpoint
+               where to record the progress, so an interrupted import can be
+               resumed
+           @param progress : optional, function(dict)
+               called with stats() at most every progress_interval seconds
+           @param progress_interval : optional, float
+               the number of seconds between calls to progress'''
+
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError('batch_size must be between 1 and %d' % MAX_BATCH_SIZE)
+
+        self.api = api
+        self.user = user
+        self.timeline = timeline
+        self.timezone = timezone
+        self.batch_size = batch_size
+        self.in_flight = in_flight
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+        self.skipped = 0
+        self.imported = 0
+        self.invalid = 0
+        self.errors = list()
+
+        self.started = None
+        self.reported = None
+
+    def stats(self):
+        '''Return the counts of rows skipped as imported before, imported and
+           invalid, and the rate of the import in rows per second.'''
+
+        elapsed = time.time() - self.started if self.started else 0.0
+
+        return dict(
+            skipped=self.skipped,
+            imported=self.imported,
+            invalid=self.invalid,
+            elapsed=elapsed,
+            rate=self.imported / elapsed if elapsed else 0.0
+        )
+
+    def report(self, force=False):
+        if self.progress is None:
+            return
+
+        now = time.time()
+        if force or now - self.reported >= self.progress_interval:
+            self.reported = now
+            self.progress(self.stats())
+
+    def send(self, events):
+        '''Send a batch, returning the future of its result.'''
+
+        return self.api.batch(events)
+
+    def wait(self, pending):
+        '''Wait for the oldest batch sent, sending it again if it failed.
+           Batches finish in the order they were sent, so the checkpoint
+           always covers a prefix of the file.
+
+           @param pending : deque
+               the (events, rows read so far, future) of the batches sent'''
+
+        events, rows, future = pending.popleft()
+
+        for attempt in xrange(self.retries + 1):
+            try:
+                result = future.result()
+            except Exception:
+                result = None
+
+            if result is not None:
+                break
+
+            if attempt < self.retries:
+                time.sleep(min(self.retry_delay * 2 ** attempt, 30))
+                future = self.send(events)
+        else:
+            raise BaseException('could not send a batch after %d attempts' % (self.retries + 1))
+
+        rejected = list(r for r in result if isinstance(r, dict) and 'error' in r)
+        self.imported += len(events) - len(rejected)
+        self.invalid += len(rejected)
+
+        if self.checkpoint is not None:
+            self.checkpoint.save(rows)
+
+        self.report()
+
+    def run(self, rows):
+        '''Import the rows, resuming from the checkpoint if there is one, and
+           return stats().
+
+           @param rows : iterable(dict)
+               the rows, see read_records()'''
+
+        self.started = self.reported = time.time()
+
+        done = 0
+        if self.checkpoint is not None:
+            done = self.checkpoint.load()
+
+        pending = deque()
+        events = list()
+        n = 0
+
+        for n, raw in enumerate(rows, 1):
+            if n <= done:
+                self.skipped += 1
+                continue
+
+            try:
+                record = normalize(raw, self.timeline, self.timezone)
+            except ValidationError as e:
+                self.invalid += 1
+                if len(self.errors) < 10:
+                    self.errors.append((n, str(e)))
+                continue
+
+            record['key'] = key(self.user, record)
+            events.append(record)
+
+            if len(events) == self.batch_size:
+                pending.append((events, n, self.send(events)))
+                events = list()
+
+                if len(pending) >= self.in_flight:
+                    self.wait(pending)
+
+        if events:
+            pending.append((events, n, self.send(events)))
+
+        while pending:
+            self.wait(pending)
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+        self.report(force=True)
+
+        return self.stats()
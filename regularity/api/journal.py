@@ -0,0 +1,281 @@
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+def new_key():
+    '''Return a new idempotency key. Keys are 24 hex characters, so the server
+       can use them as object ids, which makes resending a write harmless.'''
+
+    return os.urandom(12).encode('hex')
+
+class Journal(object):
+
+    def __init__(self, path, fsync='always', fsync_interval=1.0, compact_threshold=1000):
+        '''Open (or create) an append-only journal of writes waiting to be sent
+           to the server. Every write is a line of JSON; acknowledgements are
+           appended as lines of their own, and the file is rewritten without the
+           acknowledged writes once enough have piled up.
+
+           @param path : str
+               the location of the journal file
+           @param fsync : optional, str
+               when to fsync the file: 'always' after every append, 'interval'
+               at most every fsync_interval seconds, or 'never'
+           @param fsync_interval : optional, float
+               the number of seconds between fsyncs for the 'interval' policy
+           @param compact_threshold : optional, int
+               the number of acknowledged writes after which to compact'''
+
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('fsync must be one of %s' % ', '.join(FSYNC_POLICIES))
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.Lock()
+        self.appended = threading.Event()
+
+        # key -> event, for the writes that have not been acknowledged
+        self.pending = OrderedDict()
+        self.acked = 0
+        self.last_sync = time.time()
+
+        self.load()
+        self.file = open(self.path, 'a')
+
+    def __len__(self):
+        return len(self.pending)
+
+    def load(self):
+        '''Read the unacknowledged writes from the journal file. A partially
+           written last line, from a crash mid-append, is ignored.'''
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning("skipping corrupt line in journal '%s'" % self.path)
+                    continue
+
+                if 'ack' in record:
+                    for key in record['ack']:
+                        if self.pending.pop(key, None) is not None:
+                            self.acked += 1
+                else:
+                    self.pending[record['key']] = record['event']
+
+    def _write(self, record):
+        '''Append a record to the file, syncing it according to the fsync
+           policy. Must be called with the lock held.
+
+           @param record : dict
+               the record to write'''
+
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+        now = time.time()
+        if self.fsync == 'always' or (self.fsync == 'interval' and now - self.last_sync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_sync = now
+
+    def append(self, event, key=None):
+        '''Durably record a write, returning its idempotency key. The key is
+           also stored in the event.
+
+           @param event : dict
+               the JSON serializable write
+           @param key : optional, str
+               the key the write already has, a new one is made otherwise'''
+
+        if key is None:
+            key = new_key()
+        event['key'] = key
+
+        with self.lock:
+            self._write(dict(key=key, event=event))
+            self.pending[key] = event
+
+        self.appended.set()
+
+        return key
+
+    def prepend(self, events):
+        '''Durably record writes that were made before the ones already in the
+           journal, keeping their keys. The journal is rewritten to put them
+           first.
+
+           @param events : list(dict)
+               the JSON serializable writes, each with its key'''
+
+        with self.lock:
+            pending = OrderedDict((e['key'], e) for e in events)
+            pending.update(self.pending)
+            self.pending = pending
+
+            self._compact()
+
+    def peek(self, limit):
+        '''Return up to limit of the oldest unacknowledged writes.
+
+           @param limit : int
+               the maximum number of writes to return'''
+
+        with self.lock:
+            events = list()
+            for event in self.pending.itervalues():
+                if len(events) >= limit:
+                    break
+                events.append(event)
+
+            return events
+
+    def ack(self, keys):
+        '''Record that writes have been applied by the server, compacting the
+           journal if enough have been acknowledged.
+
+           @param keys : list(str)
+               the keys of the acknowledged writes'''
+
+        with self.lock:
+            keys = list(k for k in keys if k in self.pending)
+            if not keys:
+                return
+
+            self._write(dict(ack=keys))
+
+            for key in keys:
+                del self.pending[key]
+            self.acked += len(keys)
+
+            if self.acked >= self.compact_threshold:
+                self._compact()
+
+    def sync(self):
+        '''Fsync everything written so far.'''
+
+        with self.lock:
+            os.fsync(self.file.fileno())
+            self.last_sync = time.time()
+
+    def compact(self):
+        '''Rewrite the journal with only the unacknowledged writes.'''
+
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        '''Rewrite the journal with only the unacknowledged writes. Must be
+           called with the lock held.'''
+
+        tmp_path = '%s.tmp' % self.path
+
+        with open(tmp_path, 'w') as tmp_file:
+            for key, event in self.pending.iteritems():
+                tmp_file.write(json.dumps(dict(key=key, event=event), separators=(',', ':')) + '\n')
+
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        self.file.close()
+        os.rename(tmp_path, self.path)
+        self.file = open(self.path, 'a')
+
+        self.acked = 0
+
+    def close(self):
+        '''Sync and close the journal file.'''
+
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+class JournalFlusher(threading.Thread):
+
+    def __init__(self, api, journal, batch_size=100, interval=1.0, max_interval=60.0):
+        '''Create a thread that drains a journal to the server in batches.
+
+           @param api : regularity.api.client.API
+               the API to send the writes with
+           @param journal : Journal
+               the journal to drain
+           @param batch_size : optional, int
+               the maximum number of writes sent per request
+           @param interval : optional, float
+               the longest the thread waits between drains, in seconds
+           @param max_interval : optional, float
+               the longest the thread backs off after failed sends'''
+
+        super(JournalFlusher, self).__init__(name='journal-flusher')
+        self.daemon = True
+
+        self.api = api
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+
+        self.stopped = threading.Event()
+
+    def flush(self):
+        '''Send batches until the journal is empty, returning False if a send
+           failed.'''
+
+        while True:
+            events = self.journal.peek(self.batch_size)
+            if not events:
+                return True
+
+            try:
+                data = self.api.post_batch(events)
+            except Exception as e:
+                logging.warning('could not send journaled writes: %s' % e)
+                return False
+
+            if data is None:
+                logging.warning('the server rejected a batch of journaled writes')
+                return False
+
+            self.journal.ack(list(e['key'] for e in events))
+
+    def run(self):
+        delay = self.interval
+
+        while not self.stopped.is_set():
+            if self.flush():
+                delay = self.interval
+
+                self.journal.appended.wait(delay)
+                self.journal.appended.clear()
+            else:
+                # back off, without being woken by new writes
+                delay = min(delay * 2, self.max_interval)
+                self.stopped.wait(delay)
+
+            if self.journal.fsync == 'interval':
+                self.journal.sync()
+
+    def stop(self, flush=True):
+        '''Stop the thread, making a last attempt to drain the journal.
+
+           @param flush : optional, bool
+               whether to try to drain the journal before returning'''
+
+        self.stopped.set()
+        self.journal.appended.set()
+        self.join()
+
+        if flush:
+            self.flush()
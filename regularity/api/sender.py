@@ -0,0 +1,230 @@
+from collections import deque
+import itertools
+import logging
+import threading
+
+from regularity.api.journal import new_key
+from regularity.core import metrics
+from regularity.core import serializers as _serializers
+
+SERIALIZERS = {
+    'time' : _serializers.datetime,
+    'start' : _serializers.datetime,
+    'end' : _serializers.datetime
+}
+
+class EventSender(threading.Thread):
+
+    def __init__(self, api, capacity=10000, batch_size=100, interval=1.0, max_interval=60.0, spill=None, durable=False):
+        '''Create a thread that sends writes to the server in the background.
+           Writes are queued in memory and sent in batches, so that queueing a
+           write never waits on the network.
+
+           Once capacity writes are queued, further writes spill to a journal
+           on disk, and keep spilling until the journal has been drained, so
+           that writes are sent in the order they were made. Without a journal
+           the oldest queued writes are dropped instead. If durable, every
+           write goes to the journal before put() returns, so that no write
+           that was accepted is lost in a crash.
+
+           @param api : regularity.api.client.API
+               the API to send the writes with, bound to a user
+           @param capacity : optional, int
+               the maximum number of writes held in memory
+           @param batch_size : optional, int
+               the maximum number of writes sent per request
+           @param interval : optional, float
+               the longest a write waits to be sent, in seconds
+           @param max_interval : optional, float
+               the longest the thread backs off after failed sends
+           @param spill : optional, regularity.api.journal.Journal
+               the journal to spill to, writes left in it from a previous run
+               are sent too
+           @param durable : optional, bool
+               whether to write every write to the journal first, rather than
+               only those that overflow the queue'''
+
+        super(EventSender, self).__init__(name='event-sender')
+        self.daemon = True
+
+        self.api = api
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.spill = spill
+        self.durable = durable and spill is not None
+
+        # the queue holds (sequence number, write), so that a flush removes
+        # exactly the writes it sent, even if put() dropped some meanwhile
+        self.lock = threading.Lock()
+        self.queue = deque()
+        self.sequence = itertools.count()
+        self.queued = threading.Event()
+        self.stopped = threading.Event()
+
+        self.sent = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def __len__(self):
+        size = len(self.queue)
+        if self.spill is not None:
+            size += len(self.spill)
+        return size
+
+    def put(self, type_, **kwargs):
+        '''Queue a write, returning its idempotency key.
+
+           @param type_ : str
+               'dot', 'dash', 'extend', 'pending' or 'cancel_pending'
+           @param kwargs : keyword arguments
+               the arguments of the write, see
+               regularity.api.client.API.batch'''
+
+        event = _serializers.serialize(kwargs, **SERIALIZERS)
+        event['type'] = type_
+
+        with self.lock:
+            if self.spill is not None and (self.durable or len(self.spill) or len(self.queue) >= self.capacity):
+                self.spilled += 1
+                return self.spill.append(event)
+
+            if len(self.queue) >= self.capacity:
+                self.queue.popleft()
+                self.dropped += 1
+                if self.dropped == 1:
+                    logging.warning('event queue full, dropping the oldest events')
+
+            event['key'] = new_key()
+            self.queue.append((self.sequence.next(), event))
+
+        if len(self.queue) >= self.batch_size:
+            self.queued.set()
+
+        return event['key']
+
+    def dot(self, timeline, activity, time):
+        return self.put('dot', timeline=timeline, activity=activity, time=time)
+
+    def dash(self, timeline, activity, start, end):
+        return self.put('dash', timeline=timeline, activity=activity, start=start, end=end)
+
+    def extend(self, dash, end):
+        return self.put('extend', dash=dash, end=end)
+
+    def pending(self, timeline, activity, start):
+        return self.put('pending', timeline=timeline, activity=activity, start=start)
+
+    def cancel_pending(self, timeline, activity):
+        return self.put('cancel_pending', timeline=timeline, activity=activity)
+
+    def send(self, events):
+        '''Send a batch of serialized writes, returning whether the server
+           accepted them.
+
+           @param events : list(dict)
+               the writes'''
+
+        registry = metrics.registry
+
+        try:
+            with registry.timer('sender_request_seconds'):
+                data = self.api.post_batch(events)
+        except Exception as e:
+            logging.warning('could not send events: %s' % e)
+            registry.increment('sender_batches_total', result='error')
+            return False
+
+        if data is None:
+            logging.warning('the server rejected a batch of events')
+            registry.increment('sender_batches_total', result='rejected')
+            return False
+
+        registry.increment('sender_batches_total', result='ok')
+        registry.increment('sender_events_total', len(events))
+
+        self.sent += len(events)
+        return True
+
+    def flush(self):
+        '''Send batches until the queue and the spill journal are empty,
+           returning False if a send failed. The queue is drained first, since
+           it holds the writes made before the spilling started.'''
+
+        while self.queue:
+            with self.lock:
+                batch = list(itertools.islice(self.queue, self.batch_size))
+
+            if not self.send(list(event for n, event in batch)):
+                return False
+
+            # the writes sent, and any dropped while they were sent, are the
+            # ones up to the last sequence number sent
+            last = batch[-1][0]
+            with self.lock:
+                while self.queue and self.queue[0][0] <= last:
+                    self.queue.popleft()
+
+        if self.spill is None:
+            return True
+
+        while True:
+            events = self.spill.peek(self.batch_size)
+            if not events:
+                return True
+
+            if not self.send(events):
+                return False
+
+            self.spill.ack(list(e['key'] for e in events))
+
+    def run(self):
+        delay = self.interval
+
+        while not self.stopped.is_set():
+            if self.flush():
+                delay = self.interval
+
+                self.queued.wait(delay)
+                self.queued.clear()
+            else:
+                # back off, without being woken by new writes
+                delay = min(delay * 2, self.max_interval)
+                self.stopped.wait(delay)
+
+    def stop(self, flush=True):
+        '''Stop the thread, making a last attempt to send everything queued.
+           Writes that still could not be sent are moved to the spill journal,
+           if there is one, to be sent on the next run.
+
+           @param flush : optional, bool
+               whether to try to send the queue before returning'''
+
+        self.stopped.set()
+        self.queued.set()
+        self.join()
+
+        if flush:
+            self.flush()
+
+        with self.lock:
+            if not self.queue:
+                return
+
+            if self.spill is not None:
+                # the queued writes are older than any that spilled
+                self.spill.prepend(list(event for n, event in self.queue))
+                self.queue.clear()
+            else:
+                logging.error('%d events could not be sent' % len(self.queue))
+
+    def stats(self):
+        '''Return the counts of queued, sent, spilled and dropped writes.'''
+
+        return dict(
+            queued=len(self),
+            sent=self.sent,
+            spilled=self.spilled,
+            dropped=self.dropped
+        )
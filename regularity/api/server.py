@@ -1,13 +1,48 @@
+from itertools import islice
 import json
 import logging
 import os
 import sys
 import urlparse
 
+from pymongo.errors import InvalidId
 import web
 
-from regularity.core import serializers
+from regularity.api.cache import ResponseCache
+from regularity.api.feed import ChangeFeed, FeedBusy
+from regularity.core import metrics, serializers
 from regularity.core.model import Model
+from regularity.core.validation import ValidationError
+from regularity.stats import StreamingEventStats
+from regularity.utils import tz
+
+# the most buckets a single timeline request may ask for
+MAX_TIMELINE_BUCKETS = 10000
+
+# the longest a feed request may wait for a change, in seconds
+MAX_FEED_TIMEOUT = 60
+
+# the most feed requests that may wait at once, each one holds one of the
+# server's threads (web.py runs 10), so this stays well below the pool size.
+# The subscribers beyond it are answered 429 and poll every busy_delay seconds
+# instead, see API.subscribe, a server run with more threads should raise it
+# through feed.max_waiters in the config
+MAX_FEED_WAITERS = 4
+
+# the most writes a single batch request may carry
+MAX_BATCH_EVENTS = 1000
+
+# the most changes a single changes request may return
+MAX_CHANGES = 1000
+
+# the most dashes a single page request may return
+MAX_PAGE = 1000
+
+# the most events a single events request may return
+MAX_EVENTS = 1000
+
+# the number of dashes the stats handler reads and localizes at a time
+STATS_CHUNK = 1000
 
 config_path = os.environ.get('REGULARITY_API_CONFIG')
 if config_path is None:
@@ -19,11 +54,23 @@ with open(config_path, 'r') as config_file:
         config = json.load(config_file)
 
         db = config['db']
+        metrics_config = config.get('metrics', dict())
+        cache_config = config.get('cache', dict())
+        feed_config = config.get('feed', dict())
 
     except (Exception, BaseException) as e:
         logging.critical(str(e))
         raise e
 
+    if metrics_config.get('enabled'):
+        # must be enabled before the model is created, so that its database
+        # connection gets instrumented
+        metrics.registry.enable()
+
+        log_interval = metrics_config.get('log_interval')
+        if log_interval:
+            metrics.Reporter(metrics.registry, log_interval).start()
+
     model = Model(
         host=db['host'],
         port=db['port'],
@@ -33,6 +80,21 @@ with open(config_path, 'r') as config_file:
     )
     model = model
 
+    response_cache = None
+    if cache_config.get('enabled'):
+        response_cache = ResponseCache(
+            max_entries=cache_config.get('max_entries', 1024),
+            max_bytes=cache_config.get('max_bytes', 16 * 1024 * 1024),
+            ttl=cache_config.get('ttl', 300),
+        )
+        model.add_listener(response_cache.invalidate)
+
+    change_feed = ChangeFeed(
+        retain=feed_config.get('retain', 1000),
+        max_waiters=feed_config.get('max_waiters', MAX_FEED_WAITERS),
+    )
+    model.add_listener(change_feed.publish)
+
 
 def encode_json(**kwargs):
     '''Create a decorator for a function that encodes its return value as JSON.
@@ -45,22 +107,70 @@ def encode_json(**kwargs):
 
     def decorator(func):
         def wrapper(*args, **kwargs):
-            data = dict(web.input())
+            registry = metrics.registry
+            endpoint = '%s.%s' % (type(args[0]).__name__, func.__name__)
+
+            with registry.timer('request_seconds', endpoint=endpoint):
+                with registry.timer('phase_seconds', endpoint=endpoint, phase='parse'):
+                    data = dict(web.input())
 
-            data = serializers.serialize(data, **_serializers)
+                    # a parameter that cannot be deserialized, such as a
+                    # malformed time, is the client's error
+                    try:
+                        data = serializers.serialize(data, **_serializers)
+                    except (TypeError, ValueError, InvalidId):
+                        raise web.badrequest()
 
-            kwargs.update(data)
-            data = func(*args, **kwargs)
+                kwargs.update(data)
+                with registry.timer('phase_seconds', endpoint=endpoint, phase='handler'):
+                    data = func(*args, **kwargs)
 
-            if data is not None:
-                data = serializers.serialize(data, **_serializers)
-                return json.dumps(data)
+                if data is not None:
+                    with registry.timer('phase_seconds', endpoint=endpoint, phase='serialize'):
+                        data = serializers.serialize(data, **_serializers)
 
-            web.header('Content-Type', 'application/json')
+                    with registry.timer('phase_seconds', endpoint=endpoint, phase='encode'):
+                        data = json.dumps(data)
+
+                    registry.observe('response_bytes', len(data), endpoint=endpoint)
+                    return data
+
+                web.header('Content-Type', 'application/json')
             
         return wrapper
     return decorator
 
+def cached(collection):
+    '''Create a decorator for a GET handler whose encoded response can be served
+       from the response cache. The decorator must be applied on top of
+       encode_json, so that the cache holds encoded bodies.
+
+       @param collection : str
+           the name of the collection the handler reads, writes to this
+           collection invalidate the cached responses'''
+
+    def decorator(func):
+        def wrapper(self, client, **kwargs):
+            if response_cache is None:
+                return func(self, client, **kwargs)
+
+            key = response_cache.key(client, collection, web.input())
+
+            body = response_cache.get(key)
+            if body is not None:
+                return body
+
+            generation = response_cache.generation(key)
+            body = func(self, client, **kwargs)
+
+            if body is not None:
+                response_cache.set(key, body, generation)
+
+            return body
+
+        return wrapper
+    return decorator
+
 class ClientAPI(object):
 
     @encode_json(**{
@@ -73,6 +183,7 @@ class ClientAPI(object):
 
 class DotAPI(object):
 
+    @cached('dots')
     @encode_json(**{
         'limit' : serializers.int, 
         '_id' : serializers.object_id, 
@@ -98,6 +209,7 @@ class DotAPI(object):
 
 class DashAPI(object):
 
+    @cached('dashes')
     @encode_json(**{
         'limit' : serializers.int, 
         '_id' : serializers.object_id, 
@@ -125,8 +237,25 @@ class DashAPI(object):
 
         return dash
 
+class DashInstanceAPI(object):
+
+    @encode_json(**{
+        '_id' : serializers.object_id,
+        'user' : serializers.object_id,
+        'start' : serializers.datetime,
+        'end' : serializers.datetime
+    })
+    def PUT(self, client, dash, end):
+        dash = model.dashes.extend(client, dash, end)
+
+        if dash is None:
+            raise web.notfound()
+
+        return dash
+
 class PendingAPI(object):
 
+    @cached('pendings')
     @encode_json(**{
         'limit' : serializers.int, 
         '_id' : serializers.object_id, 
@@ -158,4 +287,237 @@ class PendingInstanceAPI(object):
 
         model.cancel_pending(client, timeline, activity)
 
+class EventAPI(object):
+
+    TYPES = ('dot', 'dash', 'pending')
+
+    @encode_json(**{
+        'limit' : serializers.int,
+        '_id' : serializers.object_id,
+        'user' : serializers.object_id,
+        'time' : serializers.datetime,
+        'start' : serializers.datetime,
+        'end' : serializers.datetime
+    })
+    def GET(self, client, types=','.join(TYPES), name=None, limit=10):
+        limit = min(max(limit, 1), MAX_EVENTS)
+
+        types = types.split(',')
+        if not all(t in self.TYPES for t in types):
+            raise web.badrequest()
+
+        return model.recent(client, limit, types=types, name=name)
+
+class BatchAPI(object):
+
+    TYPES = ('dot', 'dash', 'extend', 'pending', 'cancel_pending')
+
+    def apply(self, client, event):
+        '''Apply one write of a batch, returning the written document.
+
+           @param client : str
+               the id of the user
+           @param event : dict
+               the write'''
+
+        type_ = event['type']
+
+        if 'extend' == type_:
+            return model.dashes.extend(client, event['dash'], event['end'])
+
+        timeline = event['timeline']
+        activity = event['activity']
+        key = event.get('key')
+
+        if 'dot' == type_:
+            return model.dots.create(client, timeline, activity, event['time'], _id=key)
+
+        if 'dash' == type_:
+            return model.dashes.create(client, timeline, activity, event['start'], event['end'], _id=key)
+
+        if 'pending' == type_:
+            return model.pendings.create(client, timeline, activity, event['start'], _id=key)
+
+        model.cancel_pending(client, timeline, activity)
+
+    @encode_json(**{
+        '_id' : serializers.object_id,
+        'user' : serializers.object_id,
+        'time' : serializers.datetime,
+        'start' : serializers.datetime,
+        'end' : serializers.datetime
+    })
+    def POST(self, client, events):
+        try:
+            events = json.loads(events)
+        except ValueError:
+            raise web.badrequest()
+
+        if not isinstance(events, list) or len(events) > MAX_BATCH_EVENTS:
+            raise web.badrequest()
+
+        # an invalid write is answered with an error in its place, rather than
+        # failing the batch, which the sender would then retry forever
+        results = list()
+        for event in events:
+            try:
+                if not isinstance(event, dict) or event.get('type') not in self.TYPES:
+                    raise ValidationError('unknown type')
+
+                event = serializers.serialize(event, **{
+                    'time' : serializers.datetime,
+                    'start' : serializers.datetime,
+                    'end' : serializers.datetime
+                })
+
+                results.append(self.apply(client, event))
+            except (KeyError, TypeError, ValueError, InvalidId, ValidationError) as e:
+                logging.warning('rejected a write of a batch: %r' % e)
+                results.append(dict(error=str(e) or type(e).__name__))
+
+        return results
+
+class TimelineAPI(object):
+
+    @encode_json(**{
+        'from' : serializers.datetime,
+        'to' : serializers.datetime,
+        'bucket' : serializers.int,
+        'buckets.start' : serializers.datetime,
+        'buckets.end' : serializers.datetime
+    })
+    def GET(self, client, to=None, bucket=None, **kwargs):
+        # from is a keyword, so it cannot be a parameter
+        start = kwargs.get('from')
+        end = to
+
+        if start is None or end is None or bucket is None:
+            raise web.badrequest()
+
+        if bucket <= 0 or end <= start:
+            raise web.badrequest()
+
+        if (end - start).total_seconds() / bucket > MAX_TIMELINE_BUCKETS:
+            raise web.badrequest()
+
+        buckets = model.timeline(client, start, end, bucket)
+
+        return {
+            'from' : start,
+            'to' : end,
+            'bucket' : bucket,
+            'buckets' : buckets
+        }
+
+class FeedAPI(object):
+
+    @encode_json(**{
+        'since' : serializers.int,
+        'timeout' : serializers.int,
+        'events.document._id' : serializers.object_id,
+        'events.document.user' : serializers.object_id,
+        'events.document.time' : serializers.datetime,
+        'events.document.start' : serializers.datetime,
+        'events.document.end' : serializers.datetime
+    })
+    def GET(self, client, since=0, epoch=None, timeout=30):
+        timeout = min(max(timeout, 0), MAX_FEED_TIMEOUT)
+
+        try:
+            return change_feed.wait(client, since=since, epoch=epoch, timeout=timeout)
+        except FeedBusy:
+            # too many long-polls already hold threads, the client falls back
+            # to polling
+            raise web.HTTPError('429 Too Many Requests')
+
+class ChangesAPI(object):
+
+    @encode_json(**{
+        'since' : serializers.int,
+        'limit' : serializers.int,
+        'changes.time' : serializers.datetime,
+        'changes.document_id' : serializers.object_id,
+        'changes.document._id' : serializers.object_id,
+        'changes.document.user' : serializers.object_id,
+        'changes.document.time' : serializers.datetime,
+        'changes.document.start' : serializers.datetime,
+        'changes.document.end' : serializers.datetime
+    })
+    def GET(self, client, since=0, limit=MAX_CHANGES):
+        limit = min(max(limit, 1), MAX_CHANGES)
+
+        changes, more = model.changes.since(client, since, limit)
+
+        if changes:
+            since = changes[-1]['seq']
+
+        return {
+            'seq' : since,
+            'more' : more,
+            'changes' : changes
+        }
+
+class DashPageAPI(object):
+
+    @encode_json(**{
+        'after' : serializers.datetime,
+        'limit' : serializers.int,
+        'dashes._id' : serializers.object_id,
+        'dashes.user' : serializers.object_id,
+        'dashes.start' : serializers.datetime,
+        'dashes.end' : serializers.datetime
+    })
+    def GET(self, client, after=None, after_id=None, limit=MAX_PAGE, name=None, timeline=None):
+        limit = min(max(limit, 1), MAX_PAGE)
+
+        cursor = None
+        if after is not None and after_id is not None:
+            cursor = (after, after_id)
+
+        # one more than asked for, to tell whether there are more
+        dashes = list(model.dashes.page(client, after=cursor, limit=limit + 1, name=name, timeline=timeline))
+
+        return {
+            'more' : len(dashes) > limit,
+            'dashes' : dashes[:limit]
+        }
+
+class StatsAPI(object):
+
+    @encode_json(**{
+        'duration_bins' : serializers.int,
+        'tod_bins' : serializers.int,
+        'max_duration' : serializers.int
+    })
+    def GET(self, client, name=None, timeline=None, timezone='UTC', duration_bins=5, tod_bins=5, max_duration=None):
+        if duration_bins <= 0 or tod_bins <= 0:
+            raise web.badrequest()
+
+        try:
+            localizer = tz.localizer(timezone)
+        except KeyError:
+            raise web.badrequest()
+
+        stats = StreamingEventStats(tod_bins=tod_bins, max_duration=max_duration)
+
+        cursor = model.dashes.page(client, name=name, timeline=timeline)
+        while True:
+            chunk = list(islice(cursor, STATS_CHUNK))
+            if not chunk:
+                break
+
+            # the time of day is wanted in the user's time zone
+            starts = localizer.localize(list(dash['start'] for dash in chunk))
+            ends = localizer.localize(list(dash['end'] for dash in chunk))
+
+            for start, end in zip(starts, ends):
+                stats.add(start, end)
+
+        return stats.summary(duration_bins)
+
+class MetricsAPI(object):
+
+    def GET(self):
+        web.header('Content-Type', 'text/plain; version=0.0.4')
 
+        return metrics.registry.render()
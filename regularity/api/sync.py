@@ -0,0 +1,122 @@
+import json
+import os
+
+from regularity.core import serializers as _serializers
+
+COLLECTIONS = ('dots', 'dashes', 'pendings')
+
+# the field each collection is ordered by
+ORDER_KEYS = dict(
+    dots='time',
+    dashes='end',
+    pendings='start'
+)
+
+SERIALIZERS = dict(
+    time=_serializers.datetime,
+    start=_serializers.datetime,
+    end=_serializers.datetime
+)
+
+class Replica(object):
+
+    def __init__(self, path=None):
+        '''Create a local copy of a user's dots, dashes and pendings, kept up to
+           date by applying the server's change log, see sync(). Times are kept
+           in UTC.
+
+           @param path : optional, str
+               the file to persist the replica to, if it exists the replica is
+               loaded from it'''
+
+        self.path = path
+        self.seq = 0
+        self.documents = dict((c, dict()) for c in COLLECTIONS)
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        '''Load the replica from its file.'''
+
+        with open(self.path, 'r') as replica_file:
+            data = json.load(replica_file)
+
+        self.seq = data['seq']
+        for collection in COLLECTIONS:
+            documents = _serializers.serialize(data[collection], **SERIALIZERS)
+            self.documents[collection] = dict((d['_id'], d) for d in documents)
+
+    def save(self):
+        '''Write the replica to its file, replacing it atomically.'''
+
+        data = dict(seq=self.seq)
+        for collection in COLLECTIONS:
+            data[collection] = _serializers.serialize(self.documents[collection].values(), **SERIALIZERS)
+
+        tmp_path = '%s.tmp' % self.path
+        with open(tmp_path, 'w') as replica_file:
+            json.dump(data, replica_file)
+
+        os.rename(tmp_path, self.path)
+
+    def apply(self, change):
+        '''Apply one change from the server's change log.
+
+           @param change : dict
+               the change, as returned by API.changes'''
+
+        documents = self.documents.get(change['collection'])
+        if documents is not None:
+            if 'delete' == change['action']:
+                documents.pop(change['document_id'], None)
+            else:
+                documents[change['document_id']] = change['document']
+
+        self.seq = change['seq']
+
+    def sync(self, api, limit=1000):
+        '''Fetch and apply the changes made since the last sync, saving the
+           replica afterwards if it has a file. Returns the number of changes
+           applied, or None if the server could not be reached.
+
+           @param api : regularity.api.client.API
+               the API bound to the user the replica belongs to
+           @param limit : optional, int
+               the maximum number of changes per request'''
+
+        applied = 0
+
+        while True:
+            data = api.changes(since=self.seq, limit=limit, localize=False)
+            if data is None:
+                return None
+
+            for change in data['changes']:
+                self.apply(change)
+            applied += len(data['changes'])
+
+            if not data['more']:
+                break
+
+        if applied and self.path is not None:
+            self.save()
+
+        return applied
+
+    def list(self, collection):
+        '''Return the documents of a collection, oldest first.
+
+           @param collection : str
+               'dots', 'dashes' or 'pendings' '''
+
+        return sorted(self.documents[collection].itervalues(), key=lambda d: d[ORDER_KEYS[collection]])
+
+    def dots(self):
+        return self.list('dots')
+
+    def dashes(self):
+        return self.list('dashes')
+
+    def pendings(self):
+        return self.list('pendings')
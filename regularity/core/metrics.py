@@ -0,0 +1,473 @@
+import bisect
+import logging
+import threading
+import time
+
+# upper bounds, in seconds, of the default latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# upper bounds, in bytes, of the response size histogram buckets
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+_local = threading.local()
+
+def current_method():
+    '''Return the name of the innermost timed model method running on this
+       thread, or None if there is none.'''
+
+    return getattr(_local, 'method', None)
+
+def _format_labels(labels, **extra):
+    '''Format a label set in the prometheus text format.
+
+       @param labels : tuple((str, object))
+           the sorted (name, value) pairs
+       @param extra : keyword arguments
+           labels to append after the others'''
+
+    pairs = list(labels) + sorted(extra.iteritems())
+    if not pairs:
+        return ''
+
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in pairs)
+
+class Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        '''Create a histogram with fixed bucket boundaries.
+
+           @param buckets : optional, tuple(int|float)
+               the ascending upper bounds of the buckets, values larger than the
+               last bound are counted in an implicit +Inf bucket'''
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        '''Record a value.
+
+           @param value : int|float
+               the value to record'''
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def mean(self):
+        '''Return the mean of the recorded values.'''
+
+        if not self.count:
+            return None
+
+        return self.sum / self.count
+
+    def quantile(self, q):
+        '''Return an upper bound for the q-th quantile of the recorded values,
+           the bound of the bucket the quantile falls in.
+
+           @param q : float
+               the quantile, between 0 and 1'''
+
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float('inf')
+
+class _NullTimer(object):
+    '''The timer handed out while metrics are disabled, it does nothing.'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer(object):
+
+    def __init__(self, registry, name, labels):
+        '''Create a context manager that observes the time spent inside it.
+
+           @param registry : Registry
+               the registry to record to
+           @param name : str
+               the name of the histogram
+           @param labels : dict
+               the labels of the histogram'''
+
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.registry.observe(self.name, time.time() - self.start, **self.labels)
+        return False
+
+class Registry(object):
+
+    def __init__(self, enabled=False, prefix='regularity'):
+        '''Create a registry of counters and histograms. While disabled every
+           recording call returns immediately.
+
+           @param enabled : optional, bool
+               whether to start out recording
+           @param prefix : optional, str
+               the prefix put in front of every metric name when rendering'''
+
+        self.enabled = enabled
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.histograms = dict()
+        self.buckets = dict()
+
+    def enable(self):
+        '''Start recording.'''
+
+        self.enabled = True
+
+    def disable(self):
+        '''Stop recording, the values recorded so far are kept.'''
+
+        self.enabled = False
+
+    def reset(self):
+        '''Forget everything that has been recorded.'''
+
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def set_buckets(self, name, buckets):
+        '''Set the bucket boundaries used for the histograms named name.
+
+           @param name : str
+               the name of the histogram
+           @param buckets : tuple(int|float)
+               the ascending upper bounds of the buckets'''
+
+        self.buckets[name] = tuple(buckets)
+
+    def increment(self, name, value=1, **labels):
+        '''Increment a counter.
+
+           @param name : str
+               the name of the counter
+           @param value : optional, int|float
+               the amount to increment by
+           @param labels : keyword arguments
+               the labels identifying the counter'''
+
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.iteritems())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        '''Record a value in a histogram.
+
+           @param name : str
+               the name of the histogram
+           @param value : int|float
+               the value to record
+           @param labels : keyword arguments
+               the labels identifying the histogram'''
+
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.iteritems())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.buckets.get(name, LATENCY_BUCKETS))
+                self.histograms[key] = histogram
+
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        '''Return a context manager that records the seconds spent inside of it
+           to the histogram name.
+
+           @param name : str
+               the name of the histogram
+           @param labels : keyword arguments
+               the labels identifying the histogram'''
+
+        if not self.enabled:
+            return _NULL_TIMER
+
+        return _Timer(self, name, labels)
+
+    def counter(self, name, **labels):
+        '''Return the current value of a counter.
+
+           @param name : str
+               the name of the counter
+           @param labels : keyword arguments
+               the labels identifying the counter'''
+
+        return self.counters.get((name, tuple(sorted(labels.iteritems()))), 0)
+
+    def histogram(self, name, **labels):
+        '''Return a histogram, or None if nothing has been recorded to it.
+
+           @param name : str
+               the name of the histogram
+           @param labels : keyword arguments
+               the labels identifying the histogram'''
+
+        return self.histograms.get((name, tuple(sorted(labels.iteritems()))))
+
+    def render(self):
+        '''Return every metric in the prometheus text exposition format.'''
+
+        with self.lock:
+            counters = sorted(self.counters.iteritems())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.count, h.sum)) for key, h in self.histograms.iteritems())
+
+        lines = list()
+
+        typed = set()
+        for (name, labels), value in counters:
+            name = '%s_%s' % (self.prefix, name)
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE %s counter' % name)
+
+            lines.append('%s%s %s' % (name, _format_labels(labels), value))
+
+        for (name, labels), (buckets, counts, count, sum_) in histograms:
+            name = '%s_%s' % (self.prefix, name)
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE %s histogram' % name)
+
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %d' % (name, _format_labels(labels, le=bound), cumulative))
+
+            lines.append('%s_sum%s %r' % (name, _format_labels(labels), sum_))
+            lines.append('%s_count%s %d' % (name, _format_labels(labels), count))
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        '''Return a list of human readable lines summarizing every histogram
+           and counter, meant for logging.'''
+
+        with self.lock:
+            counters = sorted(self.counters.iteritems())
+            histograms = sorted(self.histograms.iteritems())
+
+        lines = list()
+        for (name, labels), h in histograms:
+            lines.append('%s%s count=%d mean=%.6f p50<=%s p99<=%s' % (
+                name, _format_labels(labels), h.count, h.mean(), h.quantile(0.5), h.quantile(0.99)
+            ))
+
+        for (name, labels), value in counters:
+            lines.append('%s%s %s' % (name, _format_labels(labels), value))
+
+        return lines
+
+registry = Registry()
+registry.set_buckets('response_bytes', SIZE_BUCKETS)
+
+def timed(name):
+    '''Create a decorator that records the time spent in the decorated model
+       method, and attributes the mongoDB round trips made inside of it to name.
+
+       @param name : str
+           the name to record the method under, e.g. "dashes.create"'''
+
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+
+            previous = getattr(_local, 'method', None)
+            _local.method = name
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe('model_method_seconds', time.time() - start, method=name)
+                _local.method = previous
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+
+    return decorator
+
+class InstrumentedCursor(object):
+
+    def __init__(self, cursor, collection):
+        '''Wrap a pymongo cursor, recording the time spent iterating over it as
+           one round trip.
+
+           @param cursor : pymongo.cursor.Cursor
+               the cursor to wrap
+           @param collection : str
+               the name of the collection the cursor queries'''
+
+        self._cursor = cursor
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def sort(self, *args, **kwargs):
+        return InstrumentedCursor(self._cursor.sort(*args, **kwargs), self._collection)
+
+    def limit(self, *args, **kwargs):
+        return InstrumentedCursor(self._cursor.limit(*args, **kwargs), self._collection)
+
+    def skip(self, *args, **kwargs):
+        return InstrumentedCursor(self._cursor.skip(*args, **kwargs), self._collection)
+
+    def count(self, *args, **kwargs):
+        return _round_trip(self._collection, 'count', self._cursor.count, *args, **kwargs)
+
+    def __iter__(self):
+        start = time.time()
+        try:
+            for document in self._cursor:
+                yield document
+        finally:
+            _record_round_trip(self._collection, 'find', time.time() - start)
+
+class InstrumentedCollection(object):
+
+    def __init__(self, collection, name):
+        '''Wrap a pymongo collection, counting and timing the round trips made
+           through it.
+
+           @param collection : pymongo.collection.Collection
+               the collection to wrap
+           @param name : str
+               the name of the collection'''
+
+        self._collection = collection
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def find(self, *args, **kwargs):
+        return InstrumentedCursor(self._collection.find(*args, **kwargs), self._name)
+
+    def find_one(self, *args, **kwargs):
+        return _round_trip(self._name, 'find_one', self._collection.find_one, *args, **kwargs)
+
+    def find_and_modify(self, *args, **kwargs):
+        return _round_trip(self._name, 'find_and_modify', self._collection.find_and_modify, *args, **kwargs)
+
+    def insert(self, *args, **kwargs):
+        return _round_trip(self._name, 'insert', self._collection.insert, *args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        return _round_trip(self._name, 'save', self._collection.save, *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return _round_trip(self._name, 'update', self._collection.update, *args, **kwargs)
+
+    def remove(self, *args, **kwargs):
+        return _round_trip(self._name, 'remove', self._collection.remove, *args, **kwargs)
+
+class InstrumentedDatabase(object):
+
+    def __init__(self, db):
+        '''Wrap a pymongo database so that every collection taken from it is
+           instrumented.
+
+           @param db : pymongo.database.Database
+               the database to wrap'''
+
+        self._db = db
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+
+        if hasattr(attr, 'find_one'):
+            return InstrumentedCollection(attr, name)
+
+        return attr
+
+def _record_round_trip(collection, operation, seconds):
+    '''Record one round trip to mongoDB, attributed to the current model method.
+
+       @param collection : str
+           the name of the collection
+       @param operation : str
+           the name of the operation
+       @param seconds : float
+           how long the round trip took'''
+
+    method = current_method()
+    registry.increment('mongo_round_trips_total', collection=collection, method=method, operation=operation)
+    registry.observe('mongo_seconds', seconds, collection=collection, method=method, operation=operation)
+
+def _round_trip(collection, operation, fn, *args, **kwargs):
+    '''Call fn, recording it as one round trip to mongoDB.
+
+       @param collection : str
+           the name of the collection
+       @param operation : str
+           the name of the operation
+       @param fn : function
+           the pymongo function making the round trip'''
+
+    start = time.time()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _record_round_trip(collection, operation, time.time() - start)
+
+class Reporter(threading.Thread):
+
+    def __init__(self, registry, interval, logger=None):
+        '''Create a thread that periodically logs a summary of the registry.
+
+           @param registry : Registry
+               the registry to summarize
+           @param interval : int|float
+               the number of seconds between summaries
+           @param logger : optional, logging.Logger
+               the logger to log to, defaults to the root logger'''
+
+        super(Reporter, self).__init__(name='metrics-reporter')
+        self.daemon = True
+
+        self.registry = registry
+        self.interval = interval
+        self.logger = logger or logging.getLogger()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for line in self.registry.summary():
+                self.logger.info(line)
+
+    def stop(self):
+        '''Stop logging summaries.'''
+
+        self.stopped.set()
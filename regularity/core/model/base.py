@@ -1,5 +1,11 @@
+import re
+
+import pymongo
+import pymongo.errors
 import pymongo.objectid
 
+from regularity.core.validation import ValidationError
+
 class ItemNotFound(Exception):
     '''An exception for when a requested database item does not exist'''
 
@@ -31,6 +37,9 @@ def validate(validator):
 
 class APIBase(object):
 
+    # the time field the documents are ordered by, see recent()
+    SORT_KEY = None
+
     def __init__(self, db):
         '''Create an APIBase object.
 
@@ -38,6 +47,61 @@ class APIBase(object):
                the connection to the database'''
 
         self.db = db
+        self.listeners = list()
+
+    def add_listener(self, listener):
+        '''Register a function to be called after every create, update and
+           delete made through this API.
+
+           @param listener : function(collection, action, document, previous)
+               called with the name of the collection, the action ('create',
+               'update' or 'delete'), the document that was written and, for
+               updates, the document as it was before the update'''
+
+        self.listeners.append(listener)
+
+    def notify(self, action, document, previous=None):
+        '''Call the listeners for a write.
+
+           @param action : str
+               'create', 'update' or 'delete'
+           @param document : dict
+               the document that was written
+           @param previous : optional, dict
+               for updates, the document as it was before the update'''
+
+        if not self.listeners:
+            return
+
+        collection = self.collection.name
+        for listener in self.listeners:
+            listener(collection, action, document, previous)
+
+    def check_key(self, user, _id):
+        '''Raise ValidationError if a document of another user has the id a
+           client chose for a write.
+
+           @param user : pymongo.objectid.ObjectId
+               the user making the write
+           @param _id : pymongo.objectid.ObjectId
+               the id chosen'''
+
+        if self.collection.find_one({'_id' : _id, 'user' : {'$ne' : user}}, fields=['_id']) is not None:
+            raise ValidationError('the id %s belongs to another user' % _id)
+
+    def save_keyed(self, document):
+        '''Save a document whose id was chosen by the client. The write is
+           scoped to the user, so it replaces the user's document with that id
+           and never another user's: if another user has it, ValidationError is
+           raised.
+
+           @param document : dict
+               the document, with its _id and user'''
+
+        try:
+            self.collection.update({'_id' : document['_id'], 'user' : document['user']}, document, upsert=True, safe=True)
+        except pymongo.errors.DuplicateKeyError:
+            raise ValidationError('the id %s belongs to another user' % document['_id'])
 
     def object_id(self, value):
         '''Convert the value into a pymongo.objectid.ObjectId.
@@ -54,6 +118,49 @@ class APIBase(object):
 
         raise NotImplementedError('collection() must be defined in subclasses')
 
+    def ensure_indexes(self):
+        '''Create the index recent() reads the documents in order from.'''
+
+        self.collection.ensure_index([('user', pymongo.ASCENDING), (self.SORT_KEY, pymongo.DESCENDING)])
+
+    def criteria(self, user, name=None, timeline=None, **kwargs):
+        '''Return the query criteria for a search.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user to which the event belongs
+           @param name : optional, str
+               a case insensitive part of the name of the event
+           @param timeline : optional, str
+               the name of the timeline'''
+
+        criteria = {
+            'user' : self.object_id(user)
+        }
+
+        if name:
+            criteria['name'] = re.compile(re.escape(name), re.IGNORECASE)
+
+        if timeline:
+            criteria['timeline'] = timeline
+
+        return criteria
+
+    def recent(self, user, limit, **kwargs):
+        '''Return a cursor over the most recent documents, newest first by
+           SORT_KEY.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user to which the event belongs
+           @param limit : int
+               the most documents to return
+           @param kwargs :
+               the criteria of criteria()'''
+
+        query = self.collection.find(self.criteria(user, **kwargs))
+        query = query.sort(self.SORT_KEY, pymongo.DESCENDING)
+
+        return query.limit(limit)
+
     def verify(self, item):
         '''Verify the item exists and belongs to the user it says it does. Will
            raise ItemNotFound if the item does not exist.
@@ -0,0 +1,116 @@
+import datetime
+
+from regularity.core.metrics import timed
+
+from base import APIBase
+
+class ChangeAPI(APIBase):
+    '''Keeps a log of the writes to each user's dots, dashes and pendings, in
+       the order of a per-user sequence number, for clients to sync from.'''
+
+    # how long a hole in the sequence is waited on before it is skipped, a
+    # hole is a sequence number taken by a write that has not logged its change
+    # yet, or never will because it failed
+    GAP_TIMEOUT = 10 # seconds
+
+    @property
+    def collection(self):
+        '''Return the database collection for this API'''
+
+        return self.db.changes
+
+    @property
+    def sequences(self):
+        '''Return the database collection holding the last sequence number
+           handed out to each user'''
+
+        return self.db.sequences
+
+    @timed('changes.next_sequence')
+    def next_sequence(self, user):
+        '''Atomically take the next sequence number for a user.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user'''
+
+        user = self.object_id(user)
+
+        sequence = self.sequences.find_and_modify(
+            { '_id' : user },
+            { '$inc' : { 'seq' : 1 } },
+            upsert=True,
+            new=True
+        )
+
+        return sequence['seq']
+
+    @timed('changes.record')
+    def record(self, collection, action, document, previous=None):
+        '''Log a write. Meant to be registered with Model.add_listener.
+
+           @param collection : str
+               the name of the collection that was written to
+           @param action : str
+               'create', 'update' or 'delete'
+           @param document : dict
+               the document that was written
+           @param previous : optional, dict
+               for updates, the document as it was before the update'''
+
+        user = self.object_id(document['user'])
+
+        change = dict(
+            user=user,
+            seq=self.next_sequence(user),
+            time=datetime.datetime.utcnow(),
+            collection=collection,
+            action=action,
+            document_id=document['_id'],
+            document=document
+        )
+
+        self.collection.insert(change)
+
+    @timed('changes.since')
+    def since(self, user, seq, limit):
+        '''Return the changes for a user after sequence number seq, in order,
+           and whether there are more to come. The changes stop short of a hole
+           in the sequence, so that a client never skips past a change that is
+           still being logged.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user
+           @param seq : int
+               the last sequence number the client has seen
+           @param limit : int
+               the maximum number of changes to return'''
+
+        user = self.object_id(user)
+
+        criteria = {
+            'user' : user,
+            'seq' : { '$gt' : seq }
+        }
+        fields = {
+            '_id' : 0,
+            'user' : 0
+        }
+
+        query = self.collection.find(criteria, fields)
+        query = query.sort('seq', 1).limit(limit + 1)
+
+        gap_timeout = datetime.timedelta(seconds=self.GAP_TIMEOUT)
+        now = datetime.datetime.utcnow()
+
+        changes = list()
+        for change in query:
+            if change['seq'] != seq + 1 and now - change['time'] < gap_timeout:
+                return changes, False
+
+            if len(changes) == limit:
+                return changes, True
+
+            changes.append(change)
+            seq = change['seq']
+
+        return changes, False
@@ -1,8 +1,8 @@
 import datetime
-import re
 
 import pymongo.objectid
 
+from regularity.core.metrics import timed
 from regularity.core.validation import DateTimeField, StringField, Validator
 
 from base import APIBase, validate
@@ -21,6 +21,8 @@ class DashValidator(Validator):
 
 class DashAPI(APIBase):
 
+    SORT_KEY = 'end'
+
     CONTIGUITY_THRESHOLD = 5 # seconds
 
     @property
@@ -29,7 +31,8 @@ class DashAPI(APIBase):
 
         return self.db.dashes
 
-    def create(self, user, timeline, name, start=None, end=None, note=None):
+    @timed('dashes.create')
+    def create(self, user, timeline, name, start=None, end=None, note=None, _id=None):
         '''Log the occurence of a ranged activity to the specified timeline.
 
            @param user : str|pymongo.objectid.ObjectId
@@ -43,7 +46,12 @@ class DashAPI(APIBase):
            @param end : optional, datetime
                the end time of the activity, defaults to start
            @param note : optional, str
-               an optional note to go with the dash'''
+               an optional note to go with the dash
+           @param _id : optional, str|pymongo.objectid.ObjectId
+               the id to give the dash. The dash keeps it even when it is
+               consolidated with existing ones, so that the client can extend
+               it later, see extend(). Resending a write is harmless, as the
+               resent dash overlaps the one already stored'''
 
         user = self.object_id(user)
 
@@ -53,8 +61,15 @@ class DashAPI(APIBase):
         if end is None:
             end = start
 
+        keep_id = _id is not None
+        if keep_id:
+            _id = self.object_id(_id)
+            self.check_key(user, _id)
+        else:
+            _id = pymongo.objectid.ObjectId()
+
         dash = dict(
-            _id=pymongo.objectid.ObjectId(),
+            _id=_id,
             user=user,
             timeline=timeline,
             name=name,
@@ -69,10 +84,17 @@ class DashAPI(APIBase):
         }
         overlapping_dashes = self.overlapping_dashes(user, start, end, **extra_criteria)
 
+        # the dash the consolidated one is an update of, if any
+        previous = None
+
         if overlapping_dashes:
             # consolidate all the overlapping activities into one
-            # preserve the id of the first activity
-            dash['_id'] = overlapping_dashes[0]['_id']
+            # preserve the id of the first activity, unless an id was given
+            if keep_id:
+                previous = next((a for a in overlapping_dashes if a['_id'] == _id), None)
+            else:
+                previous = overlapping_dashes[0]
+                dash['_id'] = previous['_id']
             dash['start'] = min(start, *(a['start'] for a in overlapping_dashes))
             dash['end'] = max(end, *(a['end'] for a in overlapping_dashes))
 
@@ -90,9 +112,55 @@ class DashAPI(APIBase):
             if notes:
                 dash['note'] = '\n\n'.join(notes)
 
-        self.collection.save(dash)
+        if keep_id:
+            self.save_keyed(dash)
+        else:
+            self.collection.save(dash)
+
+        for a in overlapping_dashes:
+            if a is not previous:
+                self.notify('delete', a)
+
+        if previous is not None:
+            self.notify('update', dash, previous)
+        else:
+            self.notify('create', dash)
+
         return dash
 
+    @timed('dashes.extend')
+    def extend(self, user, _id, end):
+        '''Move the end of a dash later, in a single update. Returns the dash,
+           or None if the user has no dash with that id. An end earlier than
+           the dash's leaves it as it is.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user to which the dash belongs
+           @param _id : str|pymongo.objectid.ObjectId
+               the id of the dash
+           @param end : datetime
+               the new end time of the dash'''
+
+        criteria = {
+            '_id' : self.object_id(_id),
+            'user' : self.object_id(user)
+        }
+
+        # only match while the end moves later, so the update is a max
+        previous = self.collection.find_and_modify(
+            dict(criteria, end={ '$lt' : end }),
+            { '$set' : { 'end' : end } }
+        )
+
+        if previous is None:
+            return self.collection.find_one(criteria)
+
+        dash = dict(previous, end=end)
+        self.notify('update', dash, previous)
+
+        return dash
+
+    @timed('dashes.update')
     @validate(DashValidator)
     def update(self, dash):
         '''Update the dash in the database.
@@ -100,11 +168,13 @@ class DashAPI(APIBase):
            @param dash : dict
                the dash to update'''
 
-        self.verify(dash)
+        previous = self.verify(dash)
 
         self.collection.save(dash)
+        self.notify('update', dash, previous)
         return dash
 
+    @timed('dashes.delete')
     @validate(DashValidator)
     def delete(self, dash):
         '''Delete the dash with object_id that belongs to the user.
@@ -116,7 +186,9 @@ class DashAPI(APIBase):
 
         if dash:
             self.collection.remove(dash)
+            self.notify('delete', dash)
 
+    @timed('dashes.overlapping_dashes')
     def overlapping_dashes(self, user, start, end, buffer_=None, **kwargs):
         '''Return timeline dashes that overlap with the time denoted by start
            and end
@@ -157,6 +229,7 @@ class DashAPI(APIBase):
 
         return overlapping
 
+    @timed('dashes.search')
     def search(self, user, **kwargs):
         '''Perform a general query for dashes. By default, will return all
            events unless filtering criteria are specified in kwargs.
@@ -169,21 +242,43 @@ class DashAPI(APIBase):
                name - the name of the event
                timeline - the name of the timeline'''
 
-        user = self.object_id(user)
+        criteria = self.criteria(user, **kwargs)
 
-        criteria = {
-            'user' : user
-        }
+        query = self.collection.find(criteria)
+        query = query.sort('end', 1)
 
-        name = kwargs.get('name')
-        if name:
-            criteria['name'] = re.compile(re.escape(name), re.IGNORECASE)
+        return tuple(query)
+
+    @timed('dashes.page')
+    def page(self, user, after=None, limit=None, **kwargs):
+        '''Return a cursor over the dashes in order of end time, then id,
+           starting after a given dash. Fetching pages with the last dash of
+           each as the next one's after walks all of the dashes, without any
+           being left out or repeated when end times are equal.
 
-        timeline = kwargs.get('timeline')
-        if timeline:
-            criteria['timeline'] = timeline
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user to which the event belongs
+           @param after : optional, tuple(datetime, str|pymongo.objectid.ObjectId)
+               the end and id of the dash to start after, from the first dash
+               if None
+           @param limit : optional, int
+               the most dashes to return, all of them if None
+           @param kwargs :
+               the criteria of search()'''
+
+        criteria = self.criteria(user, **kwargs)
+
+        if after is not None:
+            end, _id = after
+            criteria['$or'] = [
+                { 'end' : { '$gt' : end } },
+                { 'end' : end, '_id' : { '$gt' : self.object_id(_id) } },
+            ]
 
         query = self.collection.find(criteria)
-        query = query.sort('end', 1)
+        query = query.sort([('end', 1), ('_id', 1)])
 
-        return tuple(query)
+        if limit:
+            query = query.limit(limit)
+
+        return query
@@ -1,8 +1,8 @@
 import datetime
-import re
 
 import pymongo.objectid
 
+from regularity.core.metrics import timed
 from regularity.core.validation import DateTimeField, StringField, Validator
 
 from base import APIBase, validate
@@ -20,13 +20,16 @@ class DotValidator(Validator):
 
 class DotAPI(APIBase):
 
+    SORT_KEY = 'time'
+
     @property
     def collection(self):
         '''Return the database collection for this API'''
 
         return self.db.dots
 
-    def create(self, user, timeline, name, time=None, note=None):
+    @timed('dots.create')
+    def create(self, user, timeline, name, time=None, note=None, _id=None):
         '''Log the occurence of an instantaneous activity to the specified
            timeline.
 
@@ -39,15 +42,23 @@ class DotAPI(APIBase):
            @param time : optional, datetime
                the time of the activity, defaults to now
            @param note : optional, str
-               a note to attach to the dot'''
+               a note to attach to the dot
+           @param _id : optional, str|pymongo.objectid.ObjectId
+               the id to give the dot, creating a dot with the id of an existing
+               one of the user replaces it, so resending a write is harmless, an
+               id of another user's dot is rejected'''
 
         user = self.object_id(user)
 
         if time is None:
             time = datetime.datetime.utcnow()
 
+        keyed = _id is not None
+        if not keyed:
+            _id = pymongo.objectid.ObjectId()
+
         dot = dict(
-            _id=pymongo.objectid.ObjectId(),
+            _id=self.object_id(_id),
             user=user, 
             timeline=timeline, 
             name=name, 
@@ -56,10 +67,15 @@ class DotAPI(APIBase):
         )
         dot = DotValidator.validate(dot)
 
-        self.collection.insert(dot)
+        if keyed:
+            self.save_keyed(dot)
+        else:
+            self.collection.save(dot)
+        self.notify('create', dot)
         
         return dot
 
+    @timed('dots.update')
     @validate(DotValidator)
     def update(self, dot):
         '''Update the dot in the database. 
@@ -69,11 +85,13 @@ class DotAPI(APIBase):
            @param dot : dict
                the dot to update'''
 
-        self.verify(dot)
+        previous = self.verify(dot)
 
         self.collection.save(dot)
+        self.notify('update', dot, previous)
         return dot
 
+    @timed('dots.delete')
     @validate(DotValidator)
     def delete(self, dot):
         '''Delete the dot in the database.
@@ -87,7 +105,9 @@ class DotAPI(APIBase):
 
         if dot:
             self.collection.remove(dot)
+            self.notify('delete', dot)
 
+    @timed('dots.overlapping')
     def overlapping(self, user, start, end, buffer_=None, **kwargs):
         '''Return dots that overlap with the time denoted by start and end.
            
@@ -124,6 +144,7 @@ class DotAPI(APIBase):
         
         return tuple(query)
 
+    @timed('dots.search')
     def search(self, user, **kwargs):
         '''Perform a general query for dots. By default, will return all events 
            unless filtering criteria are specified in kwargs.
@@ -136,18 +157,7 @@ class DotAPI(APIBase):
                name - the name of the event
                timeline - the name of the timeline'''
         
-        user = self.object_id(user)
-        criteria = {
-            'user' : user
-        }
-
-        name = kwargs.get('name')
-        if name:
-            criteria['name'] = re.compile(re.escape(name), re.IGNORECASE)
-
-        timeline = kwargs.get('timeline')
-        if timeline:
-            criteria['timeline'] = timeline
+        criteria = self.criteria(user, **kwargs)
 
         query = self.collection.find(criteria)
         query = query.sort('time', 1)
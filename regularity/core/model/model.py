@@ -1,11 +1,18 @@
 import datetime
+import heapq
+from itertools import chain
 
 import pymongo
 
+from regularity.core import metrics
+from regularity.core.timeline import bin_timeline, bucket_starts
+
+from change import ChangeAPI
 from user import UserAPI
 from dot import DotAPI
 from dash import DashAPI
 from pending import PendingAPI
+from rollup import RollupAPI
 
 class Model(object):
     '''The container class for the sub models'''
@@ -32,11 +39,33 @@ class Model(object):
             if not success:
                 raise BaseException('could not authenticate')
 
+        if metrics.registry.enabled:
+            db = metrics.InstrumentedDatabase(db)
+
         self.users = UserAPI(db)
         self.dots = DotAPI(db)
         self.dashes = DashAPI(db)
         self.pendings = PendingAPI(db)
+        self.rollups = RollupAPI(db)
+        self.changes = ChangeAPI(db)
+
+        self.add_listener(self.rollups.invalidate)
+        self.add_listener(self.changes.record)
+
+        for api in (self.dots, self.dashes, self.pendings):
+            api.ensure_indexes()
+
+    def add_listener(self, listener):
+        '''Register a function to be called after every write to the dots,
+           dashes and pendings collections. See APIBase.add_listener.
 
+           @param listener : function(collection, action, document, previous)
+               the function to call'''
+
+        for api in (self.dots, self.dashes, self.pendings):
+            api.add_listener(listener)
+
+    @metrics.timed('model.finish_pending')
     def finish_pending(self, pending, end=None):
         '''Finish a pending, and move it to the dashes collection.
 
@@ -62,6 +91,23 @@ class Model(object):
         
         return dash
 
+    @metrics.timed('model.cancel_pending')
+    def cancel_pending(self, user, timeline, name):
+        '''Cancel the pendings of an activity on a timeline, without turning
+           them into dashes.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user the pendings belong to
+           @param timeline : str
+               name of the timeline
+           @param name : str
+               name of the activity'''
+
+        for pending in self.pendings.search(user, timeline=timeline):
+            if pending['name'] == name:
+                self.pendings.delete(pending)
+
+    @metrics.timed('model.search')
     def search(self, user, search_dots=True, search_dashes=True, search_pendings=True, **kwargs):
         '''Search through the database for events that match the criteria.
 
@@ -95,3 +141,85 @@ class Model(object):
 
         return data
 
+    @metrics.timed('model.recent')
+    def recent(self, user, limit, types=('dot', 'dash', 'pending'), **kwargs):
+        '''Return the most recent events of the types asked for, oldest first.
+           Dots are ordered by their time, dashes by their end, and pendings by
+           their start. Each type is read newest first from its index, so no
+           more than limit documents of each are read, and the merged events
+           are marked with their type.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user whose events are listed
+           @param limit : int
+               the most events to return
+           @param types : optional, iterable(str)
+               the types of events to list, of 'dot', 'dash' and 'pending'
+           @param kwargs : keyword arguments
+               the criteria of the search, see search()'''
+
+        apis = dict(
+            dot=self.dots,
+            dash=self.dashes,
+            pending=self.pendings
+        )
+
+        def typed(type_):
+            for document in apis[type_].recent(user, limit, **kwargs):
+                document['type'] = type_
+                yield document
+
+        def sort_key(document):
+            return document[apis[document['type']].SORT_KEY]
+
+        events = heapq.nlargest(limit, chain(*(typed(t) for t in types)), key=sort_key)
+        events.reverse()
+
+        return events
+
+    @metrics.timed('model.timeline')
+    def timeline(self, user, start, end, bucket):
+        '''Return the occupied seconds and event counts per activity in each
+           bucket of a timeline, see regularity.core.timeline.bin_timeline.
+           Complete buckets are read from the rollups when they have been
+           computed before, the rest are computed from the dots and dashes.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user whose events are binned
+           @param start : datetime
+               the start of the first bucket
+           @param end : datetime
+               the end of the last bucket
+           @param bucket : int
+               the length of a bucket in seconds'''
+
+        step = datetime.timedelta(seconds=bucket)
+        starts = bucket_starts(start, end, bucket)
+
+        # only full length buckets that are over can be rolled up, the others
+        # may still change
+        horizon = min(end, datetime.datetime.utcnow())
+        complete = list(s for s in starts if s + step <= horizon)
+
+        # taken before anything is read, so that buckets computed from events
+        # that are written to meanwhile are not stored
+        generation = self.rollups.generation(user)
+
+        buckets = self.rollups.find(user, bucket, complete)
+
+        missing = list(s for s in starts if s not in buckets)
+        if missing:
+            low = missing[0]
+            high = min(missing[-1] + step, end)
+
+            dashes = self.dashes.overlapping_dashes(user, low, high, buffer_=0)
+            dots = self.dots.overlapping(user, low, high)
+
+            computed = dict((b['start'], b) for b in bin_timeline(low, high, bucket, dashes, dots))
+
+            complete = set(complete)
+            self.rollups.store(user, bucket, list(computed[s] for s in missing if s in complete), generation)
+
+            buckets.update(computed)
+
+        return list(buckets[s] for s in starts)
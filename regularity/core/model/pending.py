@@ -1,8 +1,8 @@
 import datetime
-import re
 
 import pymongo.objectid
 
+from regularity.core.metrics import timed
 from regularity.core.validation import DateTimeField, StringField, Validator
 
 from base import APIBase, validate
@@ -19,13 +19,16 @@ class PendingValidator(Validator):
 
 class PendingAPI(APIBase):
 
+    SORT_KEY = 'start'
+
     @property
     def collection(self):
         '''Return the database collection for this API'''
 
         return self.db.pendings
 
-    def create(self, user, timeline, name, start=None, note=None):
+    @timed('pendings.create')
+    def create(self, user, timeline, name, start=None, note=None, _id=None):
         '''Log the beginning of a ranged activity, where the end time is yet to
            be determined, to the specified timeline.
 
@@ -38,14 +41,23 @@ class PendingAPI(APIBase):
            @param start : optional, datetime
                the start time of the activity, defaults to now
            @param note : optional, str
-               an optional note to attach to the pending'''
+               an optional note to attach to the pending
+           @param _id : optional, str|pymongo.objectid.ObjectId
+               the id to give the pending, creating a pending with the id of an
+               existing one of the user replaces it, so resending a write is
+               harmless, an id of another user's pending is rejected'''
 
         user = self.object_id(user)
 
         if start is None:
             start = datetime.datetime.utcnow()
 
+        keyed = _id is not None
+        if not keyed:
+            _id = pymongo.objectid.ObjectId()
+
         pending = dict(
+            _id=self.object_id(_id),
             user=user,
             timeline=timeline,
             name=name,
@@ -53,10 +65,15 @@ class PendingAPI(APIBase):
             note=note,
         )
 
-        self.collection.insert(pending)
+        if keyed:
+            self.save_keyed(pending)
+        else:
+            self.collection.save(pending)
+        self.notify('create', pending)
 
         return pending
 
+    @timed('pendings.update')
     @validate(PendingValidator)
     def update(self, pending):
         '''Update the pending to the database.
@@ -64,11 +81,13 @@ class PendingAPI(APIBase):
            @param pending : dict
                the pending to update'''
 
-        self.verify(pending)
+        previous = self.verify(pending)
 
         self.collection.save(pending)
+        self.notify('update', pending, previous)
         return pending
 
+    @timed('pendings.delete')
     @validate(PendingValidator)
     def delete(self, pending):
         '''Cancel a pending that hasn't been completed yet.
@@ -80,7 +99,9 @@ class PendingAPI(APIBase):
 
         if pending:
             self.collection.remove(pending)
+            self.notify('delete', pending)
 
+    @timed('pendings.search')
     def search(self, user, **kwargs):
         '''Perform a general query for pendings. By default, will return all
            events unless filtering criteria are specified in kwargs.
@@ -93,19 +114,7 @@ class PendingAPI(APIBase):
                name - the name of the event
                timeline - the name of the timeline'''
 
-        user = self.object_id(user)
-
-        criteria = {
-            'user' : user
-        }
-
-        name = kwargs.get('name')
-        if name:
-            criteria['name'] = re.compile(re.escape(name), re.IGNORECASE)
-
-        timeline = kwargs.get('timeline')
-        if timeline:
-            criteria['timeline'] = timeline
+        criteria = self.criteria(user, **kwargs)
 
         query = self.collection.find(criteria)
         query = query.sort('start', 1)
@@ -0,0 +1,143 @@
+import threading
+
+from regularity.core.metrics import timed
+
+from base import APIBase
+
+class RollupAPI(APIBase):
+    '''Stores the binned timeline of complete buckets, so that they do not need
+       to be recomputed from the dots and dashes they summarize.'''
+
+    def __init__(self, db):
+        '''Create a RollupAPI object.
+
+           @param db : pymongo.database.Database
+               the database'''
+
+        super(RollupAPI, self).__init__(db)
+
+        # user -> the number of writes seen for it, used to drop buckets that
+        # were computed while a write happened, held while storing or removing
+        # buckets so that a write cannot come between the check and the insert
+        self.lock = threading.Lock()
+        self.generations = dict()
+
+    def generation(self, user):
+        '''Return the current generation of a user's buckets. Pass it back to
+           store() to avoid storing buckets computed from stale events.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user'''
+
+        with self.lock:
+            return self.generations.get(str(user), 0)
+
+    @property
+    def collection(self):
+        '''Return the database collection for this API'''
+
+        return self.db.rollups
+
+    @timed('rollups.find')
+    def find(self, user, bucket, starts):
+        '''Return the stored buckets of the given length starting at the given
+           times, as a mapping of start time -> bucket.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user the buckets belong to
+           @param bucket : int
+               the length of the buckets in seconds
+           @param starts : list(datetime)
+               the start times of the buckets'''
+
+        if not starts:
+            return dict()
+
+        user = self.object_id(user)
+
+        criteria = {
+            'user' : user,
+            'bucket' : bucket,
+            'start' : { '$in' : starts }
+        }
+        fields = {
+            '_id' : 0,
+            'start' : 1,
+            'end' : 1,
+            'activities' : 1
+        }
+
+        return dict((r['start'], r) for r in self.collection.find(criteria, fields))
+
+    @timed('rollups.store')
+    def store(self, user, bucket, buckets, generation):
+        '''Store computed buckets, replacing any stored for the same times,
+           unless a dot or dash of the user has been written since generation
+           was taken.
+
+           @param user : str|pymongo.objectid.ObjectId
+               the id of the user the buckets belong to
+           @param bucket : int
+               the length of the buckets in seconds
+           @param buckets : list(dict)
+               the buckets, as returned by regularity.core.timeline.bin_timeline
+           @param generation : int
+               the generation taken before the events were read'''
+
+        if not buckets:
+            return
+
+        with self.lock:
+            if self.generations.get(str(user), 0) != generation:
+                return
+
+            user = self.object_id(user)
+
+            self.collection.remove({
+                'user' : user,
+                'bucket' : bucket,
+                'start' : { '$in' : list(b['start'] for b in buckets) }
+            })
+
+            self.collection.insert(list(dict(
+                user=user,
+                bucket=bucket,
+                start=b['start'],
+                end=b['end'],
+                activities=b['activities']
+            ) for b in buckets))
+
+    @timed('rollups.invalidate')
+    def invalidate(self, collection, action, document, previous=None):
+        '''Remove the stored buckets covering the time of a dot or dash that
+           was written. Meant to be registered with Model.add_listener.
+
+           @param collection : str
+               the name of the collection that was written to
+           @param action : str
+               'create', 'update' or 'delete'
+           @param document : dict
+               the document that was written
+           @param previous : optional, dict
+               for updates, the document as it was before the update'''
+
+        if collection == 'dashes':
+            start_key, end_key = 'start', 'end'
+        elif collection == 'dots':
+            start_key, end_key = 'time', 'time'
+        else:
+            return
+
+        with self.lock:
+            user = str(document['user'])
+            self.generations[user] = self.generations.get(user, 0) + 1
+
+            for d in (document, previous):
+                if d is None:
+                    continue
+
+                self.collection.remove({
+                    'user' : self.object_id(d['user']),
+                    'start' : { '$lte' : d[end_key] },
+                    'end' : { '$gte' : d[start_key] }
+                })
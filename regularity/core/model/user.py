@@ -2,6 +2,7 @@ import hashlib
 import random
 
 import pymongo.objectid
+from regularity.core.metrics import timed
 from regularity.core.validation import StringField, Validator
 
 from base import APIBase, validate
@@ -65,6 +66,7 @@ class UserAPI(APIBase):
         }
         return self.collection.find_one({ '_id' : object_id}, fields)
 
+    @timed('users.create')
     def create(self, email, password):
         '''Create a new user.
         
@@ -95,6 +97,7 @@ class UserAPI(APIBase):
 
         return self.object_by_id(user['_id'])
 
+    @timed('users.authenticate')
     def authenticate(self, email, password):
         '''Authenticate a password to an email - hash the password and see if
            it matches what is stored in the database.
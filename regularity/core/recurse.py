@@ -64,3 +64,41 @@ def recurse(o, callback, key=None):
             return _value
         return o
             
+
+def locate(o, keys, key=None, found=None):
+    '''Find the values at the given keys in an arbitrary nesting of dicts and
+       lists, without copying it. Keys are joined as they are for recurse().
+
+       Returns a list of (container, index, value) tuples, so that the values
+       can be replaced in place with container[index] = newvalue.
+
+       @param o : dict|list
+           the object to search through
+       @param keys : set(str)
+           the keys to find
+       @param key : tuple(str)
+           a tuple of the dictionary keys that have been processed to get to
+           this point in the object'''
+
+    if found is None:
+        found = list()
+
+    if key is None:
+        key = tuple()
+
+    if isinstance(o, list):
+        joined = '.'.join(key)
+        for i, value in enumerate(o):
+            if isinstance(value, (list, dict)):
+                locate(value, keys, key, found)
+            elif joined in keys:
+                found.append((o, i, value))
+
+    elif isinstance(o, dict):
+        for _key, value in o.iteritems():
+            if isinstance(value, (list, dict)):
+                locate(value, keys, key + (_key,), found)
+            elif '.'.join(key + (_key,)) in keys:
+                found.append((o, _key, value))
+
+    return found
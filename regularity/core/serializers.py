@@ -1,8 +1,6 @@
 
 import datetime as _datetime
 
-from pymongo.objectid import ObjectId
-
 from regularity.core.recurse import recurse
 
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
@@ -43,6 +41,10 @@ def object_id(o):
        @param o : pymongo.objectid.ObjectId | str
            the object to (de)serialize'''
 
+    # imported here, so that clients using the other serializers do not pay
+    # for pymongo
+    from pymongo.objectid import ObjectId
+
     if isinstance(o, basestring):
         # deserialize to datetime
         return ObjectId(o)
@@ -1,41 +1,150 @@
 from collections import Counter
 import datetime
-from itertools import imap
+from itertools import imap, islice
 import math
 from operator import itemgetter
 
+class Accumulator(object):
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self):
+        '''Create an accumulator of the count, sum, mean, variance, minimum and
+           maximum of numbers added one at a time, in a single pass. The
+           variance is updated with Welford's method, which stays accurate
+           where the mean of the squares less the square of the mean would
+           not. Accumulators over parts of the data can be merged.'''
+
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+        # the running mean, and the sum of the squared differences from it
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        '''Add a number.
+
+           @param x : int|float
+               the number to add'''
+
+        self.count += 1
+        self.sum += x
+
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def update(self, iterable):
+        '''Add the numbers in an iterable, returning the accumulator. They are
+           taken in chunks of CHUNK_SIZE, each summarized and merged in.
+
+           @param iterable : iterable(int|float)
+               the numbers to add'''
+
+        iterator = iter(iterable)
+
+        while True:
+            chunk = list(imap(float, islice(iterator, self.CHUNK_SIZE)))
+            if not chunk:
+                break
+
+            count = len(chunk)
+            chunk_sum = sum(chunk)
+            chunk_mean = chunk_sum / count
+
+            other = Accumulator()
+            other.count = count
+            other.sum = chunk_sum
+            other.min = min(chunk)
+            other.max = max(chunk)
+            other._mean = chunk_mean
+            other._m2 = sum((x - chunk_mean) ** 2 for x in chunk)
+
+            self.merge(other)
+
+        return self
+
+    def merge(self, other):
+        '''Add the numbers accumulated by another accumulator, returning this
+           one.
+
+           @param other : Accumulator
+               the accumulator to merge in'''
+
+        if not other.count:
+            return self
+
+        if not self.count:
+            self.count, self.sum, self.min, self.max = other.count, other.sum, other.min, other.max
+            self._mean, self._m2 = other._mean, other._m2
+            return self
+
+        count = self.count + other.count
+        delta = other._mean - self._mean
+
+        self._mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        return self
+
+    def mean(self):
+        '''Return the mean, None if nothing was added.'''
+
+        if not self.count:
+            return None
+
+        return self.sum / self.count
+
+    def variance(self):
+        '''Return the population variance, None if nothing was added.'''
+
+        if not self.count:
+            return None
+
+        return self._m2 / self.count
+
+    def std(self):
+        '''Return the population standard deviation, None if nothing was
+           added.'''
+
+        if not self.count:
+            return None
+
+        return math.sqrt(self.variance())
+
 def _mean(args):
     '''Return the mean of args.
 
-       @param args : list(int|float)
-          the list of numbers to compute the mean for'''
-    
-    if not args:
-        return None
+       @param args : iterable(int|float)
+          the numbers to compute the mean for'''
 
-    return sum(imap(float, args)) / len(args) 
+    return Accumulator().update(args).mean()
 
 
 def _std(args, return_mean=False):
     '''Return the standard deviation of args.
        
-       @param args : list(int|float)
-           the list of numbers to compute the standard deviation for'''
-
-    if not args:
-        if return_mean:
-            return None, None
-        return None
-    
-    mean = _mean(args)
+       @param args : iterable(int|float)
+           the numbers to compute the standard deviation for'''
 
-    squared_differences = ((x - mean)**2 for x in args)
-    std = math.sqrt(sum(squared_differences) / len(args))
+    accumulator = Accumulator().update(args)
 
     if return_mean:
-        return mean, std
+        return accumulator.mean(), accumulator.std()
 
-    return std
+    return accumulator.std()
 
 def _counts(iterable):
     '''Return the counts of elements in the iterable, in descending order.
@@ -95,10 +204,9 @@ class RegularityStatistics(object):
     def dash_aggregate_duration(self):
         '''Return statistics on the durations of the dashes.'''
 
-        durations = (d['end'] - d['start'] for d in self.dashes)
-        durations = tuple(d.total_seconds() for d in durations)
+        durations = Accumulator().update((d['end'] - d['start']).total_seconds() for d in self.dashes)
 
-        mean, std = _std(durations, return_mean=True)
+        mean, std = durations.mean(), durations.std()
 
         if mean is not None:
             mean = datetime.timedelta(seconds=mean)
@@ -0,0 +1,99 @@
+import datetime
+import math
+
+def bucket_starts(start, end, bucket):
+    '''Return the start times of the buckets that divide up the time between
+       start and end. The last bucket may extend past end.
+
+       @param start : datetime
+           the start of the first bucket
+       @param end : datetime
+           the time the buckets must reach
+       @param bucket : int
+           the length of a bucket in seconds'''
+
+    span = (end - start).total_seconds()
+    n_buckets = int(span // bucket)
+    if n_buckets * bucket < span:
+        n_buckets += 1
+
+    step = datetime.timedelta(seconds=bucket)
+    return list(start + i * step for i in xrange(n_buckets))
+
+def bin_timeline(start, end, bucket, dashes=(), dots=()):
+    '''Bin events into consecutive buckets, returning for each bucket the
+       occupied seconds and event counts per activity. Dashes are clipped to the
+       bucket boundaries, and are counted once in every bucket they overlap.
+
+       @param start : datetime
+           the start of the first bucket
+       @param end : datetime
+           the end of the last bucket, which is shortened to end here
+       @param bucket : int
+           the length of a bucket in seconds
+       @param dashes : optional, iterable(dict)
+           the dashes to bin
+       @param dots : optional, iterable(dict)
+           the dots to bin'''
+
+    starts = bucket_starts(start, end, bucket)
+    n_buckets = len(starts)
+    span = (end - start).total_seconds()
+
+    # name -> [seconds, count] for each bucket
+    activities = list(dict() for i in xrange(n_buckets))
+
+    def offset(dt):
+        return (dt - start).total_seconds()
+
+    for dash in dashes:
+        low = offset(dash['start'])
+        high = offset(dash['end'])
+
+        if high == low:
+            # an instantaneous dash counts toward the bucket it falls in
+            if not 0 <= low < span:
+                continue
+
+            first = last = int(low // bucket)
+
+        else:
+            low = max(low, 0)
+            high = min(high, span)
+
+            if high <= low:
+                continue
+
+            # a dash that ends right on a boundary does not reach into the
+            # next bucket
+            first = int(low // bucket)
+            last = int(math.ceil(high / bucket)) - 1
+
+        for i in xrange(first, last + 1):
+            seconds = min(high, (i + 1) * bucket) - max(low, i * bucket)
+
+            totals = activities[i].setdefault(dash['name'], [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    for dot in dots:
+        t = offset(dot['time'])
+
+        if t < 0 or t >= span:
+            continue
+
+        totals = activities[int(t // bucket)].setdefault(dot['name'], [0.0, 0])
+        totals[1] += 1
+
+    step = datetime.timedelta(seconds=bucket)
+
+    buckets = list()
+    for bucket_start, bucket_activities in zip(starts, activities):
+        buckets.append(dict(
+            start=bucket_start,
+            end=min(bucket_start + step, end),
+            activities=list(dict(name=name, seconds=seconds, count=count)
+                for name, (seconds, count) in sorted(bucket_activities.iteritems()))
+        ))
+
+    return buckets
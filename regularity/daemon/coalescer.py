@@ -0,0 +1,96 @@
+import datetime
+
+class Coalescer(object):
+
+    def __init__(self, send, min_dwell=1.0, merge_threshold=5.0):
+        '''Coalesce a stream of consecutive dashes before they are sent. Dashes
+           shorter than min_dwell are dropped, and a dash that returns to the
+           activity of the one before it within merge_threshold seconds is
+           merged into it, covering the gap. The last dash is held back until
+           it can no longer be merged, see expire().
+
+           So a burst of switches away from an activity and back sends a single
+           dash, instead of a handful the server has to consolidate.
+
+           @param send : function(activity, start, end)
+               called with each coalesced dash
+           @param min_dwell : optional, float
+               the number of seconds an activity must last to be kept
+           @param merge_threshold : optional, float
+               the longest gap, in seconds, merged over'''
+
+        self.send = send
+        self.min_dwell = datetime.timedelta(seconds=min_dwell)
+        self.merge_threshold = datetime.timedelta(seconds=merge_threshold)
+
+        # [activity, start, end] of the dash held back
+        self.held = None
+
+        self.added = 0
+        self.dropped = 0
+        self.merged = 0
+        self.sent = 0
+
+    def add(self, activity, start, end):
+        '''Add the next dash. Dashes must be added in order.
+
+           @param activity : str
+               the name of the activity
+           @param start : datetime
+               the UTC time of the start of the activity
+           @param end : datetime
+               the UTC time of the end of the activity'''
+
+        self.added += 1
+
+        held = self.held
+        if held is not None and held[0] == activity and start - held[2] <= self.merge_threshold:
+            held[2] = max(held[2], end)
+            self.merged += 1
+            return
+
+        if end - start < self.min_dwell:
+            self.dropped += 1
+            return
+
+        self.flush()
+        self.held = [activity, start, end]
+
+    def expire(self, now, active=None):
+        '''Send the held dash if it is too old to be merged into any more.
+
+           @param now : datetime
+               the current UTC time
+           @param active : optional, tuple(str, datetime)
+               the activity active right now, and the time it became active. A
+               held dash it returned to in time is kept, as the active dash
+               will be merged into it once it ends'''
+
+        held = self.held
+        if held is None or now - held[2] <= self.merge_threshold:
+            return
+
+        if active is not None and active[0] == held[0] and active[1] - held[2] <= self.merge_threshold:
+            return
+
+        self.flush()
+
+    def flush(self):
+        '''Send the held dash, if there is one.'''
+
+        if self.held is not None:
+            activity, start, end = self.held
+            self.held = None
+
+            self.send(activity, start, end)
+            self.sent += 1
+
+    def stats(self):
+        '''Return the counts of dashes added, dropped, merged and sent.'''
+
+        return dict(
+            added=self.added,
+            dropped=self.dropped,
+            merged=self.merged,
+            sent=self.sent
+        )
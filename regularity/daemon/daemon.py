@@ -0,0 +1,301 @@
+from collections import deque
+import logging
+import os
+
+from regularity.core import metrics
+from regularity.daemon.coalescer import Coalescer
+from regularity.daemon.resolver import ApplicationResolver
+from regularity.daemon.status import instrumented
+
+class RegularityDaemon(object):
+
+    def __init__(self, source, sender, min_dwell=1.0, merge_threshold=5.0, heartbeat=None):
+        '''Create a RegularityDaemon, which logs to the database the active
+           application over time. It will also log when the screensaver becomes
+           active, and stops logging applications while it is.
+
+           @param source : regularity.daemon.sources.EventSource
+               where the signals, the clock and the main loop come from
+           @param sender : regularity.api.sender.EventSender
+               the queue the events are sent to the database through, so the
+               signal handlers never wait on the network
+           @param min_dwell : optional, float
+               the number of seconds an application must stay active to be
+               logged
+           @param merge_threshold : optional, float
+               switching back to an application within this many seconds
+               continues its dash, see regularity.daemon.coalescer.Coalescer
+           @param heartbeat : optional, float
+               if given, the active application's dash is created once it has
+               been active this many seconds, or when it is switched away from
+               if that is sooner, and extended every this many seconds after,
+               instead of being sent when it is switched away from'''
+
+        self.sender = sender
+        self.coalescer = Coalescer(self.send_application_dash, min_dwell=min_dwell, merge_threshold=merge_threshold)
+
+        # the application dashes waiting on their names, in order, with None
+        # marking where the coalescer is flushed
+        self.switches = deque()
+        self.path = None
+        self.screensaver_active = False
+
+        self.heartbeat = heartbeat
+        # the path, start and dash id of the active application's dash, in
+        # heartbeat mode
+        self.open = None
+
+        # attach the signal receivers to the source's bus
+        self.source = source
+        self.bus = source.bus
+        self.resolver = ApplicationResolver(self.bus)
+        self.bind_events()
+
+        self.timestamps = dict(
+            application=source.now(),
+            screensaver=source.now()
+        )
+
+    @instrumented('active_application_changed')
+    def on_active_application_changed(self, from_path, to_path):
+        '''The signal handler for active application changes.
+        
+           @param from_path : dbus.String
+               the dbus path of the window we are switching from
+           @param to_path : dbus.String
+               the dbus path of the window we are switching to'''
+
+        start = self.timestamps['application']
+        now = self.source.now()
+
+        if from_path and not self.screensaver_active:
+            if self.heartbeat:
+                self.close_dash(now)
+            else:
+                self.application_dash(from_path, start, now)
+
+        if to_path:
+            # resolve the new application now, while its view is still open
+            self.resolver.resolve(to_path)
+
+        self.path = to_path
+        self.timestamps['application'] = now
+
+        if self.heartbeat and not self.screensaver_active:
+            self.open_dash(to_path, now)
+
+    def open_dash(self, path, start):
+        '''Start tracking the active application in heartbeat mode. Its dash
+           is created on the next heartbeat.
+
+           @param path : dbus.String
+               the dbus path of the application
+           @param start : datetime
+               the UTC time the application became active'''
+
+        self.open = None
+        if path:
+            self.open = dict(path=path, start=start, dash=None)
+
+    def close_dash(self, end):
+        '''Extend the active application's dash to its end, and stop tracking
+           it, in heartbeat mode. If no heartbeat has created its dash yet, it
+           is created now, unless it is shorter than min_dwell.
+
+           @param end : datetime
+               the UTC time the application stopped being active'''
+
+        open_ = self.open
+        self.open = None
+
+        if open_ is None:
+            return
+
+        if open_['dash'] is not None:
+            self.sender.extend(open_['dash'], end)
+            return
+
+        if end - open_['start'] < self.coalescer.min_dwell:
+            return
+
+        def callback(application):
+            if application is not None:
+                self.sender.dash('regularityd', application, open_['start'], end)
+
+        self.resolver.resolve(open_['path'], callback)
+
+    @instrumented('heartbeat')
+    def on_heartbeat(self):
+        '''The timeout handler that creates or extends the active
+           application's dash, in heartbeat mode.'''
+
+        open_ = self.open
+        if open_ is None:
+            return True
+
+        now = self.source.now()
+
+        def callback(application):
+            # ignore the name if the application was switched away from since
+            if open_ is not self.open or application is None:
+                return
+
+            if open_['dash'] is None:
+                open_['dash'] = self.sender.dash('regularityd', application, open_['start'], now)
+            else:
+                self.sender.extend(open_['dash'], now)
+
+        self.resolver.resolve(open_['path'], callback)
+
+        return True
+
+    def application_dash(self, path, start, end):
+        '''Log the time spent in an application, once its name is resolved.
+
+           @param path : dbus.String
+               the dbus path of the application
+           @param start : datetime
+               the UTC time the application became active
+           @param end : datetime
+               the UTC time it stopped being active'''
+
+        switch = [None, start, end, False]
+        self.switches.append(switch)
+
+        def callback(application):
+            switch[0] = application
+            switch[3] = True
+            self.drain_switches()
+
+        self.resolver.resolve(path, callback)
+
+    def drain_switches(self):
+        '''Hand the application dashes whose names are resolved to the
+           coalescer, stopping at the first that is still waiting, so they
+           reach it in order.'''
+
+        while self.switches and (self.switches[0] is None or self.switches[0][3]):
+            switch = self.switches.popleft()
+            if switch is None:
+                self.coalescer.flush()
+                continue
+
+            application, start, end, resolved = switch
+            logging.info('switching away from application: %s' % application)
+            self.coalescer.add(application, start, end)
+
+    def send_application_dash(self, application, start, end):
+        self.sender.dash('regularityd', application, start, end)
+
+    @instrumented('expire')
+    def on_expire(self):
+        '''The timeout handler that sends the held application dash once it
+           cannot be merged into any more.'''
+
+        now = self.source.now()
+
+        if self.path and not self.screensaver_active and not self.switches:
+            since = self.timestamps['application']
+
+            def callback(application):
+                self.coalescer.expire(now, active=(application, since))
+
+            self.resolver.resolve(self.path, callback)
+        else:
+            self.coalescer.expire(now)
+
+        return True
+
+    def bind_active_application_changed(self):
+        '''Bind to the signal that fires when the active application changes.'''
+
+        self.bus.add_signal_receiver(
+            self.on_active_application_changed,
+            'ActiveApplicationChanged',
+            'org.ayatana.bamf.matcher'
+        )
+
+    @instrumented('screensaver_active_changed')
+    def on_screensaver_active_changed(self, screensaver_active):
+        '''The signal handler for screensaver state changes.
+        
+           @param screensaver_active : dbus.Boolean
+               whether the screensaver is active right now'''
+
+        logging.info('screensaver active: %s' % screensaver_active)
+        now = self.source.now()
+
+        if screensaver_active and not self.screensaver_active:
+            # the active application stops counting when the screensaver
+            # starts, and is not merged with what comes after it
+            if self.heartbeat:
+                self.close_dash(now)
+            else:
+                if self.path:
+                    self.application_dash(self.path, self.timestamps['application'], now)
+
+                self.switches.append(None)
+                self.drain_switches()
+
+        elif not screensaver_active and self.screensaver_active:
+            start = self.timestamps['screensaver']
+
+            self.sender.dash('screensaver', 'screensaver', start, now)
+
+            # and starts again when it stops
+            self.timestamps['application'] = now
+
+            if self.heartbeat:
+                self.open_dash(self.path, now)
+
+        self.screensaver_active = bool(screensaver_active)
+        self.timestamps['screensaver'] = now
+
+    def bind_screensaver_active_changed(self):
+        '''Bind to the signal that fires when the screensaver state changes.'''
+
+        self.bus.add_signal_receiver(
+            self.on_screensaver_active_changed,
+            'ActiveChanged',
+            'org.gnome.ScreenSaver'
+        )
+
+    def bind_events(self):
+        '''A wrapper method for binding to all signals of interest.'''
+
+        self.bind_active_application_changed()
+        self.bind_screensaver_active_changed()
+        self.resolver.bind()
+
+    def run(self):
+        '''Log the initial state, set up the timeout, and begin the main loop.'''
+
+        if self.heartbeat:
+            self.source.timeout_add(max(self.heartbeat, 0.1), self.on_heartbeat)
+        else:
+            interval = self.coalescer.merge_threshold.total_seconds()
+            self.source.timeout_add(max(interval, 0.1), self.on_expire)
+
+        self.source.run()
+
+    def status(self):
+        '''Return the daemon's counters and latencies, see
+           regularity.daemon.status.StatusServer.'''
+
+        return dict(
+            pid=os.getpid(),
+            mode='heartbeat' if self.heartbeat else 'coalesce',
+            screensaver_active=self.screensaver_active,
+            sender=self.sender.stats(),
+            resolver=self.resolver.stats(),
+            coalescer=self.coalescer.stats(),
+            metrics=metrics.registry.summary()
+        )
+
+    def stop(self):
+        '''Send the application dash that has not been sent in full yet.'''
+
+        if self.heartbeat:
+            self.close_dash(self.source.now())
+        else:
+            self.coalescer.flush()
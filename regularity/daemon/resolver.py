@@ -0,0 +1,139 @@
+import logging
+import time
+
+from regularity.core import metrics
+from regularity.utils.lru import LRUCache
+
+class ApplicationResolver(object):
+
+    def __init__(self, bus, max_entries=256):
+        '''Resolve BAMF application paths to names without blocking the main
+           loop. Names are cached by path until BAMF reports the view closed,
+           and misses are resolved with asynchronous DBus calls, one per path
+           however many lookups are waiting on it.
+
+           @param bus : dbus.Bus
+               the session bus
+           @param max_entries : optional, int
+               the maximum number of names to cache'''
+
+        self.bus = bus
+        self.cache = LRUCache(max_entries=max_entries)
+
+        # path -> the callbacks waiting on a call in flight
+        self.waiting = dict()
+        # paths closed while a call for them was in flight
+        self.closed = set()
+
+        self.calls = 0
+        self.errors = 0
+
+    def bind(self):
+        '''Bind to the signal BAMF sends when a view closes.'''
+
+        self.bus.add_signal_receiver(
+            self.on_view_closed,
+            'ViewClosed',
+            'org.ayatana.bamf.matcher'
+        )
+
+    def on_view_closed(self, path, view_type):
+        '''The signal handler for closed views.
+
+           @param path : dbus.String
+               the dbus path of the view
+           @param view_type : dbus.String
+               the type of the view'''
+
+        self.cache.delete(path)
+
+        if path in self.waiting:
+            self.closed.add(path)
+
+    def resolve(self, path, callback=None):
+        '''Resolve an application path to a name. The callback is called with
+           the name, or None if it could not be resolved, right away on a cache
+           hit and once the DBus call returns otherwise.
+
+           @param path : str
+               the DBus path of an application
+           @param callback : optional, function(str)
+               called with the name, leave it out to only warm the cache'''
+
+        application = self.cache.get(path)
+        if application is not None:
+            if callback is not None:
+                callback(application)
+            return
+
+        if path in self.waiting:
+            self.waiting[path].append(callback)
+            return
+
+        self.waiting[path] = [callback]
+        self.calls += 1
+
+        started = time.time()
+
+        def on_reply(name):
+            metrics.registry.observe('dbus_call_seconds', time.time() - started, result='ok')
+            self.on_reply(path, name)
+
+        def on_error(error):
+            metrics.registry.observe('dbus_call_seconds', time.time() - started, result='error')
+            self.on_error(path, error)
+
+        self.bus.call_async(
+            'org.ayatana.bamf', path, 'org.ayatana.bamf.view', 'Name', None, tuple(),
+            on_reply,
+            on_error
+        )
+
+    def on_reply(self, path, application):
+        '''Cache a resolved name and hand it to the callbacks waiting on it.
+
+           @param path : str
+               the DBus path of the application
+           @param application : dbus.String
+               its name'''
+
+        if application:
+            application = application.lower()
+
+            if path not in self.closed:
+                self.cache.set(path, application)
+
+        self.finish(path, application or None)
+
+    def on_error(self, path, error):
+        '''Log a failed call, and hand None to the callbacks waiting on it.
+
+           @param path : str
+               the DBus path of the application
+           @param error : dbus.DBusException
+               the error'''
+
+        self.errors += 1
+        logging.error("Could not resolve application path '%s' to a name" % path)
+
+        self.finish(path, None)
+
+    def finish(self, path, application):
+        self.closed.discard(path)
+
+        for callback in self.waiting.pop(path, list()):
+            if callback is not None:
+                callback(application)
+
+    def stats(self):
+        '''Return the cache hit counters and the number of DBus calls made.'''
+
+        return dict(
+            hits=self.cache.hits,
+            misses=self.cache.misses,
+            hit_rate=self.cache.hit_rate(),
+            evictions=self.cache.evictions,
+            cached=len(self.cache),
+            calls=self.calls,
+            errors=self.errors
+        )
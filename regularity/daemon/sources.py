@@ -0,0 +1,298 @@
+import datetime
+import heapq
+import itertools
+import json
+import random
+import time
+
+class EventSource(object):
+    '''Where a RegularityDaemon gets its signals, its clock and its main loop
+       from. The bus needs add_signal_receiver and call_async, as on a
+       dbus.Bus.'''
+
+    bus = None
+
+    def now(self):
+        '''Return the current UTC time.'''
+
+        raise NotImplementedError()
+
+    def timeout_add(self, seconds, callback):
+        '''Call callback every seconds, for as long as it returns True.
+
+           @param seconds : float
+               the interval between calls
+           @param callback : function() -> bool
+               the function to call'''
+
+        raise NotImplementedError()
+
+    def run(self):
+        '''Deliver events until quit() is called, or there are no more.'''
+
+        raise NotImplementedError()
+
+    def quit(self):
+        '''Stop delivering events.'''
+
+        raise NotImplementedError()
+
+class RecordingBus(object):
+
+    def __init__(self, bus, record_file):
+        '''Wrap a bus to write the signals it delivers, and the application
+           names it resolves, to a file that ReplaySource can load.
+
+           @param bus : dbus.Bus
+               the bus to wrap
+           @param record_file : file
+               the file to write the records to, one JSON object per line'''
+
+        self.bus = bus
+        self.record_file = record_file
+
+    def record(self, **record):
+        record['time'] = time.time()
+        self.record_file.write(json.dumps(record) + '\n')
+        self.record_file.flush()
+
+    def add_signal_receiver(self, handler, signal_name, dbus_interface):
+        def recorded(*args):
+            self.record(signal=signal_name, args=list(args))
+            return handler(*args)
+
+        self.bus.add_signal_receiver(recorded, signal_name, dbus_interface)
+
+    def call_async(self, bus_name, path, interface, method, signature, args, reply_handler, error_handler):
+        def recorded(value):
+            self.record(path=path, name=value)
+            return reply_handler(value)
+
+        self.bus.call_async(bus_name, path, interface, method, signature, args, recorded, error_handler)
+
+class DBusEventSource(EventSource):
+
+    def __init__(self, record_file=None):
+        '''Deliver the session bus signals through the GLib main loop.
+
+           @param record_file : optional, file
+               a file to record the events to, see RecordingBus'''
+
+        import dbus
+        import dbus.mainloop.glib
+        import gobject
+
+        self.gobject = gobject
+
+        # create the dbus main loop, set it as the default dbus main loop
+        dbus_main_loop = dbus.mainloop.glib.DBusGMainLoop()
+        dbus.set_default_main_loop(dbus_main_loop)
+
+        self.bus = dbus.SessionBus()
+        if record_file is not None:
+            self.bus = RecordingBus(self.bus, record_file)
+
+        self.loop = gobject.MainLoop()
+
+    def now(self):
+        return datetime.datetime.utcnow()
+
+    def timeout_add(self, seconds, callback):
+        self.gobject.timeout_add(int(1000 * seconds), callback)
+
+    def run(self):
+        self.loop.run()
+
+    def quit(self):
+        self.loop.quit()
+
+class ReplayBus(object):
+
+    def __init__(self, source):
+        '''A bus for ReplaySource. Signals are delivered to the receivers
+           added for them, whatever the interface, and calls for application
+           names are answered from the names seen in the replay, after the
+           event being delivered, as DBus would.
+
+           @param source : ReplaySource
+               the source the bus belongs to'''
+
+        self.source = source
+        self.receivers = dict()
+        self.names = dict()
+
+    def add_signal_receiver(self, handler, signal_name, dbus_interface):
+        self.receivers.setdefault(signal_name, list()).append(handler)
+
+    def call_async(self, bus_name, path, interface, method, signature, args, reply_handler, error_handler):
+        if path in self.names:
+            self.source.replies.append((reply_handler, self.names[path]))
+        else:
+            self.source.replies.append((error_handler, LookupError("unknown path '%s'" % path)))
+
+    def emit(self, signal_name, args):
+        for handler in self.receivers.get(signal_name, list()):
+            handler(*args)
+
+class ReplaySource(EventSource):
+
+    def __init__(self, records, speedup=None):
+        '''Deliver recorded or synthetic events. The clock follows the times
+           of the records, so the daemon logs the same dashes at any speed.
+
+           Records are dicts with a 'time' in seconds since the epoch, and
+           either a 'signal' name and its 'args', or the application 'name'
+           for a 'path'. See RecordingBus, load() and synthetic().
+
+           @param records : iterable(dict)
+               the records, in time order
+           @param speedup : optional, float
+               how many times faster than recorded to deliver the events,
+               as fast as possible if None'''
+
+        self.speedup = speedup
+
+        self.bus = ReplayBus(self)
+        self.clock = None
+
+        # start the clock at the first record, for the daemon's first dashes
+        records = iter(records)
+        for first in records:
+            self.clock = datetime.datetime.utcfromtimestamp(first['time'])
+            records = itertools.chain([first], records)
+            break
+        self.records = records
+        self.timers = list()
+        self.order = itertools.count()
+        self.replies = list()
+        self.stopped = False
+
+        # the (clock, real time) each signal was delivered at, for measuring
+        # latency
+        self.delivered = list()
+
+    def now(self):
+        if self.clock is None:
+            return datetime.datetime.utcnow()
+        return self.clock
+
+    def timeout_add(self, seconds, callback):
+        interval = datetime.timedelta(seconds=seconds)
+        heapq.heappush(self.timers, (self.now() + interval, next(self.order), interval, callback))
+
+    def dispatch(self):
+        '''Deliver the replies to the calls made so far.'''
+
+        while self.replies:
+            replies, self.replies = self.replies, list()
+            for handler, value in replies:
+                handler(value)
+
+    def advance(self, clock):
+        '''Move the clock forward, firing the timeouts that come due on the
+           way at their due time.
+
+           @param clock : datetime
+               the time to move to'''
+
+        while self.timers and self.timers[0][0] <= clock:
+            due, order, interval, callback = heapq.heappop(self.timers)
+            self.clock = due
+
+            if callback():
+                heapq.heappush(self.timers, (due + interval, order, interval, callback))
+
+            self.dispatch()
+
+        self.clock = clock
+
+    def run(self):
+        started = time.time()
+        first = self.clock
+
+        for record in self.records:
+            if self.stopped:
+                break
+
+            clock = datetime.datetime.utcfromtimestamp(record['time'])
+
+            if self.speedup:
+                # pace the events in real time, the clock is unaffected
+                delay = started + (clock - first).total_seconds() / self.speedup - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.advance(clock)
+
+            if 'signal' in record:
+                self.delivered.append((clock, time.time()))
+                self.bus.emit(record['signal'], record['args'])
+            else:
+                self.bus.names[record['path']] = record['name']
+
+            self.dispatch()
+
+    def quit(self):
+        self.stopped = True
+
+def load(path):
+    '''Load the records written by RecordingBus.
+
+       @param path : str
+           the location of the recording'''
+
+    with open(path, 'r') as record_file:
+        return list(json.loads(line) for line in record_file if line.strip())
+
+def synthetic(n, applications=8, dwell=30.0, screensaver_every=None, seed=None, start=None):
+    '''Generate the records of n application switches. A few applications get
+       most of the time, and the time spent in each is exponential.
+
+       @param n : int
+           the number of switches
+       @param applications : optional, int
+           the number of distinct applications
+       @param dwell : optional, float
+           the mean number of seconds between switches
+       @param screensaver_every : optional, int
+           turn the screensaver on and off after every this many switches
+       @param seed : optional, int
+           the seed for the random numbers, for repeatable streams
+       @param start : optional, float
+           the time of the first record, in seconds since the epoch,
+           defaults to now'''
+
+    rand = random.Random(seed)
+
+    t = start if start is not None else time.time()
+
+    paths = list('/org/ayatana/bamf/application%d' % i for i in xrange(applications))
+    weights = list(1.0 / (i + 1) for i in xrange(applications))
+    total = sum(weights)
+
+    for i, path in enumerate(paths):
+        yield dict(time=t, path=path, name='Application %d' % i)
+
+    def choose():
+        r = rand.random() * total
+        for path, weight in zip(paths, weights):
+            r -= weight
+            if r <= 0:
+                return path
+        return paths[-1]
+
+    current = choose()
+    for i in xrange(n):
+        t += rand.expovariate(1.0 / dwell)
+
+        following = choose()
+        while following == current and applications > 1:
+            following = choose()
+
+        yield dict(time=t, signal='ActiveApplicationChanged', args=[current, following])
+        current = following
+
+        if screensaver_every and (i + 1) % screensaver_every == 0:
+            yield dict(time=t, signal='ActiveChanged', args=[True])
+            t += rand.expovariate(1.0 / (10 * dwell))
+            yield dict(time=t, signal='ActiveChanged', args=[False])
@@ -0,0 +1,131 @@
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from regularity.core import metrics
+
+DEFAULT_SOCKET = os.path.join('~', '.regularityd.sock')
+
+def instrumented(name):
+    '''Create a decorator that counts the calls to a signal handler and
+       records the time spent in it.
+
+       @param name : str
+           the name to record the handler under'''
+
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            registry = metrics.registry
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe('daemon_handler_seconds', time.time() - start, handler=name)
+                registry.increment('daemon_events_total', handler=name)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+
+    return decorator
+
+class StatusServer(threading.Thread):
+
+    def __init__(self, path, status):
+        '''Create a thread that answers every connection to a Unix socket with
+           the daemon's status, as JSON, then closes it.
+
+           @param path : str
+               the location of the socket, an existing socket there that no
+               one listens on is replaced
+           @param status : function() -> dict
+               returns the status'''
+
+        super(StatusServer, self).__init__(name='status-server')
+        self.daemon = True
+
+        self.path = path
+        self.status = status
+
+        self.started = time.time()
+        self.stopped = threading.Event()
+
+        if os.path.exists(path):
+            try:
+                query(path)
+            except socket.error:
+                os.unlink(path)
+            else:
+                raise BaseException("another daemon is listening on '%s'" % path)
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        os.chmod(path, 0600)
+        self.socket.listen(5)
+
+    def uptime(self):
+        return time.time() - self.started
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                connection, address = self.socket.accept()
+            except socket.error as e:
+                if self.stopped.is_set():
+                    break
+                if e.errno != errno.EINTR:
+                    logging.warning('status socket: %s' % e)
+                continue
+
+            try:
+                status = self.status()
+                status['uptime'] = self.uptime()
+                connection.sendall(json.dumps(status, default=str))
+            except Exception as e:
+                logging.warning('could not send status: %s' % e)
+            finally:
+                connection.close()
+
+    def stop(self):
+        '''Stop answering, and remove the socket.'''
+
+        self.stopped.set()
+
+        # wake the thread blocked in accept()
+        self.socket.shutdown(socket.SHUT_RDWR)
+        self.socket.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+def query(path, timeout=5.0):
+    '''Return the status of the daemon listening on a Unix socket.
+
+       @param path : str
+           the location of the socket
+       @param timeout : optional, float
+           the number of seconds to wait for the daemon'''
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+
+    try:
+        client.connect(path)
+
+        chunks = list()
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+
+    return json.loads(''.join(chunks))
@@ -1,6 +1,6 @@
 
 
-from stats import ibin_assignments
+from stats import data_bin_ranges, ibin_indices
 
 class Sparkline(object):
 
@@ -29,10 +29,8 @@ class Sparkline(object):
         steps = min(max_steps, max_datum + 1)
         steps = max(2, steps)
 
-        iassignments = ibin_assignments(steps, *self.data, min=min_)
+        bin_ranges = data_bin_ranges(steps, self.data, min_)
 
-        bin_ranges = iassignments.next()
-
-        for i in iassignments:
+        for i in ibin_indices(bin_ranges, self.data):
             yield marker * i 
 
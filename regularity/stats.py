@@ -1,6 +1,20 @@
 
-from itertools import chain, imap, izip
-import math
+from array import array
+from bisect import bisect_left, bisect_right
+import calendar
+import datetime
+from itertools import chain, compress, imap, izip, repeat
+import operator
+from operator import itemgetter
+
+from regularity.core.stats import Accumulator
+
+# inputs at least this long are binned with NumPy, when it is installed
+NUMPY_THRESHOLD = 10000
+
+_numpy = None
+
+EPOCH = datetime.datetime(1970, 1, 1)
 
 def seconds_to_time(seconds):
     seconds = int(seconds)
@@ -24,20 +38,24 @@ def mean(*args):
 
        @param args : list(ind|float)
           the list of numbers to compute the mean for'''
-    
-    return sum(imap(float, args)) / len(args) 
+
+    if not args:
+        raise ZeroDivisionError('the mean of no numbers')
+
+    return Accumulator().update(args).mean()
 
 
 def std(*args):
-    '''Return the standard deviation of args.
+    '''Return the standard deviation of args, in a single pass, see
+       Accumulator.
        
        @param args : list(int|float)
            the list of numbers to compute the standard deviation for'''
-    
-    mean_ = mean(*args)
 
-    squared_differences = ((x - mean_)**2 for x in args)
-    return math.sqrt(sum(squared_differences) / len(args))
+    if not args:
+        raise ZeroDivisionError('the standard deviation of no numbers')
+
+    return Accumulator().update(args).std()
 
 def isteps(steps, *args, **kwargs):
     '''Return an iterator of discretized steps over the range of args.
@@ -62,6 +80,117 @@ def isteps(steps, *args, **kwargs):
 
     yield step_max, max_
 
+def get_numpy():
+    '''Return the numpy module, None if it is not installed. It is imported
+       the first time it is needed, as it is slow to import.'''
+
+    global _numpy
+
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+
+    return _numpy or None
+
+def data_bin_ranges(bins, data, min_=None):
+    '''Return the ranges of the bins over the range of data, as isteps()
+       would, without passing the data as arguments.
+
+       @param bins : int
+           the number of bins
+       @param data : sequence(int|float)
+           the data whose range will be discretized
+       @param min_ : optional, int|float
+           the bottom of the first bin, the smallest datum if None'''
+
+    if min_ is None:
+        min_ = min(data)
+
+    return list(isteps(bins, max(data), min=min_))
+
+def ibin_indices(bin_ranges, data):
+    '''Return an iterator over the bin index of each datum: the first bin
+       whose top is above it, or the last bin.
+
+       @param bin_ranges : list((int|float, int|float))
+           the ranges of the bins, see isteps()
+       @param data : iterable(int|float)
+           the data to bin'''
+
+    bounds = list(bin_max for bin_min, bin_max in bin_ranges)
+
+    if any(a > b for a, b in izip(bounds, bounds[1:])):
+        # rounding left the tops out of order, search them in order
+        return _iscan_bin_indices(bounds, data)
+
+    # the index of the first top above each datum, with a datum above every
+    # top folded into the last bin
+    folded = range(len(bounds)) + [len(bounds) - 1]
+
+    return imap(folded.__getitem__, imap(bisect_right, repeat(bounds), data))
+
+def _iscan_bin_indices(bounds, data):
+    for x in data:
+        for i, bin_max in enumerate(bounds):
+            if x < bin_max:
+                break
+        yield i
+
+def bin_counts(bins, data, min_=None):
+    '''Return the ranges and counts of a binning of data, as ibin_counts()
+       would, without building the bins. Inputs of NUMPY_THRESHOLD or more
+       are binned with NumPy when it is installed.
+
+       @param bins : int
+           the number of bins
+       @param data : sequence(int|float)
+           the data to bin
+       @param min_ : optional, int|float
+           the bottom of the first bin, the smallest datum if None'''
+
+    numpy = get_numpy() if len(data) >= NUMPY_THRESHOLD else None
+
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        # the range as Python numbers, so the bin ranges are the same
+        lowest, highest = data.min().item(), data.max().item()
+        bin_ranges = list(isteps(bins, highest, min=lowest if min_ is None else min_))
+    else:
+        bin_ranges = data_bin_ranges(bins, data, min_)
+
+    bounds = list(bin_max for bin_min, bin_max in bin_ranges)
+
+    if any(a > b for a, b in izip(bounds, bounds[1:])):
+        # rounding left the tops out of order, they cannot be searched
+        counts = [0] * bins
+        for i in ibin_indices(bin_ranges, data):
+            counts[i] += 1
+
+        return list(izip(bin_ranges, counts))
+
+    # the index of the first top above each datum, a datum above every top
+    # lands in an extra slot and is counted in the last bin
+    if numpy is not None:
+        if isinstance(data, array) and 'd' == data.typecode:
+            # the column's memory, rather than a copy made a number at a time
+            values = numpy.frombuffer(data, dtype=float)
+        else:
+            values = numpy.asarray(data, dtype=float)
+
+        indices = numpy.searchsorted(numpy.array(bounds, dtype=float), values, side='right')
+        counts = numpy.bincount(indices, minlength=len(bounds) + 1).tolist()
+    else:
+        counts = [0] * (len(bounds) + 1)
+        for x in data:
+            counts[bisect_right(bounds, x)] += 1
+
+    overflow = counts.pop()
+    counts[-1] += overflow
+
+    return list(izip(bin_ranges, counts))
+
 def ibin_assignments(bins, *args, **kwargs):
     '''Return an iterator over the bin assignment for each datum in args.
 
@@ -73,11 +202,7 @@ def ibin_assignments(bins, *args, **kwargs):
     bin_ranges = list(isteps(bins, *args, **kwargs))
 
     yield bin_ranges
-    for x in args:
-        for i, (bin_min, bin_max) in enumerate(bin_ranges):
-            
-            if x < bin_max:
-                break
+    for i in ibin_indices(bin_ranges, args):
         yield i
 
 def ibin_range_assignments(bins, *args):
@@ -161,8 +286,110 @@ def ibin_counts(bins, *args):
        @param args : list(int|float)
            the data to bin'''
 
-    for bin_range, bin_ in ibins(bins, *args):
-        yield bin_range, len(bin_)
+    for bin_range, count in bin_counts(bins, args):
+        yield bin_range, count
+
+def bin_range_counts(bins, ranges, seconds=False):
+    '''Return the ranges and counts of a binning of ranges, as
+       ibin_range_counts() would, in time proportional to the number of
+       ranges plus the number of bins. A range whose high falls in an earlier
+       bin than its low wraps around, as for times of day across midnight.
+
+       @param bins : int
+           the number of bins
+       @param ranges : sequence((int|float, int|float))
+           the ranges to bin
+       @param seconds : optional, bool
+           if True, weight each bin by how much of it the ranges cover
+           instead of by the number of ranges overlapping it, so that a
+           range whose high is below its low always wraps'''
+
+    lows = list(low for low, high in ranges)
+    highs = list(high for low, high in ranges)
+
+    return bin_span_counts(bins, lows, highs, seconds=seconds)
+
+def bin_span_counts(bins, lows, highs, seconds=False):
+    '''Return the ranges and counts of a binning of ranges given as columns,
+       see bin_range_counts().
+
+       @param bins : int
+           the number of bins
+       @param lows : sequence(int|float)
+           the lows of the ranges
+       @param highs : sequence(int|float)
+           the highs of the ranges, in the same order
+       @param seconds : optional, bool
+           if True, weight each bin by how much of it the ranges cover'''
+
+    min_ = min(min(lows), min(highs))
+    max_ = max(max(lows), max(highs))
+
+    bin_ranges = list(isteps(bins, max_, min=min_))
+    n_bins = len(bin_ranges)
+
+    low_counts, low_sums = _bin_totals(bin_ranges, lows)
+    high_counts, high_sums = _bin_totals(bin_ranges, highs)
+
+    # the ranges that wrap around, only a range whose high is below its low
+    # can have its high in an earlier bin
+    reversed_ = list(imap(operator.lt, highs, lows))
+    if seconds:
+        wraps = sum(reversed_)
+    else:
+        reversed_lows = compress(lows, reversed_)
+        reversed_highs = compress(highs, reversed_)
+        wraps = sum(imap(operator.lt, ibin_indices(bin_ranges, reversed_highs), ibin_indices(bin_ranges, reversed_lows)))
+
+    # each range adds one at its first bin and takes one away after its last,
+    # a range that wraps adds one at the first bin and takes one away after
+    # the last too, the running sum is then the number of ranges over each bin
+    differences = [0] * (n_bins + 1)
+    for i in xrange(n_bins):
+        differences[i] += low_counts[i]
+        differences[i + 1] -= high_counts[i]
+
+    differences[0] += wraps
+    differences[n_bins] -= wraps
+
+    counts = list()
+    overlapping = 0
+    for i in xrange(n_bins):
+        overlapping += differences[i]
+        counts.append(overlapping)
+
+    if seconds:
+        # less the parts of their end bins the ranges do not cover
+        counts = list(count * (bin_max - bin_min) - (low_sum - low_count * bin_min) - (high_count * bin_max - high_sum)
+                      for (bin_min, bin_max), count, low_count, low_sum, high_count, high_sum
+                      in izip(bin_ranges, counts, low_counts, low_sums, high_counts, high_sums))
+
+    return list(izip(bin_ranges, counts))
+
+def _bin_totals(bin_ranges, data):
+    '''Return the number of data in each bin, and their sum.'''
+
+    bounds = list(bin_max for bin_min, bin_max in bin_ranges)
+    n_bins = len(bounds)
+
+    if any(a > b for a, b in izip(bounds, bounds[1:])):
+        counts = [0] * n_bins
+        sums = [0] * n_bins
+        for x, i in izip(data, ibin_indices(bin_ranges, data)):
+            counts[i] += 1
+            sums[i] += x
+
+        return counts, sums
+
+    # sorted, the data in each bin are a slice, ending before the first datum
+    # at or above the top of the bin
+    ordered = sorted(data)
+    edges = [0] + list(bisect_left(ordered, bin_max) for bin_max in bounds[:-1]) + [len(ordered)]
+
+    counts = list(high - low for low, high in izip(edges, edges[1:]))
+    sums = list(sum(ordered[low:high]) for low, high in izip(edges, edges[1:]))
+
+    return counts, sums
 
 def ibin_range_counts(bins, *args):
     '''Return just the counts of elements in a binning of args.
@@ -172,27 +399,86 @@ def ibin_range_counts(bins, *args):
        @param args : list((int|float, int|float))
            the ranges to bin'''
 
-    for bin_range, bin_ in ibins_range(bins, *args):
-        yield bin_range, len(bin_)
+    for bin_range, count in bin_range_counts(bins, args):
+        yield bin_range, count
+
+def _from_utc(utc, zone):
+    '''Return a naive UTC datetime in the time zone zone, or as it is if zone
+       is None.'''
+
+    if zone is None:
+        return utc
+
+    return zone.fromutc(utc.replace(tzinfo=zone))
 
 class EventStats(object):
 
     def __init__(self, *args):
-        '''Create an EventStats object.
+        '''Create an EventStats object. The events are read once, into
+           columns of numbers, and not kept.
 
            @param args : list(dict)
                a list of events from the database'''
 
         if not args:
             raise ValueError('at least one event must be supplied')
-        
-        self.events = args
+
+        # the activities, each stored once, and the index of the activity of
+        # each event
+        self.names = list()
+        self.activities = array('i')
+
+        # the starts in seconds since the epoch, the durations in seconds, and
+        # the times of day of the starts and ends in seconds into the day
+        self.starts = array('d')
+        self.durations = array('d')
+        self.start_times = array('i')
+        self.end_times = array('i')
+
+        # the time zones of the starts and ends, each stored once, so that the
+        # time ranges can be given back as they came in
+        self.zones = list()
+        self.start_zones = array('i')
+        self.end_zones = array('i')
+
+        ids = dict()
+        zone_ids = dict()
+        for event in args:
+            start, end = event['start'], event['end']
+
+            name = event.get('name')
+            id_ = ids.get(name)
+            if id_ is None:
+                id_ = ids[name] = len(self.names)
+                self.names.append(name)
+
+            self.activities.append(id_)
+
+            for zone, zones in ((start.tzinfo, self.start_zones), (end.tzinfo, self.end_zones)):
+                zone_id = zone_ids.get(id(zone))
+                if zone_id is None:
+                    zone_id = zone_ids[id(zone)] = len(self.zones)
+                    self.zones.append(zone)
+                zones.append(zone_id)
+
+            self.starts.append(calendar.timegm(start.utctimetuple()) + start.microsecond / 1e6)
+            self.durations.append((end - start).total_seconds())
+            self.start_times.append(datetime_to_time_of_day(start))
+            self.end_times.append(datetime_to_time_of_day(end))
+
+        # the statistics of the durations, made in one pass when first needed
+        self._durations = None
 
     def itime_ranges(self):
         '''Return an iterator over the time ranges of the events'''
 
-        for event in self.events:
-            yield event['start'], event['end']
+        zones = self.zones
+
+        for start, duration, start_zone, end_zone in izip(self.starts, self.durations, self.start_zones, self.end_zones):
+            start = EPOCH + datetime.timedelta(seconds=start)
+            end = start + datetime.timedelta(seconds=duration)
+
+            yield _from_utc(start, zones[start_zone]), _from_utc(end, zones[end_zone])
 
     def itime_ranges_time_of_day_seconds(self):
         '''Return an iterator over the time ranges of the events, specified as
@@ -200,40 +486,56 @@ class EventStats(object):
            after will have their end time less than their start time. Values
            will be return with second resolution'''
 
-        for start, end in self.itime_ranges():
-            yield datetime_to_time_of_day(start), datetime_to_time_of_day(end)
+        return izip(self.start_times, self.end_times)
 
     def idurations(self):
         '''Return an iterator over the durations as datetime.timedelta objects'''
 
-        for start, end in self.itime_ranges():
-            yield end - start
+        for duration in self.durations:
+            yield datetime.timedelta(seconds=duration)
 
     def idurations_seconds(self):
         '''Return an iterator over the durations as floating point seconds.'''
 
-        for duration in self.idurations():
-            yield duration.total_seconds()
+        return iter(self.durations)
+
+    def activity_counts(self):
+        '''Return the (name, count) of each activity, in descending count
+           order.'''
+
+        counts = [0] * len(self.names)
+        for id_ in self.activities:
+            counts[id_] += 1
+
+        return sorted(izip(self.names, counts), key=itemgetter(1), reverse=True)
+
+    def duration_stats(self):
+        '''Return the Accumulator of the durations in seconds.'''
+
+        if self._durations is None:
+            self._durations = Accumulator().update(self.idurations_seconds())
+
+        return self._durations
 
     def min_duration(self):
         '''Return the minimum duration.'''
 
-        return min(self.idurations_seconds())
+        return self.duration_stats().min
 
     def max_duration(self):
         '''Return the maximum duration.'''
         
-        return max(self.idurations_seconds())
+        return self.duration_stats().max
 
     def mean_duration(self):
         '''Return the mean duration'''
 
-        return mean(*self.idurations_seconds())
+        return self.duration_stats().mean()
 
     def std_duration(self):
         '''Return the standard deviation of durations'''
 
-        return std(*self.idurations_seconds())
+        return self.duration_stats().std()
 
     def bins_duration(self, bins_):
         '''Return a binning of the durations.
@@ -249,16 +551,18 @@ class EventStats(object):
            @param bins_ : int
                the number of bins to use'''
 
-        return list(ibin_counts(bins_, *self.idurations_seconds()))
+        return bin_counts(bins_, self.durations)
 
-    def bin_counts_time_of_day(self, bins_):
+    def bin_counts_time_of_day(self, bins_, seconds=False):
         '''Return a heat map of activity, based on time of day.
 
            @param bins_ : int
-               the number of bins to use'''
+               the number of bins to use
+           @param seconds : optional, bool
+               if True, count the seconds of activity in each bin, instead of
+               the number of events overlapping it'''
 
-        time_ranges = self.itime_ranges_time_of_day_seconds()
-        _counts = ibin_range_counts(bins_, *time_ranges)
+        _counts = bin_span_counts(bins_, self.start_times, self.end_times, seconds=seconds)
 
         counts = list()
         for (start, end), count in _counts:
@@ -267,3 +571,196 @@ class EventStats(object):
             counts.append(((start, end), count))
             
         return counts
+
+class DurationHistogram(object):
+
+    def __init__(self, resolution=1024, width=1.0):
+        '''Create a histogram of durations that takes one value at a time, in
+           bounded memory. The values are counted in resolution fine bins of
+           equal width, starting at 0. When a value falls past the last bin,
+           neighbouring bins are merged pairwise and the width doubles, so the
+           fine bins always cover the largest value seen in at least half of
+           their range.
+
+           @param resolution : optional, int
+               the number of fine bins, must be even
+           @param width : optional, float
+               the initial width of a fine bin, in seconds'''
+
+        self.counts = [0] * resolution
+        self.width = float(width)
+
+    def add(self, x):
+        '''Count a value.
+
+           @param x : int|float
+               the value, negative values are counted as 0'''
+
+        i = int(max(x, 0) / self.width)
+        while i >= len(self.counts):
+            self.coarsen()
+            i = int(max(x, 0) / self.width)
+
+        self.counts[i] += 1
+
+    def coarsen(self):
+        '''Merge neighbouring fine bins pairwise, doubling their width.'''
+
+        counts = self.counts
+        n = len(counts)
+
+        merged = list(counts[i] + counts[i + 1] for i in xrange(0, n, 2))
+        self.counts = merged + [0] * (n - len(merged))
+        self.width *= 2
+
+    def bin_counts(self, bins, min_, max_):
+        '''Return the counts in bins equal bins from min_ to max_, as
+           ibin_counts() would for the values counted. Each fine bin is
+           counted in the bin its middle falls in, so a value may be counted
+           one bin over when it lies within one fine bin width of a boundary.
+
+           @param bins : int
+               the number of bins
+           @param min_ : int|float
+               the smallest value counted
+           @param max_ : int|float
+               the largest value counted'''
+
+        bin_ranges = list(isteps(bins, min_, max_))
+        counts = [0] * bins
+
+        filled = list((i, count) for i, count in enumerate(self.counts) if count)
+        middles = (min(max((i + 0.5) * self.width, min_), max_) for i, count in filled)
+
+        for j, (i, count) in izip(ibin_indices(bin_ranges, middles), filled):
+            counts[j] += count
+
+        return list(izip(bin_ranges, counts))
+
+class StreamingEventStats(object):
+
+    SECONDS_PER_DAY = 24 * 3600
+
+    def __init__(self, tod_bins=5, max_duration=None, resolution=1024):
+        '''Compute the statistics of EventStats over events added one at a
+           time, in a single pass and memory that does not grow with the
+           number of events. Unlike EventStats, the time of day breakdown
+           covers the whole day, rather than the span of the times seen.
+
+           @param tod_bins : optional, int
+               the number of bins to break the day into
+           @param max_duration : optional, int|float
+               if given, events longer than this many seconds are skipped
+           @param resolution : optional, int
+               the number of fine bins the durations are counted in, see
+               DurationHistogram'''
+
+        self.max_duration = max_duration
+
+        self.skipped = 0
+        self.duration_stats = Accumulator()
+
+        self.durations = DurationHistogram(resolution=resolution)
+
+        self.tod_width = float(self.SECONDS_PER_DAY) / tod_bins
+        self.tod_counts = [0] * tod_bins
+
+    def add(self, start, end):
+        '''Add an event.
+
+           @param start : datetime.datetime
+               the start of the event, in the time zone the time of day is
+               wanted in
+           @param end : datetime.datetime
+               the end of the event'''
+
+        duration = (end - start).total_seconds()
+
+        if self.max_duration is not None and duration > self.max_duration:
+            self.skipped += 1
+            return
+
+        self.duration_stats.add(duration)
+        self.durations.add(duration)
+
+        # the bins the event overlaps, wrapping around midnight
+        n_bins = len(self.tod_counts)
+        low = int(datetime_to_time_of_day(start) / self.tod_width)
+        high = int(datetime_to_time_of_day(end) / self.tod_width)
+
+        if high < low:
+            high += n_bins
+
+        for i in xrange(low, min(high, low + n_bins - 1) + 1):
+            self.tod_counts[i % n_bins] += 1
+
+    def update(self, events):
+        '''Add the events in an iterable.
+
+           @param events : iterable(dict)
+               the events, with a start and an end'''
+
+        for event in events:
+            self.add(event['start'], event['end'])
+
+        return self
+
+    @property
+    def count(self):
+        return self.duration_stats.count
+
+    @property
+    def min(self):
+        return self.duration_stats.min
+
+    @property
+    def max(self):
+        return self.duration_stats.max
+
+    def mean_duration(self):
+        '''Return the mean duration, None if there are no events.'''
+
+        return self.duration_stats.mean()
+
+    def std_duration(self):
+        '''Return the standard deviation of durations, None if there are no
+           events.'''
+
+        return self.duration_stats.std()
+
+    def bin_counts_duration(self, bins_):
+        '''Return a count of the binning of the durations, see
+           DurationHistogram.bin_counts.
+
+           @param bins_ : int
+               the number of bins to use, at most the number of events'''
+
+        if not self.count:
+            return list()
+
+        bins_ = min(bins_, self.count)
+        return self.durations.bin_counts(bins_, self.min, self.max)
+
+    def bin_counts_time_of_day(self):
+        '''Return a heat map of activity, the number of events overlapping each
+           time of day bin, with the bins given in seconds into the day.'''
+
+        steps = isteps(len(self.tod_counts), 0, self.SECONDS_PER_DAY)
+        return list(izip(steps, self.tod_counts))
+
+    def summary(self, duration_bins=5):
+        '''Return all of the statistics in a dict.
+
+           @param duration_bins : optional, int
+               the number of bins to break the durations into'''
+
+        return dict(
+            count=self.count,
+            skipped=self.skipped,
+            min=self.min,
+            max=self.max,
+            mean=self.mean_duration(),
+            std=self.std_duration(),
+            durations=self.bin_counts_duration(duration_bins),
+            time_of_day=self.bin_counts_time_of_day()
+        )
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import time
+
+_MISSING = object()
+
+class LRUCache(object):
+
+    def __init__(self, max_entries=None, max_size=None, ttl=None, sizeof=len, on_evict=None):
+        '''Create a least recently used cache. When a limit is exceeded, the
+           least recently used entries are evicted until it no longer is.
+
+           @param max_entries : optional, int
+               the maximum number of entries to hold
+           @param max_size : optional, int
+               the maximum total size of the values held, as measured by sizeof
+           @param ttl : optional, int|float
+               the number of seconds an entry lives for
+           @param sizeof : optional, function(value) -> int
+               measures the size of a value, defaults to len
+           @param on_evict : optional, function(key)
+               called with the key of every entry that is evicted or expires'''
+
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        '''Return the value for key, or default if it is not in the cache or
+           has expired.
+
+           @param key : hashable
+               the key to look up
+           @param default : optional, object
+               the value to return on a miss'''
+
+        entry = self.entries.pop(key, _MISSING)
+
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, size, expires = entry
+
+        if expires is not None and expires <= time.time():
+            self.size -= size
+            self.expirations += 1
+            self.misses += 1
+
+            if self.on_evict is not None:
+                self.on_evict(key)
+
+            return default
+
+        # reinsert the entry to mark it as the most recently used
+        self.entries[key] = entry
+        self.hits += 1
+
+        return value
+
+    def set(self, key, value):
+        '''Store value under key. Returns False if the value alone is larger
+           than max_size, in which case it is not stored.
+
+           @param key : hashable
+               the key to store the value under
+           @param value : object
+               the value to store'''
+
+        self.delete(key)
+
+        size = self.sizeof(value)
+        if self.max_size is not None and size > self.max_size:
+            return False
+
+        expires = None
+        if self.ttl:
+            expires = time.time() + self.ttl
+
+        self.entries[key] = (value, size, expires)
+        self.size += size
+
+        self._evict()
+
+        return True
+
+    def delete(self, key):
+        '''Remove key from the cache, returning whether it was there.
+
+           @param key : hashable
+               the key to remove'''
+
+        entry = self.entries.pop(key, _MISSING)
+
+        if entry is _MISSING:
+            return False
+
+        self.size -= entry[1]
+        return True
+
+    def clear(self):
+        '''Remove every entry from the cache.'''
+
+        self.entries.clear()
+        self.size = 0
+
+    def hit_rate(self):
+        '''Return the fraction of lookups that were hits, or None if there have
+           been no lookups.'''
+
+        lookups = self.hits + self.misses
+        if not lookups:
+            return None
+
+        return float(self.hits) / lookups
+
+    def _evict(self):
+        '''Evict the least recently used entries until the limits hold.'''
+
+        while self.entries and (
+                (self.max_entries is not None and len(self.entries) > self.max_entries) or
+                (self.max_size is not None and self.size > self.max_size)):
+
+            key, (value, size, expires) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+            if self.on_evict is not None:
+                self.on_evict(key)
@@ -1,5 +1,5 @@
 
-from itertools import imap, izip
+from itertools import chain, islice, izip
 
 class Table(object):
 
@@ -17,6 +17,10 @@ class Table(object):
         self.n_columns = len(args[0])
         self.formats = list('{:}' for i in xrange(self.n_columns))
         self.pads = list(False for i in xrange(self.n_columns))
+
+        # the formatted rows, tuples of str, made once and reset when a format
+        # changes
+        self._formatted = None
     
     def set_column_format(self, column, format_):
         '''Sets the format string for a column.
@@ -30,6 +34,7 @@ class Table(object):
             raise ValueError('column is out of range')
 
         self.formats[column] = format_
+        self._formatted = None
     
     def set_column_pad_left(self, column, pad_left):
         '''Sets the padding for a column.
@@ -61,48 +66,45 @@ class Table(object):
 
         for row in self.data:
             yield self.iformat_row(row)
-        
+
+    def formatted_rows(self):
+        '''Return the formatted rows, each formatted only the first time it is
+           asked for.'''
+
+        if self._formatted is None:
+            self._formatted = list(tuple(row) for row in self.iformat_rows())
+
+        return self._formatted
+
     def column_widths(self):
         '''Return the widths of the columns, the length of the longest
            formatted element in each column'''
-        
-        idata = self.iformat_rows()
 
-        row = idata.next()
-        widths = imap(len, row)
-        for row in idata:
-            _widths = imap(len, row)
-            widths = imap(max, izip(widths, _widths))
-        
-        widths = list(widths)
+        widths = list(0 for i in xrange(self.n_columns))
+        for row in self.formatted_rows():
+            widths = map(max, widths, map(len, row))
+
         return widths
 
-    def pad(self, s, width, pad_character=' ', pad_left=False):
-        '''Pad a string with whitespace to be as long as width.
+    def ipad_rows(self, rows, widths, column_joiner=' ', pad_character=' '):
+        '''Return an iterator over formatted rows, padded to widths and joined.
+           An element longer than its width is left as it is.
 
-           @param s : str
-               the string to pad
-           @param width : int
-               the desired width
+           @param rows : iterable(tuple(str))
+               the formatted rows
+           @param widths : list(int)
+               the width of each column
+           @param column_joiner : optional, str
+               what to use to join columns together
            @param pad_character : str
-               a single character used to pad strings
-           @param pad_left : optional, bool
-               if True, pad on the left, otherwise, pad on the right'''
-
-        s_len = len(s)
-
-        if s_len > width:
-            raise ValueError('string is longer than allowed width')
+               a single character used to pad strings'''
 
         if len(pad_character) != 1:
             raise ValueError('pad_character must be exactly one character')
 
-        pad_string = pad_character * (width - s_len)
-
-        if pad_left:
-            return pad_string + s
-
-        return s + pad_string
+        for row in rows:
+            yield column_joiner.join(column.rjust(w, pad_character) if pad_left else column.ljust(w, pad_character)
+                                     for column, w, pad_left in izip(row, widths, self.pads))
 
     def iformatted_rows(self, column_joiner=' ', pad_character=' '):
         '''Print out the formatted data.
@@ -111,16 +113,66 @@ class Table(object):
                what to use to join columns together
            @param pad_character : str
                a single character used to pad strings'''
-        
+
         widths = self.column_widths()
 
-        formatted_rows = list()
-        for row in self.iformat_rows():
-            formatted_row = list()
+        return self.ipad_rows(self.formatted_rows(), widths, column_joiner=column_joiner, pad_character=pad_character)
+
+class StreamingTable(Table):
+
+    def __init__(self, rows, widths=None, sample_size=100):
+        '''Create a table that prints rows as they arrive, without holding
+           them. The widths of the columns are fixed from the first
+           sample_size rows, or given, and later elements that are longer
+           overflow their column.
+
+           @param rows : iterable
+               the rows, each a sequence of objects that can be formatted
+               using str.format(), read once
+           @param widths : optional, list(int)
+               the width of each column, None for a column to be measured
+               from the sample
+           @param sample_size : optional, int
+               the number of rows to measure the columns from'''
+
+        rows = iter(rows)
+        sample = list(islice(rows, sample_size))
+
+        if widths is None and not sample:
+            raise ValueError('at least one row or the widths must be supplied')
+
+        self.data = sample
+        self.rest = rows
+        self.widths = widths
+        self.n_columns = len(widths) if widths is not None else len(sample[0])
+        self.formats = list('{:}' for i in xrange(self.n_columns))
+        self.pads = list(False for i in xrange(self.n_columns))
+        self._formatted = None
+
+    def column_widths(self):
+        '''Return the widths of the columns: those given, and the length of the
+           longest formatted element of the sample for the others'''
+
+        measured = Table.column_widths(self)
+        if self.widths is None:
+            return measured
+
+        return list(m if w is None else w for w, m in izip(self.widths, measured))
+
+    def iformatted_rows(self, column_joiner=' ', pad_character=' '):
+        '''Return an iterator over the rows, padded and joined, formatting
+           each row once. The rows after the sample are not kept.
+
+           @param column_joiner : optional, str
+               what to use to join columns together
+           @param pad_character : str
+               a single character used to pad strings'''
+
+        widths = self.column_widths()
 
-            for column, w, pad_left in izip(row, widths, self.pads):
-                formatted_row.append(self.pad(column, w, pad_character=pad_character, pad_left=pad_left))
+        sample = self.formatted_rows()
+        self.data = self._formatted = list()
 
-            formatted_row = column_joiner.join(formatted_row)
-            yield formatted_row
+        rest = (tuple(self.iformat_row(row)) for row in self.rest)
 
+        return self.ipad_rows(chain(sample, rest), widths, column_joiner=column_joiner, pad_character=pad_character)
@@ -0,0 +1,85 @@
+from bisect import bisect_right
+
+import pytz
+
+class Localizer(object):
+
+    def __init__(self, timezone):
+        '''Convert universal (naive, UTC) datetimes to a timezone in bulk. The
+           result is the same as times.to_local, but the zone is looked up once
+           and each conversion is a binary search over the UTC offset
+           transitions that fall inside the converted times.
+
+           @param timezone : str|pytz.tzinfo.BaseTzInfo
+               the timezone to convert to'''
+
+        if isinstance(timezone, basestring):
+            timezone = pytz.timezone(timezone)
+
+        self.timezone = timezone
+
+        transitions = getattr(timezone, '_utc_transition_times', None)
+        if transitions:
+            # the tzinfo in effect from each transition on, every distinct
+            # offset of a pytz zone is a tzinfo instance of its own
+            self.transitions = transitions
+            self.tzinfos = list(timezone._tzinfos[info] for info in timezone._transition_info)
+        else:
+            # a zone with a single, fixed offset
+            self.transitions = list()
+            self.tzinfos = [timezone]
+
+    def table(self, start, end):
+        '''Return the offset transitions between start and end, and the tzinfo
+           in effect before, between and after them. There is always one more
+           tzinfo than transitions.
+
+           @param start : datetime.datetime
+               the earliest universal time to convert
+           @param end : datetime.datetime
+               the latest universal time to convert'''
+
+        # like pytz, times before the first transition use the first tzinfo
+        low = max(bisect_right(self.transitions, start) - 1, 0)
+        high = max(bisect_right(self.transitions, end), 1)
+
+        return self.transitions[low + 1:high], self.tzinfos[low:high]
+
+    def localize(self, values):
+        '''Convert a list of universal datetimes, returning a list of datetimes
+           aware of the timezone.
+
+           @param values : list(datetime.datetime)
+               the naive datetimes, in UTC'''
+
+        if not values:
+            return list()
+
+        transitions, tzinfos = self.table(min(values), max(values))
+        offsets = list(t._utcoffset for t in tzinfos)
+
+        if not transitions:
+            tzinfo = tzinfos[0]
+            offset = offsets[0]
+            return list((v + offset).replace(tzinfo=tzinfo) for v in values)
+
+        localized = list()
+        for value in values:
+            i = bisect_right(transitions, value)
+            localized.append((value + offsets[i]).replace(tzinfo=tzinfos[i]))
+
+        return localized
+
+# one Localizer per timezone name
+_localizers = dict()
+
+def localizer(timezone):
+    '''Return the Localizer for a timezone name, creating it on first use.
+
+       @param timezone : str
+           the name of the timezone'''
+
+    try:
+        return _localizers[timezone]
+    except KeyError:
+        return _localizers.setdefault(timezone, Localizer(timezone))
@@ -15,7 +15,6 @@ setup(
     description='For people who want to see how they use their time',
     author='Tim Johnson',
     packages=find_packages(),
-    namespace_packages=['regularity'],
     include_package_data=True,
     install_requires=requirements,
     scripts=['bin/bm', 'bin/regularityd']
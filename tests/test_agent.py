@@ -0,0 +1,119 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from regularity.api.agent import Agent, NotListening, forward, shutdown
+
+class TestAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'agent.sock')
+
+        self.calls = list()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_command(self, argv):
+        self.calls.append(argv)
+
+        if 'fail' == argv[0]:
+            sys.exit(3)
+        if 'error' == argv[0]:
+            raise ValueError('bad command')
+        if 'base' == argv[0]:
+            raise BaseException('could not fetch the dashes')
+        if 'slow' == argv[0]:
+            time.sleep(0.5)
+        if 'unicode' == argv[0]:
+            print u'caf\xe9'
+            print 'caf\xc3\xa9'
+            return 0
+
+        print ' '.join(argv)
+        return 0
+
+    def start(self):
+        agent = Agent(self.path, self.run_command)
+
+        thread = threading.Thread(target=agent.serve)
+        thread.start()
+
+        return agent, thread
+
+    def test_forward(self):
+        agent, thread = self.start()
+
+        try:
+            self.assertEqual((0, '. coffee\n'), forward(self.path, ['.', 'coffee']))
+            self.assertEqual((3, ''), forward(self.path, ['fail']))
+            self.assertEqual((1, 'bad command\n'), forward(self.path, ['error']))
+            self.assertEqual((1, 'could not fetch the dashes\n'), forward(self.path, ['base']))
+
+            # the agent is still there after a BaseException
+            self.assertEqual((0, '. tea\n'), forward(self.path, ['.', 'tea']))
+        finally:
+            shutdown(self.path)
+            thread.join()
+
+        self.assertEqual(5, agent.commands)
+        self.assertEqual(5, len(self.calls))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_no_agent(self):
+        self.assertRaises(NotListening, forward, self.path, ['.', 'coffee'])
+
+    def test_unicode(self):
+        agent, thread = self.start()
+
+        try:
+            self.assertEqual((0, u'caf\xe9\ncaf\xe9\n'), forward(self.path, ['unicode']))
+        finally:
+            shutdown(self.path)
+            thread.join()
+
+    def test_timeout(self):
+        agent, thread = self.start()
+
+        try:
+            # the command was sent, so the error is not NotListening, and the
+            # command is not to be run again
+            try:
+                forward(self.path, ['slow'], timeout=0.1)
+            except socket.error as e:
+                self.assertFalse(isinstance(e, NotListening))
+            else:
+                self.fail('forward did not time out')
+        finally:
+            shutdown(self.path)
+            thread.join()
+
+        self.assertEqual([['slow']], self.calls)
+
+    def test_idle_timeout(self):
+        agent = Agent(self.path, self.run_command, idle_timeout=0.05)
+        agent.serve()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_socket(self):
+        agent = Agent(self.path, self.run_command)
+        agent.socket.close()
+
+        # nothing listens on the socket left behind, so it is replaced
+        agent, thread = self.start()
+
+        try:
+            self.assertRaises(BaseException, Agent, self.path, self.run_command)
+        finally:
+            shutdown(self.path)
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
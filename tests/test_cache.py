@@ -0,0 +1,92 @@
+import unittest
+
+from regularity.api.cache import ResponseCache
+from regularity.utils.lru import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_max_entries(self):
+        c = LRUCache(max_entries=2)
+
+        c.set('a', 'A')
+        c.set('b', 'B')
+        self.assertEqual('A', c.get('a'))
+
+        # b is now the least recently used
+        c.set('c', 'C')
+        self.assertNotIn('b', c)
+        self.assertEqual('A', c.get('a'))
+        self.assertEqual('C', c.get('c'))
+        self.assertEqual(1, c.evictions)
+
+    def test_max_size(self):
+        evicted = list()
+        c = LRUCache(max_size=5, on_evict=evicted.append)
+
+        c.set('a', 'aa')
+        c.set('b', 'bbb')
+        self.assertEqual(5, c.size)
+
+        c.set('c', 'c')
+        self.assertEqual(['a'], evicted)
+        self.assertEqual(4, c.size)
+
+        self.assertFalse(c.set('d', 'dddddd'))
+        self.assertNotIn('d', c)
+
+    def test_ttl(self):
+        c = LRUCache(ttl=-1)
+
+        c.set('a', 'A')
+        self.assertEqual(None, c.get('a'))
+        self.assertEqual(1, c.expirations)
+        self.assertEqual(0, c.size)
+
+    def test_hit_rate(self):
+        c = LRUCache()
+        self.assertEqual(None, c.hit_rate())
+
+        c.set('a', 'A')
+        c.get('a')
+        c.get('b')
+        self.assertEqual(0.5, c.hit_rate())
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_key(self):
+        c = ResponseCache()
+
+        k1 = c.key('u', 'dots', dict(limit='10', name=''))
+        k2 = c.key('u', 'dots', dict(limit='10'))
+        self.assertEqual(k1, k2)
+
+    def test_invalidate(self):
+        c = ResponseCache()
+
+        dots = c.key('u', 'dots', dict(limit='10'))
+        dashes = c.key('u', 'dashes', dict(limit='10'))
+        other = c.key('v', 'dots', dict(limit='10'))
+
+        for key in (dots, dashes, other):
+            c.set(key, '[]', c.generation(key))
+
+        c.invalidate('dots', 'create', dict(user='u'))
+
+        self.assertEqual(None, c.get(dots))
+        self.assertEqual('[]', c.get(dashes))
+        self.assertEqual('[]', c.get(other))
+
+    def test_stale_set(self):
+        c = ResponseCache()
+
+        key = c.key('u', 'dots', dict())
+        generation = c.generation(key)
+
+        # a write lands while the response is being computed
+        c.invalidate('dots', 'create', dict(user='u'))
+        c.set(key, '[]', generation)
+
+        self.assertEqual(None, c.get(key))
+
+if __name__ == '__main__':
+    unittest.main()
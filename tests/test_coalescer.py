@@ -0,0 +1,47 @@
+import datetime
+import unittest
+
+from regularity.daemon.coalescer import Coalescer
+
+class TestCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = list()
+        self.coalescer = Coalescer(lambda *dash: self.sent.append(dash), min_dwell=1, merge_threshold=5)
+
+        self.start = datetime.datetime(2012, 1, 1)
+
+    def t(self, seconds):
+        return self.start + datetime.timedelta(seconds=seconds)
+
+    def test_burst(self):
+        # alt-tab through b and c, back to a
+        self.coalescer.add('a', self.t(0), self.t(60))
+        self.coalescer.add('b', self.t(60), self.t(60.3))
+        self.coalescer.add('c', self.t(60.3), self.t(60.5))
+        self.coalescer.add('a', self.t(60.5), self.t(120))
+        self.assertEqual([], self.sent)
+
+        self.coalescer.add('b', self.t(120), self.t(180))
+        self.assertEqual([('a', self.t(0), self.t(120))], self.sent)
+        self.assertEqual(dict(added=5, dropped=2, merged=1, sent=1), self.coalescer.stats())
+
+    def test_no_merge_over_activity(self):
+        self.coalescer.add('a', self.t(0), self.t(60))
+        self.coalescer.add('b', self.t(60), self.t(62))
+        self.coalescer.add('a', self.t(62), self.t(70))
+        self.coalescer.flush()
+
+        self.assertEqual(['a', 'b', 'a'], list(d[0] for d in self.sent))
+
+    def test_expire(self):
+        self.coalescer.add('a', self.t(0), self.t(60))
+
+        self.coalescer.expire(self.t(65))
+        self.assertEqual([], self.sent)
+
+        self.coalescer.expire(self.t(66))
+        self.assertEqual([('a', self.t(0), self.t(60))], self.sent)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import datetime
+import unittest
+
+from regularity.daemon.daemon import RegularityDaemon
+from regularity.daemon.sources import ReplaySource, synthetic
+
+class FakeSender(object):
+
+    def __init__(self):
+        self.events = list()
+
+    def dash(self, timeline, activity, start, end):
+        self.events.append(('dash', timeline, activity, start, end))
+        return len(self.events)
+
+    def extend(self, dash, end):
+        self.events.append(('extend', dash, end))
+
+    def stats(self):
+        return dict()
+
+def switch(t, from_path, to_path):
+    return dict(time=t, signal='ActiveApplicationChanged', args=[from_path, to_path])
+
+def screensaver(t, active):
+    return dict(time=t, signal='ActiveChanged', args=[active])
+
+class TestRegularityDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = FakeSender()
+
+        self.records = [
+            dict(time=0, path='/a', name='A'),
+            dict(time=0, path='/b', name='B'),
+            switch(0, None, '/a'),
+        ]
+
+    def t(self, seconds):
+        return datetime.datetime.utcfromtimestamp(seconds)
+
+    def run_daemon(self, **kwargs):
+        daemon = RegularityDaemon(ReplaySource(self.records), self.sender, **kwargs)
+        daemon.run()
+        daemon.stop()
+
+        return daemon
+
+    def test_switches(self):
+        self.records += [
+            switch(60, '/a', '/b'),
+            # a short visit to a, merged into b
+            switch(120, '/b', '/a'),
+            switch(120.5, '/a', '/b'),
+            switch(200, '/b', '/a'),
+            screensaver(300, True),
+            screensaver(400, False),
+        ]
+
+        self.run_daemon()
+
+        self.assertEqual([
+            ('dash', 'regularityd', 'a', self.t(0), self.t(60)),
+            ('dash', 'regularityd', 'b', self.t(60), self.t(200)),
+            ('dash', 'regularityd', 'a', self.t(200), self.t(300)),
+            ('dash', 'screensaver', 'screensaver', self.t(300), self.t(400)),
+        ], sorted(self.sender.events, key=lambda e: e[3]))
+
+    def test_heartbeat(self):
+        self.records += [
+            switch(2.5, '/a', '/b'),
+            switch(2.8, '/b', '/a'),
+            switch(4.5, '/a', '/b'),
+        ]
+
+        self.run_daemon(heartbeat=1)
+
+        self.assertEqual([
+            ('dash', 'regularityd', 'a', self.t(0), self.t(1)),
+            ('extend', 1, self.t(2)),
+            ('extend', 1, self.t(2.5)),
+            # b never lasts until a heartbeat
+            ('dash', 'regularityd', 'a', self.t(2.8), self.t(3)),
+            ('extend', 4, self.t(4)),
+            ('extend', 4, self.t(4.5)),
+        ], self.sender.events)
+
+    def test_heartbeat_short(self):
+        self.records += [
+            # both shorter than the heartbeat
+            switch(3, '/a', '/b'),
+            switch(7, '/b', '/a'),
+            # shorter than min_dwell
+            switch(7.5, '/a', '/b'),
+            switch(15, '/b', '/a'),
+            screensaver(18, True),
+        ]
+
+        self.run_daemon(heartbeat=10)
+
+        self.assertEqual([
+            ('dash', 'regularityd', 'a', self.t(0), self.t(3)),
+            ('dash', 'regularityd', 'b', self.t(3), self.t(7)),
+            ('dash', 'regularityd', 'b', self.t(7.5), self.t(10)),
+            ('extend', 3, self.t(15)),
+            ('dash', 'regularityd', 'a', self.t(15), self.t(18)),
+        ], self.sender.events)
+
+    def test_synthetic(self):
+        self.records = list(synthetic(100, screensaver_every=10, seed=1, start=0))
+
+        daemon = self.run_daemon()
+
+        self.assertEqual(110, daemon.coalescer.stats()['added'])
+        self.assertEqual(10, len(list(e for e in self.sender.events if e[1] == 'screensaver')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+import unittest
+
+try:
+    import requests
+    from regularity.api.client import API
+except ImportError:
+    API = None
+
+from regularity.api.feed import ChangeFeed, FeedBusy
+
+class Response(object):
+
+    def __init__(self, status_code, content=''):
+        self.status_code = status_code
+        self.content = content
+
+class FakeSession(object):
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def get(self, url, data=None, timeout=None):
+        self.calls += 1
+
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        pass
+
+class TestChangeFeed(unittest.TestCase):
+
+    def test_since(self):
+        feed = ChangeFeed()
+
+        feed.publish('dots', 'create', dict(user='u', name='a'))
+        feed.publish('dots', 'create', dict(user='v', name='b'))
+        feed.publish('dashes', 'delete', dict(user='u', name='c'))
+
+        response = feed.wait('u', since=0, timeout=0)
+        self.assertEqual(2, response['seq'])
+        self.assertFalse(response['reset'])
+        self.assertEqual([1, 2], list(e['seq'] for e in response['events']))
+
+        response = feed.wait('u', since=1, epoch=feed.epoch, timeout=0)
+        self.assertEqual(['delete'], list(e['action'] for e in response['events']))
+
+    def test_timeout(self):
+        feed = ChangeFeed()
+
+        response = feed.wait('u', timeout=0.01)
+        self.assertEqual(0, response['seq'])
+        self.assertEqual([], response['events'])
+
+    def test_wake(self):
+        feed = ChangeFeed()
+
+        timer = threading.Timer(0.01, feed.publish, ('dots', 'create', dict(user='u')))
+        timer.start()
+
+        response = feed.wait('u', timeout=5)
+        timer.join()
+
+        self.assertEqual(1, response['seq'])
+
+    def test_reset(self):
+        feed = ChangeFeed(retain=2)
+
+        for i in xrange(4):
+            feed.publish('dots', 'create', dict(user='u'))
+
+        self.assertTrue(feed.wait('u', since=1, timeout=0)['reset'])
+        self.assertFalse(feed.wait('u', since=2, timeout=0)['reset'])
+        self.assertTrue(feed.wait('u', since=2, epoch='other', timeout=0)['reset'])
+        self.assertTrue(feed.wait('u', since=10, timeout=0)['reset'])
+
+    def test_max_waiters(self):
+        feed = ChangeFeed(max_waiters=2)
+
+        # more waiters than the feed, or a server's thread pool, would hold
+        results = list()
+        def wait(user):
+            try:
+                results.append(feed.wait(user, timeout=5)['seq'])
+            except FeedBusy:
+                results.append('busy')
+
+        threads = list(threading.Thread(target=wait, args=('u%d' % i,)) for i in xrange(12))
+        for thread in threads:
+            thread.start()
+
+        deadline = time.time() + 5
+        while len(results) < 10 and time.time() < deadline:
+            time.sleep(0.01)
+
+        # the excess waiters are turned away without waiting
+        self.assertEqual(['busy'] * 10, results)
+
+        # a subscriber with changes to read is still answered
+        feed.publish('dots', 'create', dict(user='v'))
+        self.assertEqual(1, feed.wait('v', timeout=5)['seq'])
+
+        for i in xrange(12):
+            feed.publish('dots', 'create', dict(user='u%d' % i))
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['busy'] * 10 + [1, 1], results)
+        self.assertEqual(0, feed.waiters)
+
+@unittest.skipUnless(API, 'requires requests and pytz')
+class TestSubscribe(unittest.TestCase):
+
+    def test_reconnect(self):
+        changes = dict(epoch='e', seq=1, reset=False, events=[dict(seq=1, collection='dots', action='create', document=dict(name='a'))])
+
+        api = API('localhost', 8080, 'UTC', user='u')
+        api._session = FakeSession([
+            requests.exceptions.ConnectionError('connection refused'),
+            requests.exceptions.ReadTimeout('read timed out'),
+            Response(500),
+            Response(200, json.dumps(changes)),
+        ])
+
+        # the failed polls are retried until the server answers
+        event = next(api.subscribe(retry_delay=0))
+
+        self.assertEqual(1, event['seq'])
+        self.assertEqual('e', event['epoch'])
+        self.assertEqual(4, api._session.calls)
+
+    def test_busy(self):
+        changes = dict(epoch='e', seq=1, reset=False, events=[dict(seq=1, collection='dots', action='create', document=dict(name='a'))])
+
+        api = API('localhost', 8080, 'UTC', user='u')
+        api._session = FakeSession([
+            Response(429),
+            Response(200, json.dumps(changes)),
+        ])
+
+        sleeps = list()
+        sleep, time.sleep = time.sleep, sleeps.append
+        try:
+            event = next(api.subscribe(retry_delay=1, busy_delay=30))
+        finally:
+            time.sleep = sleep
+
+        # a poll turned away waits busy_delay rather than retry_delay
+        self.assertEqual(1, event['seq'])
+        self.assertEqual([30], sleeps)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from regularity.api.importer import Checkpoint, Importer, key, normalize, read_records
+except ImportError:
+    Importer = None
+
+from regularity.core.validation import ValidationError
+
+class Result(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+class FakeAPI(object):
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = list()
+
+    def batch(self, events):
+        if self.failures:
+            self.failures -= 1
+            return Result(None)
+
+        self.batches.append(events)
+        return Result(events)
+
+@unittest.skipUnless(Importer, 'requires pytz')
+class TestImporter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def rows(self, n):
+        return list(dict(name='a%d' % i, time='2012-03-01T10:%02d:00' % (i % 60)) for i in xrange(n))
+
+    def test_normalize(self):
+        dot = normalize(dict(name='coffee', time='2012-03-01T10:00:00Z', duration='ignored'), 'import')
+        self.assertEqual(dict(type='dot', timeline='import', activity='coffee', time=datetime.datetime(2012, 3, 1, 10)), dot)
+
+        dash = normalize(dict(activity='work', timeline='bm', start='2012-03-01 09:00', end='2012-03-01 10:00'), 'import')
+        self.assertEqual('dash', dash['type'])
+        self.assertEqual('bm', dash['timeline'])
+
+        self.assertRaises(ValidationError, normalize, dict(name='x', time='yesterday'), 'import')
+        self.assertRaises(ValidationError, normalize, dict(time='2012-03-01T10:00'), 'import')
+        self.assertRaises(ValidationError, normalize, dict(name='x', start='2012-03-01T10:00', end='2012-03-01T09:00'), 'import')
+        self.assertRaises(ValidationError, normalize, None, 'import')
+
+    def test_key(self):
+        record = normalize(dict(name='coffee', time='2012-03-01T10:00:00'), 'import')
+
+        self.assertEqual(24, len(key('user', record)))
+        self.assertEqual(key('user', record), key('user', dict(record)))
+        self.assertNotEqual(key('user', record), key('other', record))
+
+    def test_read_records(self):
+        csv_path = self.write('events.csv', 'type,name,time\ndot,coffee,2012-03-01T10:00\n')
+        self.assertEqual([dict(type='dot', name='coffee', time='2012-03-01T10:00')], list(read_records(csv_path)))
+
+        ndjson_path = self.write('events.ndjson', '{"name": "coffee", "time": "2012-03-01T10:00"}\n\nnot json\n')
+        self.assertEqual([dict(name='coffee', time='2012-03-01T10:00'), None], list(read_records(ndjson_path)))
+
+    def test_unicode(self):
+        csv_path = self.write('events.csv', 'name,time\ncaf\xc3\xa9,2012-03-01T10:00\nbad\xff,2012-03-01T11:00\n')
+        records = list(read_records(csv_path))
+
+        self.assertEqual([dict(name=u'caf\xe9', time=u'2012-03-01T10:00'), None], records)
+
+        record = normalize(records[0], 'import')
+        self.assertEqual(u'caf\xe9', record['activity'])
+        self.assertEqual(24, len(key('user', record)))
+
+    def test_run(self):
+        api = FakeAPI()
+        rows = self.rows(25)
+        rows.insert(3, dict(name='broken'))
+
+        stats = Importer(api, 'user', batch_size=10, in_flight=2).run(rows)
+
+        self.assertEqual(25, stats['imported'])
+        self.assertEqual(1, stats['invalid'])
+        self.assertEqual([10, 10, 5], list(len(b) for b in api.batches))
+        self.assertEqual(25, len(set(e['key'] for b in api.batches for e in b)))
+
+    def test_rejected(self):
+        class RejectingAPI(FakeAPI):
+            def batch(self, events):
+                return Result([dict(error='unknown type')] + events[1:])
+
+        stats = Importer(RejectingAPI(), 'user', batch_size=10).run(self.rows(10))
+
+        self.assertEqual(9, stats['imported'])
+        self.assertEqual(1, stats['invalid'])
+
+    def test_retry(self):
+        api = FakeAPI(failures=2)
+        stats = Importer(api, 'user', batch_size=10, retries=2, retry_delay=0).run(self.rows(10))
+
+        self.assertEqual(10, stats['imported'])
+
+        api = FakeAPI(failures=3)
+        importer = Importer(api, 'user', batch_size=10, retries=2, retry_delay=0)
+
+        self.assertRaises(BaseException, importer.run, self.rows(10))
+
+    def test_checkpoint(self):
+        source = self.write('events.ndjson', '')
+        checkpoint = Checkpoint(os.path.join(self.directory, 'events.checkpoint'), source)
+
+        # an import interrupted after the first two batches
+        checkpoint.save(20)
+
+        api = FakeAPI()
+        stats = Importer(api, 'user', batch_size=10, checkpoint=checkpoint).run(self.rows(35))
+
+        self.assertEqual(20, stats['skipped'])
+        self.assertEqual(15, stats['imported'])
+        self.assertEqual('a20', api.batches[0][0]['activity'])
+        self.assertFalse(os.path.exists(checkpoint.path))
+
+        other = Checkpoint(checkpoint.path, os.path.join(self.directory, 'other.ndjson'))
+        checkpoint.save(5)
+        self.assertRaises(BaseException, other.load)
+
+if __name__ == '__main__':
+    unittest.main()
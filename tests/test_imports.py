@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# the server and daemon side modules the client side must not pull in
+FORBIDDEN = ('pymongo', 'bson', 'web', 'dbus', 'gobject', 'pkg_resources')
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+try:
+    import requests
+    import pytz
+except ImportError:
+    requests = None
+
+def loaded(module):
+    '''Return the forbidden modules loaded by importing a module in a fresh
+       interpreter.'''
+
+    probe = 'import sys, %s; print " ".join(m for m in sys.modules if m.split(".")[0] in %r)' % (module, FORBIDDEN)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+
+    output = subprocess.check_output([sys.executable, '-c', probe], env=env)
+    return output.split()
+
+class TestImports(unittest.TestCase):
+
+    def test_light_modules(self):
+        for module in ('regularity.api.agent', 'regularity.core.serializers', 'regularity.api.journal', 'regularity.stats'):
+            self.assertEqual([], loaded(module), module)
+
+    @unittest.skipUnless(requests, 'requires requests and pytz')
+    def test_client(self):
+        self.assertEqual([], loaded('regularity.api.client'))
+
+    @unittest.skipUnless(pymongo, 'requires pymongo')
+    def test_object_id(self):
+        from pymongo.objectid import ObjectId
+
+        from regularity.core import serializers
+
+        hex_ = '4f4d3a2b1c0d9e8f7a6b5c4d'
+        self.assertEqual(ObjectId(hex_), serializers.object_id(hex_))
+        self.assertEqual(hex_, serializers.object_id(ObjectId(hex_)))
+
+if __name__ == '__main__':
+    unittest.main()
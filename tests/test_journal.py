@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from regularity.api.journal import Journal, JournalFlusher
+
+class FakeAPI(object):
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = list()
+
+    def post_batch(self, events):
+        if self.fail:
+            return None
+
+        self.batches.append(list(events))
+        return events
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append(self):
+        journal = Journal(self.path)
+
+        key = journal.append(dict(type='dot'))
+        self.assertEqual(24, len(key))
+        int(key, 16)
+
+        self.assertEqual([dict(type='dot', key=key)], journal.peek(10))
+
+    def test_reload(self):
+        journal = Journal(self.path, fsync='never')
+
+        k1 = journal.append(dict(n=1))
+        k2 = journal.append(dict(n=2))
+        k3 = journal.append(dict(n=3))
+        journal.ack([k1, k3])
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertEqual([dict(n=2, key=k2)], journal.peek(10))
+
+    def test_corrupt_line(self):
+        journal = Journal(self.path)
+        key = journal.append(dict(n=1))
+        journal.close()
+
+        with open(self.path, 'a') as journal_file:
+            journal_file.write('{"key": "trunc')
+
+        journal = Journal(self.path)
+        self.assertEqual([dict(n=1, key=key)], journal.peek(10))
+
+    def test_compact(self):
+        journal = Journal(self.path, compact_threshold=2)
+
+        k1 = journal.append(dict(n=1))
+        k2 = journal.append(dict(n=2))
+        k3 = journal.append(dict(n=3))
+        journal.ack([k1, k2])
+
+        with open(self.path, 'r') as journal_file:
+            lines = journal_file.readlines()
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual([dict(n=3, key=k3)], journal.peek(10))
+
+class TestJournalFlusher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = Journal(os.path.join(self.directory, 'journal'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_flush(self):
+        api = FakeAPI()
+        flusher = JournalFlusher(api, self.journal, batch_size=2)
+
+        for i in xrange(5):
+            self.journal.append(dict(n=i))
+
+        self.assertTrue(flusher.flush())
+        self.assertEqual([2, 2, 1], list(len(b) for b in api.batches))
+        self.assertEqual(0, len(self.journal))
+
+    def test_failure(self):
+        flusher = JournalFlusher(FakeAPI(fail=True), self.journal)
+
+        self.journal.append(dict(n=1))
+
+        self.assertFalse(flusher.flush())
+        self.assertEqual(1, len(self.journal))
+
+if __name__ == '__main__':
+    unittest.main()
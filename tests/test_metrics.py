@@ -0,0 +1,70 @@
+import unittest
+
+from regularity.core.metrics import Histogram, Registry
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        h = Histogram((1, 5, 10))
+
+        for value in (0.5, 1, 3, 7, 20):
+            h.observe(value)
+
+        self.assertEqual([2, 1, 1, 1], h.counts)
+        self.assertEqual(5, h.count)
+        self.assertEqual(31.5, h.sum)
+
+    def test_quantile(self):
+        h = Histogram((1, 5, 10))
+        self.assertEqual(None, h.quantile(0.5))
+
+        for value in (0.5, 0.5, 3, 7):
+            h.observe(value)
+
+        self.assertEqual(1, h.quantile(0.5))
+        self.assertEqual(10, h.quantile(0.99))
+
+class TestRegistry(unittest.TestCase):
+
+    def test_disabled(self):
+        r = Registry()
+
+        r.increment('hits', endpoint='a')
+        r.observe('latency', 0.1, endpoint='a')
+        with r.timer('latency', endpoint='a'):
+            pass
+
+        self.assertEqual(0, r.counter('hits', endpoint='a'))
+        self.assertEqual(None, r.histogram('latency', endpoint='a'))
+
+    def test_enabled(self):
+        r = Registry(enabled=True)
+
+        r.increment('hits', endpoint='a')
+        r.increment('hits', 2, endpoint='a')
+        r.increment('hits', endpoint='b')
+        with r.timer('latency', endpoint='a'):
+            pass
+
+        self.assertEqual(3, r.counter('hits', endpoint='a'))
+        self.assertEqual(1, r.counter('hits', endpoint='b'))
+        self.assertEqual(1, r.histogram('latency', endpoint='a').count)
+
+    def test_render(self):
+        r = Registry(enabled=True)
+        r.set_buckets('size', (10, 100))
+
+        r.increment('hits', endpoint='a')
+        r.observe('size', 50, endpoint='a')
+
+        lines = r.render().splitlines()
+
+        self.assertIn('# TYPE regularity_hits counter', lines)
+        self.assertIn('regularity_hits{endpoint="a"} 1', lines)
+        self.assertIn('regularity_size_bucket{endpoint="a",le="10"} 0', lines)
+        self.assertIn('regularity_size_bucket{endpoint="a",le="100"} 1', lines)
+        self.assertIn('regularity_size_bucket{endpoint="a",le="+Inf"} 1', lines)
+        self.assertIn('regularity_size_count{endpoint="a"} 1', lines)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from regularity.daemon.resolver import ApplicationResolver
+
+class FakeBus(object):
+    '''A session bus whose async calls are answered when reply() is called.'''
+
+    def __init__(self, names):
+        self.names = names
+        self.calls = list()
+        self.receivers = list()
+
+    def add_signal_receiver(self, handler, signal, interface):
+        self.receivers.append((handler, signal, interface))
+
+    def call_async(self, bus_name, path, interface, method, signature, args, reply_handler, error_handler):
+        self.calls.append((path, reply_handler, error_handler))
+
+    def reply(self):
+        calls, self.calls = self.calls, list()
+
+        for path, reply_handler, error_handler in calls:
+            if path in self.names:
+                reply_handler(self.names[path])
+            else:
+                error_handler(Exception('no such view'))
+
+class TestApplicationResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBus({ '/a' : 'Firefox', '/b' : 'Terminal' })
+        self.resolver = ApplicationResolver(self.bus)
+        self.resolved = list()
+
+    def test_cache(self):
+        self.resolver.resolve('/a', self.resolved.append)
+        self.resolver.resolve('/a', self.resolved.append)
+        self.assertEqual([], self.resolved)
+
+        # both lookups wait on a single call
+        self.assertEqual(1, len(self.bus.calls))
+        self.bus.reply()
+        self.assertEqual(['firefox', 'firefox'], self.resolved)
+
+        self.resolver.resolve('/a', self.resolved.append)
+        self.assertEqual(['firefox'] * 3, self.resolved)
+
+        stats = self.resolver.stats()
+        self.assertEqual(1, stats['calls'])
+        self.assertEqual(1, stats['hits'])
+
+    def test_view_closed(self):
+        self.resolver.bind()
+        handler, signal, interface = self.bus.receivers[0]
+        self.assertEqual('ViewClosed', signal)
+
+        self.resolver.resolve('/a')
+        self.bus.reply()
+        handler('/a', 'application')
+
+        self.resolver.resolve('/a', self.resolved.append)
+        self.assertEqual(1, len(self.bus.calls))
+
+        # closed while in flight, so the answer is used but not cached
+        handler('/a', 'application')
+        self.bus.reply()
+        self.assertEqual(['firefox'], self.resolved)
+        self.assertNotIn('/a', self.resolver.cache)
+
+    def test_error(self):
+        self.resolver.resolve('/c', self.resolved.append)
+        self.bus.reply()
+
+        self.assertEqual([None], self.resolved)
+        self.assertEqual(1, self.resolver.stats()['errors'])
+
+if __name__ == '__main__':
+    unittest.main()
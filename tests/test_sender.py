@@ -0,0 +1,126 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from regularity.api.journal import Journal
+from regularity.api.sender import EventSender
+
+class FakeAPI(object):
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = list()
+
+    def post_batch(self, events):
+        if self.fail:
+            return None
+
+        self.batches.append(list(events))
+        return events
+
+class TestEventSender(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spill')
+        self.now = datetime.datetime(2012, 1, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sent(self, api):
+        return list(e['activity'] for batch in api.batches for e in batch)
+
+    def test_batches(self):
+        api = FakeAPI()
+        sender = EventSender(api, batch_size=2)
+
+        for activity in 'abc':
+            sender.dash('t', activity, self.now, self.now)
+
+        self.assertEqual(3, len(sender))
+        self.assertTrue(sender.flush())
+
+        self.assertEqual([2, 1], list(len(b) for b in api.batches))
+        self.assertEqual(['a', 'b', 'c'], self.sent(api))
+        self.assertEqual('2012-01-01T00:00:00.000000', api.batches[0][0]['start'])
+        self.assertEqual(0, len(sender))
+
+    def test_drop(self):
+        api = FakeAPI()
+        sender = EventSender(api, capacity=2)
+
+        for activity in 'abc':
+            sender.dot('t', activity, self.now)
+
+        sender.flush()
+        self.assertEqual(['b', 'c'], self.sent(api))
+        self.assertEqual(1, sender.stats()['dropped'])
+
+    def test_drop_while_sending(self):
+        sender = EventSender(None, capacity=3, batch_size=2)
+        now = self.now
+
+        class PuttingAPI(FakeAPI):
+            def post_batch(self, events):
+                # two writes arrive during the send of the first batch, and
+                # push the two being sent out of the full queue
+                if not self.batches:
+                    sender.dot('t', 'd', now)
+                    sender.dot('t', 'e', now)
+                return FakeAPI.post_batch(self, events)
+
+        api = sender.api = PuttingAPI()
+
+        for activity in 'abc':
+            sender.dot('t', activity, self.now)
+
+        self.assertTrue(sender.flush())
+        # c, which was not sent, is not removed in their place
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], self.sent(api))
+
+    def test_durable(self):
+        api = FakeAPI(fail=True)
+        sender = EventSender(api, spill=Journal(self.path, fsync='never'), durable=True)
+
+        for activity in 'ab':
+            sender.dot('t', activity, self.now)
+
+        # every write is in the journal, none only in memory
+        self.assertEqual(0, len(sender.queue))
+        self.assertEqual(2, len(sender.spill))
+        sender.spill.close()
+
+        # as after a crash, the next run sends them
+        api.fail = False
+        sender = EventSender(api, spill=Journal(self.path, fsync='never'), durable=True)
+        self.assertTrue(sender.flush())
+        self.assertEqual(['a', 'b'], self.sent(api))
+        sender.spill.close()
+
+    def test_spill(self):
+        api = FakeAPI(fail=True)
+        sender = EventSender(api, capacity=2, spill=Journal(self.path, fsync='never'))
+
+        for activity in 'abcd':
+            sender.pending('t', activity, self.now)
+
+        self.assertEqual(2, sender.stats()['spilled'])
+        self.assertFalse(sender.flush())
+
+        # nothing is sent, so the queue is moved to the front of the journal
+        sender.start()
+        sender.stop()
+        sender.spill.close()
+
+        api.fail = False
+        sender = EventSender(api, spill=Journal(self.path, fsync='never'))
+        sender.cancel_pending('t', 'e')
+
+        self.assertTrue(sender.flush())
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], self.sent(api))
+
+if __name__ == '__main__':
+    unittest.main()
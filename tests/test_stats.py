@@ -0,0 +1,303 @@
+import datetime
+import random
+import unittest
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+from regularity import stats
+from regularity.core.stats import Accumulator, RegularityStatistics
+from regularity.sparkline import Sparkline
+from regularity.stats import (DurationHistogram, EventStats, StreamingEventStats, bin_counts, bin_range_counts, ibin_counts,
+                              ibins_range, isteps)
+
+def linear_counts(bins, data, min_=None):
+    '''The binning ibin_counts() did before bin_counts(), a scan of the bins
+       for each datum'''
+
+    bin_ranges = list(isteps(bins, *data, min=min_))
+    counts = [0] * bins
+    for x in data:
+        for i, (bin_min, bin_max) in enumerate(bin_ranges):
+            if x < bin_max:
+                break
+        counts[i] += 1
+
+    return zip(bin_ranges, counts)
+
+class TestStreamingEventStats(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+
+        start = datetime.datetime(2012, 3, 1)
+        self.events = list()
+        for i in xrange(500):
+            start += datetime.timedelta(seconds=rand.randint(60, 4 * 3600))
+            end = start + datetime.timedelta(seconds=rand.randint(1, 2 * 3600))
+            self.events.append(dict(start=start, end=end))
+
+    def test_durations(self):
+        expected = EventStats(*self.events)
+        s = StreamingEventStats().update(iter(self.events))
+
+        self.assertEqual(len(self.events), s.count)
+        self.assertEqual(expected.min_duration(), s.min)
+        self.assertEqual(expected.max_duration(), s.max)
+        self.assertAlmostEqual(expected.mean_duration(), s.mean_duration())
+        self.assertAlmostEqual(expected.std_duration(), s.std_duration())
+
+        # the fine bins are 8 seconds wide here, a value near a boundary
+        # may be counted one bin over
+        counts = s.bin_counts_duration(5)
+        expected_counts = expected.bin_counts_duration(5)
+
+        self.assertEqual(sum(c for r, c in expected_counts), sum(c for r, c in counts))
+        for (expected_range, expected_count), (range_, count) in zip(expected_counts, counts):
+            self.assertEqual(expected_range, range_)
+            self.assertTrue(abs(expected_count - count) <= 3)
+
+    def test_max_duration(self):
+        s = StreamingEventStats(max_duration=3600).update(self.events)
+
+        self.assertEqual(len(self.events), s.count + s.skipped)
+        self.assertTrue(s.max <= 3600)
+
+    def test_time_of_day(self):
+        s = StreamingEventStats(tod_bins=4)
+
+        t = datetime.datetime(2012, 3, 1)
+        s.add(t.replace(hour=1), t.replace(hour=2))
+        s.add(t.replace(hour=5), t.replace(hour=13))
+        # wraps around midnight
+        s.add(t.replace(hour=23), t.replace(hour=1) + datetime.timedelta(days=1))
+
+        self.assertEqual([
+            ((0, 21600), 3),
+            ((21600, 43200), 1),
+            ((43200, 64800), 1),
+            ((64800, 86400), 1),
+        ], list(((int(low), int(high)), count) for (low, high), count in s.bin_counts_time_of_day()))
+
+    def test_empty(self):
+        summary = StreamingEventStats().summary()
+
+        self.assertEqual(0, summary['count'])
+        self.assertEqual(None, summary['mean'])
+        self.assertEqual(list(), summary['durations'])
+
+class TestEventStats(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+
+        start = datetime.datetime(2012, 3, 1)
+        self.events = list()
+        for i in xrange(500):
+            start += datetime.timedelta(seconds=rand.randint(60, 4 * 3600))
+            end = start + datetime.timedelta(seconds=rand.randint(1, 2 * 3600), microseconds=rand.randint(0, 999999))
+            self.events.append(dict(name=rand.choice(['work', 'read', 'run']), start=start, end=end))
+
+    def test_columns(self):
+        s = EventStats(*self.events)
+
+        durations = list((e['end'] - e['start']).total_seconds() for e in self.events)
+        self.assertEqual(durations, list(s.idurations_seconds()))
+        self.assertEqual(min(durations), s.min_duration())
+        self.assertEqual(max(durations), s.max_duration())
+
+        self.assertEqual(list((e['start'], e['end']) for e in self.events), list(s.itime_ranges()))
+
+        counts = dict(s.activity_counts())
+        for name in ('work', 'read', 'run'):
+            self.assertEqual(sum(1 for e in self.events if name == e['name']), counts[name])
+
+    def test_time_of_day(self):
+        s = EventStats(*self.events)
+
+        ranges = list((stats.datetime_to_time_of_day(e['start']), stats.datetime_to_time_of_day(e['end'])) for e in self.events)
+        for bins in (1, 5, 24):
+            expected = list((bin_range, len(bin_)) for bin_range, bin_ in ibins_range(bins, *ranges))
+            self.assertEqual(list(count for bin_range, count in expected), list(count for bin_range, count in s.bin_counts_time_of_day(bins)))
+
+    @unittest.skipUnless(pytz, 'requires pytz')
+    def test_time_zones(self):
+        eastern = pytz.timezone('America/New_York')
+        start = eastern.localize(datetime.datetime(2012, 3, 1, 23, 30))
+
+        s = EventStats(dict(name='work', start=start, end=start + datetime.timedelta(hours=1)))
+
+        # times of day in the events' time zone, the ranges as they came in
+        self.assertEqual([(23 * 3600 + 1800, 1800)], list(s.itime_ranges_time_of_day_seconds()))
+
+        start, end = list(s.itime_ranges())[0]
+        self.assertEqual(datetime.datetime(2012, 3, 1, 23, 30), start.replace(tzinfo=None))
+        self.assertEqual(start.tzinfo, eastern.localize(datetime.datetime(2012, 3, 1)).tzinfo)
+
+        # across a change of offset, and a mix of time zones
+        start = eastern.localize(datetime.datetime(2012, 3, 11, 1, 15, 0, 250000))
+        end = eastern.normalize(start + datetime.timedelta(hours=2))
+        events = [
+            dict(name='work', start=start, end=end),
+            dict(name='read', start=start.astimezone(pytz.utc), end=end.astimezone(pytz.utc)),
+            dict(name='run', start=datetime.datetime(2012, 3, 11, 6), end=datetime.datetime(2012, 3, 11, 7)),
+        ]
+
+        s = EventStats(*events)
+
+        ranges = list(s.itime_ranges())
+        self.assertEqual(list((e['start'], e['end']) for e in events), ranges)
+        for (start, end), event in zip(ranges, events):
+            self.assertEqual(event['start'].tzinfo, start.tzinfo)
+            self.assertEqual(event['end'].tzinfo, end.tzinfo)
+            self.assertEqual(event['start'].timetuple(), start.timetuple())
+            self.assertEqual(event['end'].timetuple(), end.timetuple())
+
+class TestDurationHistogram(unittest.TestCase):
+
+    def test_coarsen(self):
+        h = DurationHistogram(resolution=4, width=1.0)
+
+        for x in (0, 1, 2, 3, 9):
+            h.add(x)
+
+        self.assertEqual(4.0, h.width)
+        self.assertEqual([4, 0, 1, 0], h.counts)
+
+class TestBinning(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+
+        self.datasets = [
+            list(rand.uniform(0, 7200) for i in xrange(2000)),
+            list(rand.randint(0, 20) for i in xrange(2000)),
+            range(101),
+            [3, 3, 3],
+            [1.5],
+        ]
+
+    def test_bin_counts(self):
+        for data in self.datasets:
+            for bins in (1, 5, 7, 20):
+                self.assertEqual(linear_counts(bins, data), bin_counts(bins, data))
+                self.assertEqual(linear_counts(bins, data), list(ibin_counts(bins, *data)))
+                self.assertEqual(linear_counts(bins, data, min_=0), bin_counts(bins, data, min_=0))
+
+    @unittest.skipUnless(stats.get_numpy(), 'requires numpy')
+    def test_bin_counts_numpy(self):
+        numpy = stats.get_numpy()
+
+        threshold = stats.NUMPY_THRESHOLD
+        stats.NUMPY_THRESHOLD = 0
+        try:
+            for data in self.datasets:
+                for bins in (1, 5, 7, 20):
+                    self.assertEqual(linear_counts(bins, data), bin_counts(bins, data))
+                    self.assertEqual(linear_counts(bins, data), bin_counts(bins, numpy.array(data)))
+        finally:
+            stats.NUMPY_THRESHOLD = threshold
+
+    def test_bin_range_counts(self):
+        rand = random.Random(0)
+
+        day = 24 * 3600
+        ranges = list((rand.randint(0, day - 1), rand.randint(0, day - 1)) for i in xrange(1000))
+        ranges.append((day - 1, 0))
+
+        for bins in (1, 5, 24):
+            expected = list((bin_range, len(bin_)) for bin_range, bin_ in ibins_range(bins, *ranges))
+            self.assertEqual(expected, bin_range_counts(bins, ranges))
+
+        # the high and low in one bin, the wrong way around: one bin when
+        # counting, all but a gap when weighting by seconds
+        ranges = [(0, 1), (3, 2), (10, 10)]
+        self.assertEqual([((0, 5.0), 2), ((5.0, 10), 1)], bin_range_counts(2, ranges))
+        self.assertEqual([((0, 5.0), 1 + 4), ((5.0, 10), 5)], bin_range_counts(2, ranges, seconds=True))
+
+    def test_bin_range_counts_seconds(self):
+        rand = random.Random(0)
+
+        ranges = list((rand.uniform(0, 100), rand.uniform(0, 100)) for i in xrange(200))
+        bins = 7
+
+        counts = bin_range_counts(bins, ranges, seconds=True)
+        min_ = min(min(r) for r in ranges)
+        max_ = max(max(r) for r in ranges)
+
+        # the overlap of each range, split at the wrap, with each bin
+        expected = [0.0] * bins
+        for low, high in ranges:
+            pieces = [(low, high)] if low <= high else [(low, max_), (min_, high)]
+            for i, ((bin_min, bin_max), count) in enumerate(counts):
+                for piece_low, piece_high in pieces:
+                    expected[i] += max(0.0, min(bin_max, piece_high) - max(bin_min, piece_low))
+
+        for e, (bin_range, count) in zip(expected, counts):
+            self.assertAlmostEqual(e, count)
+
+    def test_sparkline(self):
+        # sparklines plot counts
+        for data in self.datasets[1:4]:
+            steps = max(2, min(20, max(data) + 1))
+            bin_ranges = list(isteps(steps, *data, min=0))
+
+            expected = list()
+            for x in data:
+                for i, (bin_min, bin_max) in enumerate(bin_ranges):
+                    if x < bin_max:
+                        break
+                expected.append('+' * i)
+
+            self.assertEqual(expected, list(Sparkline(*data).icolumns(20, min_=0)))
+
+class TestAccumulator(unittest.TestCase):
+
+    def test_update(self):
+        data = [4, 8, 15, 16, 23, 42]
+        a = Accumulator().update(data)
+
+        self.assertEqual(6, a.count)
+        self.assertEqual(4, a.min)
+        self.assertEqual(42, a.max)
+        self.assertEqual(stats.mean(*data), a.mean())
+        self.assertAlmostEqual(stats.std(*data) ** 2, a.variance())
+
+        empty = Accumulator()
+        self.assertEqual(None, empty.mean())
+        self.assertEqual(None, empty.std())
+
+    def test_merge(self):
+        rand = random.Random(0)
+        data = list(rand.gauss(1800, 600) for i in xrange(1000))
+
+        whole = Accumulator().update(data)
+        merged = Accumulator().update(data[:300]).merge(Accumulator().update(data[300:])).merge(Accumulator())
+
+        self.assertEqual(whole.count, merged.count)
+        self.assertEqual(whole.min, merged.min)
+        self.assertEqual(whole.max, merged.max)
+        self.assertAlmostEqual(whole.mean(), merged.mean())
+        self.assertAlmostEqual(whole.std(), merged.std())
+
+        self.assertEqual(whole.count, Accumulator().merge(whole).count)
+
+    def test_stable(self):
+        # the mean of the squares less the square of the mean loses all of
+        # the variance here
+        a = Accumulator().update(1e9 + x for x in (4, 7, 13, 16))
+        self.assertAlmostEqual(22.5, a.variance())
+
+    def test_regularity_statistics(self):
+        start = datetime.datetime(2012, 3, 1)
+        dashes = list(dict(start=start, end=start + datetime.timedelta(seconds=s)) for s in (60, 120, 180))
+
+        duration = RegularityStatistics(dashes=dashes).dash_aggregate_duration
+
+        self.assertEqual(datetime.timedelta(seconds=120), duration['mean'])
+        self.assertEqual(None, RegularityStatistics().dash_aggregate_duration['mean'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from regularity.core import metrics
+from regularity.daemon.status import StatusServer, instrumented, query
+
+class TestStatus(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'status.sock')
+
+        metrics.registry.reset()
+        metrics.registry.enable()
+
+    def tearDown(self):
+        metrics.registry.disable()
+        metrics.registry.reset()
+
+        shutil.rmtree(self.directory)
+
+    def test_instrumented(self):
+        @instrumented('test')
+        def handler(x):
+            return x * 2
+
+        self.assertEqual(4, handler(2))
+        handler(3)
+
+        self.assertEqual(2, metrics.registry.counter('daemon_events_total', handler='test'))
+        self.assertEqual(2, metrics.registry.histogram('daemon_handler_seconds', handler='test').count)
+
+    def test_query(self):
+        server = StatusServer(self.path, lambda: dict(sender=dict(sent=3)))
+        server.start()
+
+        try:
+            status = query(self.path)
+        finally:
+            server.stop()
+            server.join()
+
+        self.assertEqual(3, status['sender']['sent'])
+        self.assertIn('uptime', status)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_socket(self):
+        server = StatusServer(self.path, dict)
+        server.socket.close()
+
+        # nothing listens on the socket left behind, so it is replaced
+        server = StatusServer(self.path, dict)
+        server.start()
+
+        try:
+            self.assertRaises(BaseException, StatusServer, self.path, dict)
+            self.assertIn('uptime', query(self.path))
+        finally:
+            server.stop()
+            server.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from regularity.utils.table import StreamingTable, Table
+
+class CountingFormat(str):
+    '''A format string that counts how many times it is used'''
+
+    def format(self, *args, **kwargs):
+        CountingFormat.calls += 1
+        return str.format(self, *args, **kwargs)
+
+CountingFormat.calls = 0
+
+class TestTable(unittest.TestCase):
+
+    rows = [('name', 'count'), ('coffee', 12), ('tea', 3)]
+
+    def test_iformatted_rows(self):
+        table = Table(*self.rows)
+        table.set_column_pad_left(1, True)
+
+        self.assertEqual(['name    count', 'coffee     12', 'tea         3'], list(table.iformatted_rows(column_joiner='  ')))
+
+    def test_formats_once(self):
+        CountingFormat.calls = 0
+
+        table = Table(*self.rows)
+        table.set_column_format(0, CountingFormat('{:}'))
+        list(table.iformatted_rows())
+        list(table.iformatted_rows())
+
+        self.assertEqual(3, CountingFormat.calls)
+
+    def test_streaming(self):
+        table = StreamingTable(iter(self.rows), sample_size=2)
+        table.set_column_pad_left(1, True)
+
+        # the sample fixes the widths, a later element overflows its column
+        self.assertEqual(['name    count', 'coffee     12', 'tea         3'], list(table.iformatted_rows(column_joiner='  ')))
+
+        table = StreamingTable(self.rows + [('a very long name', 1)], sample_size=3)
+        self.assertEqual('a very long name 1    ', list(table.iformatted_rows())[-1])
+
+    def test_streaming_widths(self):
+        table = StreamingTable(iter(self.rows), widths=[8, None], sample_size=0)
+        self.assertEqual(['name     count', 'coffee   12', 'tea      3'], list(table.iformatted_rows()))
+
+        table = StreamingTable(iter([]), widths=[4, 5])
+        self.assertEqual([], list(table.iformatted_rows()))
+
+        self.assertRaises(ValueError, StreamingTable, iter([]))
+
+if __name__ == '__main__':
+    unittest.main()
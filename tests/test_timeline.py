@@ -0,0 +1,69 @@
+import datetime
+import unittest
+
+from regularity.core.timeline import bin_timeline, bucket_starts
+
+T0 = datetime.datetime(2012, 3, 1)
+
+def t(seconds):
+    return T0 + datetime.timedelta(seconds=seconds)
+
+class TestBucketStarts(unittest.TestCase):
+
+    def test_bucket_starts(self):
+        self.assertEqual([t(0), t(10), t(20)], bucket_starts(t(0), t(30), 10))
+        self.assertEqual([t(0), t(10), t(20)], bucket_starts(t(0), t(25), 10))
+
+class TestBinTimeline(unittest.TestCase):
+
+    def activities(self, bucket):
+        return dict((a['name'], (a['seconds'], a['count'])) for a in bucket['activities'])
+
+    def test_clipping(self):
+        dashes = [
+            dict(name='a', start=t(-5), end=t(15)),
+            dict(name='b', start=t(12), end=t(20)),
+            dict(name='c', start=t(28), end=t(40)),
+        ]
+
+        buckets = bin_timeline(t(0), t(30), 10, dashes=dashes)
+
+        self.assertEqual(3, len(buckets))
+        self.assertEqual(dict(a=(10, 1)), self.activities(buckets[0]))
+        self.assertEqual(dict(a=(5, 1), b=(8, 1)), self.activities(buckets[1]))
+        self.assertEqual(dict(c=(2, 1)), self.activities(buckets[2]))
+
+    def test_outside(self):
+        dashes = [
+            dict(name='a', start=t(-10), end=t(0)),
+            dict(name='b', start=t(30), end=t(40)),
+        ]
+
+        buckets = bin_timeline(t(0), t(30), 10, dashes=dashes)
+
+        self.assertEqual([[], [], []], list(b['activities'] for b in buckets))
+
+    def test_dots(self):
+        dots = [
+            dict(name='a', time=t(0)),
+            dict(name='a', time=t(5)),
+            dict(name='a', time=t(10)),
+            dict(name='a', time=t(30)),
+        ]
+
+        buckets = bin_timeline(t(0), t(30), 10, dots=dots)
+
+        self.assertEqual(dict(a=(0, 2)), self.activities(buckets[0]))
+        self.assertEqual(dict(a=(0, 1)), self.activities(buckets[1]))
+        self.assertEqual(dict(), self.activities(buckets[2]))
+
+    def test_partial_last_bucket(self):
+        dashes = [dict(name='a', start=t(0), end=t(30))]
+
+        buckets = bin_timeline(t(0), t(25), 10, dashes=dashes)
+
+        self.assertEqual(t(25), buckets[-1]['end'])
+        self.assertEqual(dict(a=(5, 1)), self.activities(buckets[-1]))
+
+if __name__ == '__main__':
+    unittest.main()
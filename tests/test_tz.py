@@ -0,0 +1,63 @@
+import datetime
+import unittest
+
+from regularity.core.recurse import locate
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+class TestLocate(unittest.TestCase):
+
+    def test_locate(self):
+        o = dict(a=1, b=[dict(c=2), dict(c=3, d=4)], e=[5, 6])
+
+        found = locate(o, set(['a', 'b.c', 'e']))
+        self.assertEqual([1, 2, 3, 5, 6], sorted(value for container, index, value in found))
+
+        for container, index, value in found:
+            container[index] = value * 10
+
+        self.assertEqual(dict(a=10, b=[dict(c=20), dict(c=30, d=4)], e=[50, 60]), o)
+
+@unittest.skipUnless(pytz, 'requires pytz')
+class TestLocalizer(unittest.TestCase):
+
+    def assertMatchesPytz(self, zone, values):
+        from regularity.utils.tz import Localizer
+
+        timezone = pytz.timezone(zone)
+        expected = list(pytz.utc.localize(v).astimezone(timezone) for v in values)
+        localized = Localizer(zone).localize(values)
+
+        self.assertEqual(expected, localized)
+        self.assertEqual(list(e.tzinfo for e in expected), list(l.tzinfo for l in localized))
+
+    def test_dst(self):
+        # every quarter hour across the 2012 spring forward and fall back
+        quarter = datetime.timedelta(minutes=15)
+        spring = datetime.datetime(2012, 3, 11, 4)
+        fall = datetime.datetime(2012, 11, 4, 4)
+
+        values = list(spring + i * quarter for i in xrange(16))
+        values += list(fall + i * quarter for i in xrange(16))
+
+        self.assertMatchesPytz('America/New_York', values)
+
+    def test_span(self):
+        day = datetime.timedelta(days=1)
+        start = datetime.datetime(2010, 1, 1)
+        values = list(start + i * day for i in xrange(0, 1000, 7))
+
+        self.assertMatchesPytz('Europe/London', values)
+        self.assertMatchesPytz('Australia/Sydney', values)
+
+    def test_fixed(self):
+        values = [datetime.datetime(2012, 6, 1), datetime.datetime(1900, 1, 1)]
+
+        self.assertMatchesPytz('UTC', values)
+        self.assertMatchesPytz('Etc/GMT+5', values)
+
+if __name__ == '__main__':
+    unittest.main()